@@ -0,0 +1,118 @@
+"""
+JWT authentication that keeps the users it loads in a small in-process cache.
+
+JWTAuthentication reads the token's user row on every request. Here the user
+is kept for ACCOUNTS_AUTH_CACHE['USER_TTL'] seconds (at most 'USER_MAX_SIZE'
+users, least recently used out first), and simplejwt's checks (active user,
+password-change revocation) are run again on the cached copy for every token.
+Saving or deleting a User evicts it in this process at once
+(accounts.signals); other processes, and `queryset.update()`, which sends no
+signal, see the change within the TTL.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+DEFAULTS = {
+    'USER_TTL': 30,             # seconds a loaded user is reused; 0 turns the cache off
+    'USER_MAX_SIZE': 10000,
+    'BLACKLIST_REFRESH': 5,     # seconds between reads of new blacklist rows; 0 reads on every check
+    'BLACKLIST_GRACE': 30,      # seconds a blacklisting may take to commit after stamping blacklisted_at
+    'BLACKLIST_CAPACITY': 10000,
+    'BLACKLIST_ERROR_RATE': 0.001,
+}
+
+
+def auth_cache_setting(name):
+    return getattr(settings, 'ACCOUNTS_AUTH_CACHE', {}).get(name, DEFAULTS[name])
+
+
+class UserCache:
+    """Thread-safe LRU mapping of str(user id) -> user whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = self.misses = 0
+        # Bumped by every eviction; a user loaded before one is not stored
+        self.generation = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is None or entry[0] <= time.monotonic():
+                self._data.pop(user_id, None)
+                self.misses += 1
+                return None
+            self._data.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, user_id, user, generation):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return  # the user may have changed while it was loaded
+            self._data[user_id] = (time.monotonic() + self.ttl, user)
+            self._data.move_to_end(user_id)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self.generation += 1
+            self._data.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+user_cache = UserCache(auth_cache_setting('USER_MAX_SIZE'), auth_cache_setting('USER_TTL'))
+
+
+def check_user(validated_token, user):
+    """The checks JWTAuthentication.get_user runs on the user it loads."""
+    if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+        raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+    if api_settings.CHECK_REVOKE_TOKEN and (
+        validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+    ):
+        raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication with the user served from user_cache when it is there."""
+
+    def cached_user(self, validated_token):
+        """The token's user from the cache, checked, or None if it is not cached."""
+        user = user_cache.get(str(validated_token.get(api_settings.USER_ID_CLAIM)))
+        if user is None:
+            return None
+        check_user(validated_token, user)
+        # A copy per request, so nothing a view caches on the user is shared
+        return copy.copy(user)
+
+    def get_user(self, validated_token):
+        user = self.cached_user(validated_token)
+        if user is None:
+            generation = user_cache.generation
+            user = super().get_user(validated_token)
+            user_cache.set(str(validated_token[api_settings.USER_ID_CLAIM]), copy.copy(user), generation)
+        return user
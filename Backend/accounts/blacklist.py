@@ -0,0 +1,116 @@
+"""
+An in-process Bloom filter over the JTIs of blacklisted refresh tokens.
+
+simplejwt looks every refresh token up in the token_blacklist tables, but
+almost none of the tokens presented are blacklisted. FilteredRefreshToken
+asks the filter first: a JTI it does not contain is not blacklisted, and only
+a possible match (a blacklisted token, or a false positive at about
+ACCOUNTS_AUTH_CACHE['BLACKLIST_ERROR_RATE']) is looked up in the database.
+
+Tokens blacklisted in this process are added at once (accounts.signals).
+Those blacklisted by other processes are picked up by reading the rows
+stamped since the last read, at most every 'BLACKLIST_REFRESH' seconds, so
+there a logout takes effect within that interval (0 reads on every check;
+access tokens, for comparison, stay valid until they expire). The filter is
+rebuilt without the expired tokens when it fills up.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .authentication import auth_cache_setting
+
+
+class BloomFilter:
+    """Set membership with false positives at about `error_rate` up to `capacity` keys, and no false negatives."""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 64)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + number * second) % self.size for number in range(self.hashes)]
+
+    def add(self, key):
+        new = False
+        for position in self._positions(key):
+            mask = 1 << (position & 7)
+            new = new or not self.bits[position >> 3] & mask
+            self.bits[position >> 3] |= mask
+        # Keys added again (or indistinguishable from earlier ones) do not count
+        self.count += new
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class BlacklistFilter:
+    """The Bloom filter of blacklisted JTIs, loaded on first use and kept current; see the module docstring."""
+
+    def __init__(self):
+        self.bloom = None
+        self.read_since = None
+        self.read_at = None
+        self._lock = threading.Lock()
+
+    def _read(self, rows):
+        now = timezone.now()
+        for jti, blacklisted_at, expires_at in rows.values_list('token__jti', 'blacklisted_at', 'token__expires_at'):
+            if expires_at > now:
+                self.bloom.add(jti)
+            self.read_since = max(self.read_since, blacklisted_at)
+
+    def _rebuild(self):
+        live = BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now()).count()
+        self.bloom = BloomFilter(
+            max(live * 2, auth_cache_setting('BLACKLIST_CAPACITY')), auth_cache_setting('BLACKLIST_ERROR_RATE'),
+        )
+        self.read_since = timezone.now()
+        self._read(BlacklistedToken.objects.filter(token__expires_at__gt=self.read_since))
+
+    def _refresh(self):
+        if self.bloom is None or self.bloom.count > self.bloom.capacity:
+            self._rebuild()
+        else:
+            grace = timedelta(seconds=auth_cache_setting('BLACKLIST_GRACE'))
+            self._read(BlacklistedToken.objects.filter(blacklisted_at__gte=self.read_since - grace))
+        self.read_at = time.monotonic()
+
+    def might_contain(self, jti):
+        with self._lock:
+            if self.read_at is None or time.monotonic() - self.read_at >= auth_cache_setting('BLACKLIST_REFRESH'):
+                self._refresh()
+            return jti in self.bloom
+
+    def add(self, jti):
+        with self._lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+
+    def reset(self):
+        with self._lock:
+            self.bloom = self.read_since = self.read_at = None
+
+
+blacklisted_jtis = BlacklistFilter()
+
+
+class FilteredRefreshToken(RefreshToken):
+    """RefreshToken that skips the blacklist query for JTIs the filter has never seen."""
+
+    def check_blacklist(self):
+        if blacklisted_jtis.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
@@ -1,7 +1,8 @@
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
+from .blacklist import FilteredRefreshToken
 
 User = get_user_model()
 
@@ -35,3 +36,6 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         attrs['username'] = attrs.get('username')  
         return super().validate(attrs)
 
+
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = FilteredRefreshToken
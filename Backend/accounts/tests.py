@@ -1,3 +1,108 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .authentication import user_cache
+from .blacklist import BloomFilter, blacklisted_jtis
+from .models import User
+from .throttling import LoginIPThrottle, counters
+
+
+def queries_on(context, table):
+    return [query['sql'] for query in context.captured_queries if f'"{table}"' in query['sql']]
+
+
+class CachedAuthenticationTests(APITestCase):
+    def setUp(self):
+        user_cache.clear()
+        blacklisted_jtis.reset()
+        self.user = User.objects.create_user('cached', 'secret-pass-123')
+        self.refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+
+    def test_user_is_loaded_once_and_evicted_on_save(self):
+        url = reverse('event-list-create')
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertEqual(self.client.get(url, {'page_size': 5}).status_code, 200)
+        self.assertEqual(len(queries_on(context, 'accounts_user')), 1)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+    def test_refresh_skips_the_blacklist_until_logout(self):
+        url = reverse('token_refresh')
+        self.client.post(url, {'refresh': str(self.refresh)}, format='json')  # loads the filter
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.post(url, {'refresh': str(self.refresh)}, format='json').status_code, 200)
+        self.assertEqual(queries_on(context, 'token_blacklist_blacklistedtoken'), [])
+
+        response = self.client.post(reverse('logout'), {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, 205)
+        self.assertEqual(self.client.post(url, {'refresh': str(self.refresh)}, format='json').status_code, 401)
+
+    def test_filter_reads_tokens_blacklisted_elsewhere(self):
+        other = RefreshToken.for_user(self.user)
+        self.assertFalse(blacklisted_jtis.might_contain(other['jti']))
+        # As another process would: no signal reaches this one
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=other.outstand()[0])])
+        blacklisted_jtis.read_at = None
+        self.assertTrue(blacklisted_jtis.might_contain(other['jti']))
+
+    def test_bloom_filter_error_rate(self):
+        bloom = BloomFilter(1000, 0.01)
+        for number in range(1000):
+            bloom.add(f'member-{number}')
+        self.assertTrue(all(f'member-{number}' in bloom for number in range(1000)))
+        false_positives = sum(f'other-{number}' in bloom for number in range(10000))
+        self.assertLess(false_positives, 200)
+
+
+def throttle_rates(**rates):
+    return override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates})
+
+
+class ThrottleTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('target', 'secret-pass-123')
+
+    @throttle_rates(login_ip='100/min', login_username='3/min')
+    def test_username_limit_rejects_before_any_work(self):
+        url = reverse('token_obtain_pair')
+        for password in ('wrong-1', 'wrong-2', 'wrong-3'):
+            response = self.client.post(url, {'username': 'target', 'password': password}, format='json')
+            self.assertEqual(response.status_code, 401)
+        before = counters().get('login_username', {}).get('rejected', 0)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(url, {'username': 'TARGET', 'password': 'secret-pass-123'}, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(context.captured_queries, [])  # no user lookup, so no hashing either
+        self.assertEqual(counters()['login_username']['rejected'], before + 1)
+        # Other usernames from the same address are still let through
+        response = self.client.post(url, {'username': 'someone', 'password': 'x'}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    @throttle_rates(login_ip='4/min')
+    def test_window_slides(self):
+        request = Request(APIRequestFactory().post('/', {}))
+
+        def attempts(at, count):
+            with mock.patch.object(LoginIPThrottle, 'timer', staticmethod(lambda: at)):
+                return [LoginIPThrottle().allow_request(request, None) for _ in range(count)]
+
+        self.assertEqual(attempts(6030, 5), [True] * 4 + [False])
+        # Half-way through the next minute half of those still count
+        self.assertEqual(attempts(6090, 3), [True, True, False])
+        self.assertEqual(attempts(6170, 1), [True])
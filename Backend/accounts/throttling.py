@@ -0,0 +1,126 @@
+"""
+Sliding-window rate limits on login and registration, per client IP and per
+username.
+
+Both views hash a password on every attempt, and registration also runs every
+password validator, so a burst of attempts is expensive even when each one
+fails. DRF checks throttles in `initial()`, before the view parses
+credentials, touches the database or hashes anything; a rejected attempt gets
+429 with Retry-After and costs a couple of cache reads.
+
+Each limit is a sliding-window counter: the attempts in the current fixed
+window plus those of the previous window, weighted by how much of it the
+sliding window still covers. That is two cache keys per client and a constant
+number of cache operations per check, however many attempts are made (DRF's
+SimpleRateThrottle keeps a timestamp per attempt instead). The counters live
+in the default cache, so with a shared cache backend the limits hold across
+processes; with the local-memory cache they are per process.
+
+Rates are read from REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] under each
+throttle's scope; a scope without a rate is not limited. Usernames are
+limited case-insensitively, counting every attempt, so a lower per-username
+rate also slows attempts spread over many IPs. `counters()` reports allowed
+and rejected checks per scope since the process started; staff read them at
+/api/auth/throttles/.
+"""
+import hashlib
+import threading
+from collections import Counter
+
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+_counts = Counter()
+_counts_lock = threading.Lock()
+
+
+def record(scope, outcome):
+    with _counts_lock:
+        _counts[scope, outcome] += 1
+
+
+def counters():
+    """{scope: {'allowed': n, 'rejected': n}} for this process."""
+    with _counts_lock:
+        counts = dict(_counts)
+    report = {}
+    for (scope, outcome), count in sorted(counts.items()):
+        report.setdefault(scope, {'allowed': 0, 'rejected': 0})[outcome] = count
+    return report
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """SimpleRateThrottle with a sliding-window counter instead of an attempt history."""
+
+    def get_rate(self):
+        # Read per instance, so settings overrides apply; no rate means no limit
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def estimate(self, previous, current, elapsed):
+        return previous * (1 - elapsed / self.duration) + current
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window = int(self.now // self.duration)
+        current_key, previous_key = f'{self.key}:{window}', f'{self.key}:{window - 1}'
+        counts = self.cache.get_many([current_key, previous_key])
+        self.previous, self.current = counts.get(previous_key, 0), counts.get(current_key, 0)
+        self.elapsed = self.now - window * self.duration
+        if self.estimate(self.previous, self.current, self.elapsed) >= self.num_requests:
+            record(self.scope, 'rejected')
+            return False
+
+        # The window's count is still needed as the previous one during the next window
+        if not self.cache.add(current_key, 1, self.duration * 2):
+            try:
+                self.cache.incr(current_key)
+            except ValueError:
+                self.cache.set(current_key, 1, self.duration * 2)  # expired in between
+        record(self.scope, 'allowed')
+        return True
+
+    def wait(self):
+        """Seconds until the estimate drops below the limit, if nothing else arrives."""
+        if self.current < self.num_requests:
+            # The previous window's weight shrinks until it leaves room for one more
+            until = self.duration * (1 - (self.num_requests - self.current) / self.previous)
+            return max(until - self.elapsed, 0)
+        # The current window has to become the previous one and shrink in turn
+        until = self.duration * (1 - self.num_requests / self.current) if self.current else 0
+        return self.duration - self.elapsed + max(until, 0)
+
+
+class IPThrottle(SlidingWindowThrottle):
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class UsernameThrottle(SlidingWindowThrottle):
+    def get_cache_key(self, request, view):
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        if not isinstance(username, str) or not username.strip():
+            return None  # the view rejects it without hashing
+        ident = hashlib.sha256(username.strip().lower().encode()).hexdigest()[:32]
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class LoginIPThrottle(IPThrottle):
+    scope = 'login_ip'
+
+
+class LoginUsernameThrottle(UsernameThrottle):
+    scope = 'login_username'
+
+
+class RegisterIPThrottle(IPThrottle):
+    scope = 'register_ip'
+
+
+class RegisterUsernameThrottle(UsernameThrottle):
+    scope = 'register_username'
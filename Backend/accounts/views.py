@@ -2,13 +2,17 @@ from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, generics
-from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from .blacklist import FilteredRefreshToken
+from .throttling import (
+    LoginIPThrottle, LoginUsernameThrottle, RegisterIPThrottle, RegisterUsernameThrottle, counters,
+)
 from .serializers import RegisterSerializer, CustomTokenObtainPairSerializer
 from rest_framework.exceptions import ValidationError
 
 class RegisterView(generics.CreateAPIView):
     serializer_class = RegisterSerializer
+    throttle_classes = (RegisterIPThrottle, RegisterUsernameThrottle)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -31,6 +35,7 @@ class RegisterView(generics.CreateAPIView):
 
 class LoginView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
+    throttle_classes = (LoginIPThrottle, LoginUsernameThrottle)
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -53,8 +58,16 @@ class LogoutView(APIView):
     def post(self, request):
         try:
             refresh_token = request.data["refresh"]
-            token = RefreshToken(refresh_token)
+            token = FilteredRefreshToken(refresh_token)
             token.blacklist()
             return Response(status=status.HTTP_205_RESET_CONTENT)
         except Exception as e:
             return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
+class ThrottleCountersView(APIView):
+    """Allowed and rejected login/register attempts per limit, for this process."""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(counters())
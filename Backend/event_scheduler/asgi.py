@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'event_scheduler.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402 (configured by get_asgi_application)
+
+if settings.DEBUG:
+    # Serve static files (the admin's) like runserver does in development
+    from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+    application = ASGIStaticFilesHandler(application)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -60,13 +61,68 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
+    # Answers "not blacklisted" from an in-process Bloom filter (accounts.blacklist)
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.serializers.FilteredTokenRefreshSerializer',
+}
+
+# Users kept by CachedJWTAuthentication and the refresh-token blacklist filter (accounts.authentication)
+ACCOUNTS_AUTH_CACHE = {
+    'USER_TTL': 30,
+    'USER_MAX_SIZE': 10000,
+    'BLACKLIST_REFRESH': 5,
 }
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # Same bytes as JSONRenderer, rendered with orjson when it is installed
+    'DEFAULT_RENDERER_CLASSES': (
+        'events.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # Sliding-window limits on login and registration, checked before any hashing (accounts.throttling)
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '30/min',
+        'login_username': '10/min',
+        'register_ip': '20/hour',
+        'register_username': '10/hour',
+    },
+}
+
+# Rolling window materialized into events.Occurrence; `manage.py refresh_occurrences` rolls it daily
+EVENTS_OCCURRENCE_INDEX = {
+    'PAST_DAYS': 90,
+    'FUTURE_DAYS': 548,  # ~18 months
+    'BATCH_SIZE': 500,
+}
+
+# Seconds a serialized calendar read is kept; entries are keyed on the user's calendar version
+EVENTS_RESPONSE_CACHE_TIMEOUT = 300
+
+# `manage.py run_reminders`: seconds loaded ahead, seconds between edit checks, delivery sink
+EVENTS_REMINDERS = {
+    'WINDOW': 300,
+    'POLL_INTERVAL': 5,
+    'SINK': 'events.reminders.LogSink',
+}
+
+# /api/async/events/stream/: seconds between keep-alives (and version checks), queued and listed notifications,
+# and seconds a stream token opens a stream for
+EVENTS_PUSH = {
+    'HEARTBEAT': 15,
+    'QUEUE_SIZE': 100,
+    'MAX_CHANGES': 100,
+    'TOKEN_LIFETIME': 300,
+}
+
+# Request profiling: Server-Timing headers and Prometheus metrics at /api/metrics/ (events.profiling)
+EVENTS_PROFILING = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 1.0,
+    'SERVER_TIMING': True,
+    'METRICS_IPS': ('127.0.0.1', '::1'),
 }
 
 SPECTACULAR_SETTINGS = {
@@ -78,6 +134,7 @@ SPECTACULAR_SETTINGS = {
 }
 
 MIDDLEWARE = [
+    'events.profiling.ProfilingMiddleware',  # inactive unless EVENTS_PROFILING['ENABLED']
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     "corsheaders.middleware.CorsMiddleware",
@@ -115,9 +172,20 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Seconds to reuse a connection across requests. Only for WSGI deployments (e.g. 60): under
+        # ASGI every async request runs its queries on a new thread, whose connection would linger
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read-only views send their reads to this alias when DATABASES defines it (events.database)
+DATABASE_ROUTERS = ['events.database.ReplicaRouter']
+EVENTS_READ_REPLICA = 'replica'
+
+# Every new SQLite connection gets events.database.SQLITE_PRAGMAS (write-ahead log, no fsync per
+# commit, 64 MB cache, 256 MB mmap); set EVENTS_SQLITE_PRAGMAS to replace them
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -0,0 +1,208 @@
+"""
+Async versions of the calendar read endpoints, for ASGI deployments.
+
+Under an ASGI server these views hold no thread while they wait on the
+database or on the client, so one worker keeps many slow-client and
+long-poll connections open at once. They take the same query parameters and
+return the same JSON as their DRF counterparts in events.views, ETags, 304s
+and the version-keyed response cache included: query building, expansion and
+serialization (events.rows) are shared with those views, only the database
+access is awaited (Django's async ORM). The change stream (events.push) is
+here for the same reason: an open stream costs a coroutine, not a thread.
+"""
+from contextlib import nullcontext
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from accounts.authentication import CachedJWTAuthentication
+from . import occurrence_index, push
+from .authentication import astream_user
+from .caching import avalidators, cache_timeout, conditional_response, mark_private, response_cache_key, set_validators
+from .database import areplica_behind, primary_reads, replica_reads
+from .freebusy import afree_busy
+from .models import Event
+from .pagination import EventKeysetPagination
+from .profiling import timed
+from .renderers import FastJSONRenderer
+from .recurrence import expand_events
+from .rows import aserialize_events, occurrence_dicts, occurrence_row_dicts
+from .views import (
+    event_list_error,
+    event_list_queryset,
+    expandable_events,
+    free_busy_users,
+    materialized_occurrences,
+    parse_free_busy,
+    parse_window,
+    requested_fields,
+    unavailable_users_error,
+)
+
+JSON_MEDIA_TYPE = 'application/json'
+
+
+def json_response(data, status=200):
+    # Rendered by the same renderer as the DRF views, so both paths return identical bytes
+    with timed('render'):
+        content = FastJSONRenderer().render(data)
+    return HttpResponse(content, status=status, content_type=JSON_MEDIA_TYPE)
+
+
+def error_response(error):
+    """Response for a DRF exception, shaped like DRF's default exception handler."""
+    data = error.detail if isinstance(error.detail, (list, dict)) else {'detail': error.detail}
+    response = json_response(data, status=error.status_code)
+    if isinstance(error, (NotAuthenticated, AuthenticationFailed)):
+        response['WWW-Authenticate'] = JWTAuthentication().authenticate_header(None)
+    return response
+
+
+async def authenticate(request):
+    """
+    The user of the request's Bearer token. The token is checked in the event
+    loop; the user comes from the same CachedJWTAuthentication as the sync
+    views, so both paths accept and reject exactly the same tokens. Only a
+    user missing from its cache costs a trip to a thread.
+    """
+    user, _ = await authenticate_bearer(request)
+    return user
+
+
+async def authenticate_bearer(request):
+    """(user, validated access token) of the request's Bearer token."""
+    authentication = CachedJWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else None
+    if raw_token is None:
+        raise NotAuthenticated()
+    token = authentication.get_validated_token(raw_token)
+    user = authentication.cached_user(token) or await sync_to_async(authentication.get_user)(token)
+    return user, token
+
+
+async def versioned_read(view, request, *args, **kwargs):
+    """VersionedReadMixin.get for async views."""
+    etag, last_modified, version = await avalidators(request.user)
+    response = conditional_response(request, etag)
+    if response is None:
+        key = response_cache_key(request, version, JSON_MEDIA_TYPE)
+        data = await cache.aget(key)
+        if data is None:
+            with primary_reads() if await areplica_behind(request.user.pk, version) else nullcontext():
+                data = await view(request, *args, **kwargs)
+            if isinstance(data, HttpResponse):
+                return data
+            await cache.aset(key, data, cache_timeout())
+        response = json_response(data)
+
+    set_validators(response, etag, last_modified)
+    return mark_private(response)
+
+
+def method_not_allowed(request):
+    response = json_response({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+    response['Allow'] = 'GET'
+    return response
+
+
+def async_read_view(versioned=False):
+    """
+    Turn an async function returning response data (or an error
+    HttpResponse) into an authenticated GET endpoint.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return method_not_allowed(request)
+            try:
+                with replica_reads():
+                    request.user = await authenticate(request)
+                    if versioned:
+                        return await versioned_read(view, request, *args, **kwargs)
+                    data = await view(request, *args, **kwargs)
+            except APIException as e:
+                return error_response(e)
+            return data if isinstance(data, HttpResponse) else json_response(data)
+        return wrapper
+    return decorator
+
+
+@async_read_view(versioned=True)
+async def event_list(request):
+    """Async EventListCreateView (GET): GET /api/async/events/"""
+    fields = requested_fields(request.GET)
+    error = event_list_error(request.GET, fields)
+    if error:
+        return json_response({'error': error}, status=400)
+
+    paginator = EventKeysetPagination()
+    queryset = event_list_queryset(Event.objects.filter(user=request.user), request.GET, fields)
+    # The paginator reads query_params and builds links off a DRF request
+    page = await paginator.apaginate_queryset(queryset, Request(request))
+    return {'next': paginator.get_next_link(), 'results': await aserialize_events(page, fields)}
+
+
+@async_read_view(versioned=True)
+async def occurrence_list(request):
+    """Async OccurrenceListView: GET /api/async/events/occurrences/?start=...&end=..."""
+    window, error = parse_window(request.GET)
+    if error:
+        return json_response({'error': error}, status=400)
+
+    if await occurrence_index.acovers(*window):
+        return occurrence_row_dicts([row async for row in materialized_occurrences(request.user, *window)])
+    return occurrence_dicts(expand_events([event async for event in expandable_events(request.user, *window)], *window))
+
+
+@async_read_view()
+async def free_busy(request):
+    """Async FreeBusyView: GET /api/async/events/free-busy/?users=...&start=...&end=..."""
+    query, error = parse_free_busy(request.GET)
+    if error:
+        return json_response({'error': error}, status=400)
+    usernames, window, min_duration = query
+
+    users = {user.username: user async for user in free_busy_users(usernames, request.user)}
+    error = unavailable_users_error(usernames, users)
+    if error:
+        return json_response({'error': error}, status=400)
+    return await afree_busy([users[name] for name in usernames], *window, min_duration)
+
+
+async def change_stream(request):
+    """
+    Server-sent change notifications for the user: GET /api/async/events/stream/
+    (see events.push). Authenticates like the other async views, or with
+    `?token=` from /api/events/stream-token/ for clients that cannot set
+    headers (EventSource). The stream ends when that token expires.
+    """
+    if request.method != 'GET':
+        return method_not_allowed(request)
+    if not isinstance(request, ASGIRequest):
+        # A WSGI server would buffer the endless body; 204 tells EventSource not to reconnect
+        return HttpResponse(status=204)
+    try:
+        if 'token' in request.GET:
+            user, expires = await astream_user(request.GET['token'])
+        else:
+            user, token = await authenticate_bearer(request)
+            expires = token['exp']
+    except APIException as e:
+        return error_response(e)
+    # A new EventSource cannot send Last-Event-ID, so a reopened stream passes it in the query
+    last_seen = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id', '')
+    response = StreamingHttpResponse(
+        push.stream(push.broker.subscribe(user.pk), int(last_seen) if last_seen.isdigit() else None, expires),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx would hold the notifications back
+    return response
@@ -0,0 +1,57 @@
+"""
+Token authentication for URLs opened without an Authorization header:
+calendar feeds polled by subscribed calendar apps, and change streams opened
+by EventSource. The JWT never goes in a URL, where proxies and logs keep it.
+"""
+import time
+
+from django.utils.crypto import constant_time_compare, salted_hmac
+from rest_framework import authentication, exceptions
+
+from accounts.models import User
+
+FEED_TOKEN_SALT = 'events.authentication.FeedTokenAuthentication'
+STREAM_TOKEN_SALT = 'events.authentication.stream_token'
+
+
+def _signature(user):
+    # Includes the password hash, so changing the password revokes old feed URLs
+    return salted_hmac(FEED_TOKEN_SALT, f'{user.pk}:{user.password}').hexdigest()[:32]
+
+
+def feed_token(user):
+    return f'{user.pk}:{_signature(user)}'
+
+
+class FeedTokenAuthentication(authentication.BaseAuthentication):
+    """Authenticates `?token=<feed token>` on the views that list it."""
+
+    def authenticate(self, request):
+        token = request.query_params.get('token')
+        if not token:
+            return None
+        user_id, _, signature = token.partition(':')
+        user = User.objects.filter(pk=user_id, is_active=True).first() if user_id.isdigit() else None
+        if user is None or not constant_time_compare(signature, _signature(user)):
+            raise exceptions.AuthenticationFailed('Invalid feed token.')
+        return user, None
+
+
+def _stream_signature(user, expires):
+    return salted_hmac(STREAM_TOKEN_SALT, f'{user.pk}:{expires}:{user.password}').hexdigest()[:32]
+
+
+def stream_token(user, expires):
+    """Token opening the user's change stream until `expires` (a Unix time)."""
+    return f'{user.pk}:{expires}:{_stream_signature(user, expires)}'
+
+
+async def astream_user(token):
+    """(user, expiry) of a stream token; raises AuthenticationFailed unless it is valid and unexpired."""
+    user_id, expires, signature = (token.split(':') + ['', ''])[:3]
+    if not user_id.isdigit() or not expires.isdigit() or int(expires) <= time.time():
+        raise exceptions.AuthenticationFailed('Invalid or expired stream token.')
+    user = await User.objects.filter(pk=user_id, is_active=True).afirst()
+    if user is None or not constant_time_compare(signature, _stream_signature(user, int(expires))):
+        raise exceptions.AuthenticationFailed('Invalid or expired stream token.')
+    return user, int(expires)
@@ -0,0 +1,262 @@
+"""
+Vectorized expansion of many series at once, for exports, free/busy and reports.
+
+Each series is compiled with the same CompiledRule the scalar path uses, which
+gives its first and last step in the window. The steps of every series of a
+frequency are then laid out in one flat array and turned into dates with array
+arithmetic: day offsets for DAILY, seven weekday slots masked by the compiled
+weekday bitmask for WEEKLY, and the 400-year month table plus day-of-month /
+nth-weekday masks for MONTHLY and YEARLY. `count` is applied through a running
+rank per series and cancelled dates are removed with a sorted-array set
+difference. Dates are local to each event's time zone; the local starts of
+the series of each zone are converted to UTC together with one searchsorted
+over the zone's transition table (events.timezones). Output matches
+events.recurrence.expand_event.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+
+from .occurrence_index import cancelled_dates
+from .recurrence import CYCLE_MONTHS, DATE_MARGIN, MONTH_TABLE, get_compiled_rule, get_rule
+from .timezones import NAIVE_EPOCH, UTC, transition_table
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+EPOCH_DATE = EPOCH.date()
+US_PER_DAY = 86_400_000_000
+NO_COUNT = np.iinfo(np.int64).max
+
+# Combined (series, day) keys for the cancelled-date set difference.
+KEY_DAY_OFFSET = 1 << 22  # days are within +/- 3 million of 1970
+KEY_SERIES_STRIDE = 1 << 23
+
+FIRST_WEEKDAYS = np.array([first for first, _ in MONTH_TABLE], dtype=np.int64)
+MONTH_LENGTHS = np.array([days for _, days in MONTH_TABLE], dtype=np.int64)
+SLOTS = np.arange(7, dtype=np.int64)
+
+OccurrenceArrays = namedtuple('OccurrenceArrays', ['event_ids', 'occurrence_dates', 'starts', 'ends'])
+
+
+def _micros(value):
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def _local_micros(value):
+    return (value - NAIVE_EPOCH) // timedelta(microseconds=1)
+
+
+def _days(day):
+    return (day - EPOCH_DATE).days
+
+
+def _layout(first_steps, last_steps):
+    """
+    Flatten the step ranges [first, last] of several series into parallel
+    arrays of series index and step.
+    """
+    lengths = np.maximum(last_steps - first_steps + 1, 0)
+    runs = np.cumsum(lengths) - lengths
+    series = np.repeat(np.arange(len(lengths)), lengths)
+    steps = first_steps[series] + np.arange(lengths.sum()) - runs[series]
+    return series, steps
+
+
+def _month_starts(month_indexes):
+    """Days since 1970 of the 1st of each month given as year * 12 + month - 1."""
+    return (month_indexes - 1970 * 12).astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+
+
+def _group_dates(frequency, group, series, steps):
+    """Candidate days (since 1970) and validity for the flat steps of one frequency group."""
+    interval = group['interval'][series]
+    if frequency == 'DAILY':
+        days = group['anchor'][series] + steps * interval
+        return series, days, np.ones(len(days), dtype=bool)
+
+    if frequency == 'WEEKLY':
+        series = np.repeat(series, 7)
+        steps = np.repeat(steps, 7)
+        slots = np.tile(SLOTS, len(series) // 7)
+        days = group['week_start'][series] + steps * 7 * group['interval'][series] + slots
+        valid = (group['weekday_mask'][series] >> slots) & 1 == 1
+        return series, days, valid
+
+    if frequency == 'MONTHLY':
+        months = group['anchor_month'][series] + steps * interval
+    else:
+        months = (group['anchor_year'][series] + steps * interval) * 12 + group['month'][series] - 1
+    first_weekday = FIRST_WEEKDAYS[months % CYCLE_MONTHS]
+    month_length = MONTH_LENGTHS[months % CYCLE_MONTHS]
+
+    nth = group['nth'][series]
+    weekday = group['weekday'][series]
+    from_start = 1 + (weekday - first_weekday) % 7 + (nth - 1) * 7
+    last_weekday = (first_weekday + month_length - 1) % 7
+    from_end = month_length - (last_weekday - weekday) % 7 + (nth + 1) * 7
+    day = np.where(nth > 0, from_start, np.where(nth < 0, from_end, group['day'][series]))
+
+    valid = (day >= 1) & (day <= month_length)
+    days = _month_starts(months) + day - 1
+    return series, days, valid
+
+
+def _new_group():
+    return {name: [] for name in (
+        'index', 'interval', 'anchor', 'week_start', 'weekday_mask', 'anchor_month',
+        'anchor_year', 'month', 'day', 'nth', 'weekday', 'first', 'last', 'first_step',
+        'last_step', 'base', 'count',
+    )}
+
+
+def expand_batch(events, window_start, window_end, cancelled=None):
+    """
+    Expand many events (with `recurrence_rule` joined) over one window.
+
+    `cancelled` maps event id -> cancelled dates; when omitted it is loaded
+    with one query. Returns OccurrenceArrays ordered by input event, then
+    start time: event ids, occurrence dates (datetime64[D]) and UTC starts and
+    ends (datetime64[us]).
+    """
+    events = list(events)
+    if cancelled is None:
+        cancelled = cancelled_dates([event.pk for event in events], window_start, window_end)
+
+    window_start_us, window_end_us = _micros(window_start), _micros(window_end)
+    start_us = np.empty(len(events), dtype=np.int64)
+    duration_us = np.empty(len(events), dtype=np.int64)
+    anchor_days = np.empty(len(events), dtype=np.int64)
+    time_us = np.empty(len(events), dtype=np.int64)  # local time of day
+    zone_codes = np.zeros(len(events), dtype=np.int64)  # 0 for UTC
+    zones, tables = {}, [None]
+    groups = {}
+    single = []
+
+    for index, event in enumerate(events):
+        start = event.start_datetime
+        start_us[index] = local_us = _micros(start)
+        if event.time_zone != UTC:
+            code = zones.get(event.time_zone)
+            if code is None:
+                code = zones[event.time_zone] = len(tables)
+                tables.append(transition_table(event.time_zone))
+            zone_codes[index] = code
+            local_us = _local_micros(tables[code].to_local(start))
+        duration_us[index] = (event.end_datetime - start) // timedelta(microseconds=1)
+        anchor_days[index] = local_us // US_PER_DAY
+        time_us[index] = local_us - anchor_days[index] * US_PER_DAY
+        anchor = EPOCH_DATE + timedelta(days=int(anchor_days[index]))
+
+        rule = get_rule(event)
+        compiled = None
+        if rule is not None:
+            try:
+                compiled = get_compiled_rule(event, rule)
+            except ValueError:
+                pass
+        if compiled is None:
+            single.append(index)
+            continue
+
+        duration = event.end_datetime - start
+        first = max(anchor, (window_start - duration).date() - DATE_MARGIN)
+        last = window_end.date() + DATE_MARGIN
+        if compiled.until and compiled.until < last:
+            last = compiled.until
+        if first > last or compiled.is_empty:
+            continue
+
+        first_step = compiled.step_for(first)
+        base = 0
+        if compiled.count and first_step:
+            base = compiled.dates_before_step(first_step) - compiled.lead
+
+        group = groups.setdefault(compiled.frequency, _new_group())
+        group['index'].append(index)
+        group['interval'].append(compiled.interval)
+        group['anchor'].append(anchor_days[index])
+        group['week_start'].append(anchor_days[index] - anchor.weekday())
+        group['weekday_mask'].append(compiled.weekday_mask)
+        group['anchor_month'].append(anchor.year * 12 + anchor.month - 1)
+        group['anchor_year'].append(anchor.year)
+        group['month'].append(compiled.month or 1)
+        group['day'].append(compiled.day or 1)
+        group['nth'].append(compiled.nth or 0)
+        group['weekday'].append(compiled.weekday or 0)
+        group['first'].append(_days(first))
+        group['last'].append(_days(last))
+        group['first_step'].append(first_step)
+        group['last_step'].append(compiled.step_for(last))
+        group['base'].append(base)
+        group['count'].append(compiled.count or NO_COUNT)
+
+    indexes, day_chunks = [], []
+    for frequency, group in groups.items():
+        group = {name: np.array(values, dtype=np.int64) for name, values in group.items()}
+        series, steps = _layout(group['first_step'], group['last_step'])
+        series, days, valid = _group_dates(frequency, group, series, steps)
+
+        # Rank of each kept date among its series' dates, to enforce `count`.
+        counted = valid & (days >= group['anchor'][series])
+        running = np.cumsum(counted) - counted
+        run_starts = np.flatnonzero(np.r_[True, series[1:] != series[:-1]]) if len(series) else series
+        offsets = np.zeros(len(group['index']), dtype=np.int64)
+        offsets[series[run_starts]] = running[run_starts]
+        ordinal = group['base'][series] + running - offsets[series]
+
+        keep = (
+            counted
+            & (days >= group['first'][series])
+            & (days <= group['last'][series])
+            & (ordinal < group['count'][series])
+        )
+        indexes.append(group['index'][series[keep]])
+        day_chunks.append(days[keep])
+
+    if single:
+        indexes.append(np.array(single, dtype=np.int64))
+        day_chunks.append(anchor_days[single])
+
+    if indexes:
+        index = np.concatenate(indexes)
+        days = np.concatenate(day_chunks)
+    else:
+        index = days = np.empty(0, dtype=np.int64)
+
+    keys = np.sort(index * KEY_SERIES_STRIDE + days + KEY_DAY_OFFSET)
+    cancelled_keys = np.array(sorted(
+        position * KEY_SERIES_STRIDE + _days(day) + KEY_DAY_OFFSET
+        for position, event in enumerate(events)
+        for day in cancelled.get(event.pk, ())
+    ), dtype=np.int64)
+    keys = np.setdiff1d(keys, cancelled_keys, assume_unique=True)
+    index, days = keys // KEY_SERIES_STRIDE, keys % KEY_SERIES_STRIDE - KEY_DAY_OFFSET
+
+    starts = days * US_PER_DAY + time_us[index]
+    codes = zone_codes[index]
+    for code, table in enumerate(tables[1:], 1):
+        zoned = codes == code
+        starts[zoned] = table.to_utc_us(starts[zoned])
+    # A first occurrence starts exactly when its event does, even at an ambiguous local time
+    first = days == anchor_days[index]
+    starts[first] = start_us[index[first]]
+    ends = starts + duration_us[index]
+    overlaps = (starts < window_end_us) & ((ends > window_start_us) | (starts >= window_start_us))
+    index, days, starts, ends = index[overlaps], days[overlaps], starts[overlaps], ends[overlaps]
+
+    event_ids = np.array([event.pk or 0 for event in events], dtype=np.int64)
+    return OccurrenceArrays(
+        event_ids[index],
+        days.astype('datetime64[D]'),
+        starts.astype('datetime64[us]'),
+        ends.astype('datetime64[us]'),
+    )
+
+
+def expand_rules(rules, window_start, window_end, cancelled=None):
+    """
+    Batch-expand RecurrenceRules (fetched with `select_related('event')`)
+    over one window. See expand_batch.
+    """
+    return expand_batch([rule.event for rule in rules], window_start, window_end, cancelled)
+
@@ -0,0 +1,226 @@
+"""
+Benchmark suite for the hot paths, run by `manage.py run_bench` against a
+calendar created by `manage.py seed_bench`.
+
+Each case is timed over a number of rounds after one warm-up round and
+reported as min / median / p95 / mean milliseconds. Requests go through the
+full Django stack with the test client. Responses are never served from the
+response cache, and writes are rolled back, so consecutive runs (and runs on
+different commits) measure the same work on the same data. The report is
+JSON with sorted keys, so two runs can be compared with any diff tool.
+"""
+import platform
+import random
+import statistics
+import subprocess
+import time
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from accounts.authentication import CachedJWTAuthentication
+from accounts.blacklist import FilteredRefreshToken
+
+from .batch import expand_batch
+from .models import Event
+from .recurrence import expand_events, next_occurrences
+from .rows import event_columns, serialize_events
+from .serializers import EventSerializer
+from .views import expandable_events
+
+EXPANSION_DAYS = 90
+LIST_PAGE_SIZE = 100
+
+
+def bench_host():
+    """A host name the settings accept, for requests made in-process."""
+    return next((name for name in settings.ALLOWED_HOSTS if name != '*' and not name.startswith('.')), 'localhost')
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        'rounds': len(timings),
+        'min_ms': round(timings[0] * 1000, 3),
+        'median_ms': round(statistics.median(timings) * 1000, 3),
+        'p95_ms': round(timings[max(int(len(timings) * 0.95) - 1, 0)] * 1000, 3),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+    }
+
+
+def time_rounds(func, rounds):
+    func()  # warm-up: imports, compiled rules, connection
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+class Suite:
+    """The benchmark cases for one user's calendar; see CASES."""
+
+    def __init__(self, user, password, window_start):
+        self.user = user
+        self.password = password
+        self.window = (window_start, window_start + timedelta(days=EXPANSION_DAYS))
+        self.client = APIClient(SERVER_NAME=bench_host())
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        self.rng = random.Random(1)
+        self.round = 0
+
+    def uncached(self, params):
+        # A parameter the views ignore keeps each round out of the response cache
+        self.round += 1
+        return {**params, 'bench': self.round}
+
+    def case_expansion_batch(self):
+        events = list(expandable_events(self.user, *self.window))
+        return lambda: expand_batch(events, *self.window)
+
+    def case_expansion_scalar(self):
+        events = list(expandable_events(self.user, *self.window))
+        return lambda: expand_events(events, *self.window)
+
+    def case_expansion_view(self):
+        params = {'start': self.window[0].isoformat(), 'end': self.window[1].isoformat()}
+        url = reverse('event-occurrences')
+        return lambda: self.check(self.client.get(url, self.uncached(params)))
+
+    def case_serialization_list(self):
+        rows = list(
+            Event.objects.filter(user=self.user).order_by('start_datetime', 'id')
+            .values(*event_columns(EventSerializer.Meta.fields))[:LIST_PAGE_SIZE]
+        )
+        return lambda: serialize_events(rows)
+
+    def case_serialization_list_drf(self):
+        events = list(
+            Event.objects.filter(user=self.user).select_related('recurrence_rule')
+            .prefetch_related('exceptions').order_by('start_datetime', 'id')[:LIST_PAGE_SIZE]
+        )
+        return lambda: EventSerializer(events, many=True).data
+
+    def case_serialization_list_view(self):
+        url = reverse('event-list-create')
+        return lambda: self.check(self.client.get(url, self.uncached({'page_size': LIST_PAGE_SIZE})))
+
+    def case_cancel_occurrence(self):
+        after = self.window[0]
+        series = [
+            event for event in Event.objects.filter(user=self.user, is_recurring=True).select_related('recurrence_rule')
+            if next_occurrences(event, after, 1)
+        ]
+        if not series:
+            return None
+
+        def cancel():
+            event = self.rng.choice(series)
+            day = next_occurrences(event, after, 1)[0].occurrence_date
+            with transaction.atomic():
+                self.check(self.client.post(
+                    reverse('cancel-occurrence', kwargs={'event_id': event.pk}),
+                    {'occurrence_date': day.isoformat()}, format='json',
+                ), 201)
+                transaction.set_rollback(True)
+        return cancel
+
+    def case_login(self):
+        client = APIClient(SERVER_NAME=bench_host())
+        data = {'username': self.user.username, 'password': self.password}
+        return lambda: self.check(client.post(reverse('token_obtain_pair'), data, format='json'))
+
+    def case_auth_jwt(self):
+        return self.authenticate(CachedJWTAuthentication())
+
+    def case_auth_jwt_uncached(self):
+        return self.authenticate(JWTAuthentication())
+
+    def authenticate(self, authentication):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        return lambda: authentication.authenticate(request)
+
+    def case_auth_refresh_token(self):
+        raw = str(RefreshToken.for_user(self.user))
+        return lambda: FilteredRefreshToken(raw)
+
+    def case_auth_refresh_token_unfiltered(self):
+        raw = str(RefreshToken.for_user(self.user))
+        return lambda: RefreshToken(raw)
+
+    def check(self, response, expected=200):
+        if response.status_code != expected:
+            raise RuntimeError(f'{response.request["PATH_INFO"]} answered {response.status_code}: {response.content[:200]!r}')
+        return response
+
+    def dataset(self):
+        events = Event.objects.filter(user=self.user)
+        return {
+            'user': self.user.username,
+            'events': events.count(),
+            'series': events.filter(is_recurring=True).count(),
+            'window_start': self.window[0].isoformat(),
+            'window_days': EXPANSION_DAYS,
+        }
+
+
+CASES = {
+    'expansion.batch': Suite.case_expansion_batch,
+    'expansion.scalar': Suite.case_expansion_scalar,
+    'expansion.view': Suite.case_expansion_view,
+    'serialization.list': Suite.case_serialization_list,
+    'serialization.list_drf': Suite.case_serialization_list_drf,
+    'serialization.list_view': Suite.case_serialization_list_view,
+    'cancel_occurrence': Suite.case_cancel_occurrence,
+    'login': Suite.case_login,
+    'auth.jwt': Suite.case_auth_jwt,
+    'auth.jwt_uncached': Suite.case_auth_jwt_uncached,
+    'auth.refresh_token': Suite.case_auth_refresh_token,
+    'auth.refresh_token_unfiltered': Suite.case_auth_refresh_token_unfiltered,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(user, password, window_start, rounds, names=None, progress=None):
+    """Run the named cases (all by default) and return the report as a dict."""
+    suite = Suite(user, password, window_start)
+    results = {}
+    # The login case measures the view, not the rate limits its rounds would run into
+    with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}}):
+        for name in names or CASES:
+            func = CASES[name](suite)
+            if func is None:
+                results[name] = {'skipped': 'no data for this case'}
+                continue
+            cache.clear()
+            results[name] = summarize(time_rounds(func, rounds))
+            if progress:
+                progress(name, results[name])
+    return {
+        'environment': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'debug': settings.DEBUG,
+        },
+        'dataset': suite.dataset(),
+        'results': results,
+    }
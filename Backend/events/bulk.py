@@ -0,0 +1,158 @@
+"""
+Bulk create/update/delete of events.
+
+Every item is validated with EventSerializer (and its nested
+RecurrenceRuleSerializer) exactly as a single POST/PUT would be; the valid
+items are then written with bulk_create/bulk_update in one transaction and the
+invalid ones reported by position. Bulk writes skip model signals, so the
+occurrence index refresh and calendar version bump are made explicitly, once
+per request.
+"""
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from . import occurrence_index, versioning
+from .models import CalendarChange, Event, RecurrenceRule
+from .serializers import EventSerializer, prepare_recurrence_data
+
+BATCH_SIZE = 500
+EVENT_UPDATE_FIELDS = ['title', 'description', 'start_datetime', 'end_datetime', 'time_zone', 'is_recurring',
+                       'reminder_minutes', 'updated_at']
+
+
+class BulkResult:
+    def __init__(self):
+        self.created = []
+        self.updated = []
+        self.deleted = []
+        self.errors = []
+
+    def error(self, operation, index, errors):
+        self.errors.append({'op': operation, 'index': index, 'errors': errors})
+
+    @property
+    def wrote_anything(self):
+        return bool(self.created or self.updated or self.deleted)
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'deleted': self.deleted,
+            'errors': self.errors,
+        }
+
+
+def _validate(serializer, item):
+    """
+    Validate one item with a shared serializer instance, so its fields are
+    built once per request instead of once per item (as ListSerializer does).
+    Returns (event field values, rule field values, errors).
+    """
+    try:
+        data = serializer.run_validation(item)
+    except ValidationError as e:
+        return None, None, e.detail
+    data = dict(data)
+    return data, prepare_recurrence_data(data.pop('recurrence_rule', None)), None
+
+
+def _validate_creates(user, items, result):
+    serializer = EventSerializer()
+    new = []
+    for index, item in enumerate(items):
+        data, rule_data, errors = _validate(serializer, item)
+        if errors:
+            result.error('create', index, errors)
+            continue
+        new.append((Event(user=user, **data), rule_data))
+    return new
+
+
+def _validate_updates(user, items, result):
+    ids = [item.get('id') for item in items if isinstance(item, dict)]
+    instances = Event.objects.filter(user=user, pk__in=[pk for pk in ids if isinstance(pk, int)])
+    instances = {event.pk: event for event in instances}
+
+    serializer = EventSerializer()
+    changed, seen = [], set()
+    for index, item in enumerate(items):
+        pk = item.get('id') if isinstance(item, dict) else None
+        if pk not in instances:
+            result.error('update', index, {'id': ['Not found.']})
+            continue
+        if pk in seen:
+            result.error('update', index, {'id': ['Duplicate id in this request.']})
+            continue
+        seen.add(pk)
+
+        event = instances[pk]
+        data, rule_data, errors = _validate(serializer, item)
+        if errors:
+            result.error('update', index, errors)
+            continue
+        for attr, value in data.items():
+            setattr(event, attr, value)
+        changed.append((event, rule_data))
+    return changed
+
+
+def _validate_deletes(user, ids, result):
+    found = set(Event.objects.filter(user=user, pk__in=[pk for pk in ids if isinstance(pk, int)]).values_list('pk', flat=True))
+    valid = []
+    for index, pk in enumerate(ids):
+        if pk in found:
+            valid.append(pk)
+        else:
+            result.error('delete', index, {'id': ['Not found.']})
+    return valid
+
+
+def bulk_write(user, create=(), update=(), delete=()):
+    """
+    Validate and apply a batch of event writes for `user`. Returns a
+    BulkResult listing the ids written and the errors of rejected items.
+    """
+    result = BulkResult()
+    new = _validate_creates(user, create, result)
+    changed = _validate_updates(user, update, result)
+    doomed = _validate_deletes(user, delete, result)
+    now = timezone.now()
+
+    with transaction.atomic(), occurrence_index.batched_refresh() as refresh, versioning.batched_bumps():
+        events = Event.objects.bulk_create([event for event, _ in new], batch_size=BATCH_SIZE)
+        rules = [
+            RecurrenceRule(event=event, **rule_data)
+            for event, (_, rule_data) in zip(events, new)
+            if rule_data
+        ]
+
+        # Rules of updated events are replaced rather than updated in place:
+        # nothing references them, and a DELETE plus one multi-row INSERT is far
+        # cheaper than bulk_update's per-field CASE expressions. New rows also
+        # get a fresh updated_at, which the compiled rule cache keys on.
+        for event, rule_data in changed:
+            event.updated_at = now
+            if rule_data:
+                rules.append(RecurrenceRule(event=event, **rule_data))
+
+        Event.objects.bulk_update([event for event, _ in changed], EVENT_UPDATE_FIELDS, batch_size=BATCH_SIZE)
+        updated_ids = [event.pk for event, _ in changed]
+        for offset in range(0, len(updated_ids), BATCH_SIZE):
+            RecurrenceRule.objects.filter(event_id__in=updated_ids[offset:offset + BATCH_SIZE]).delete()
+        RecurrenceRule.objects.bulk_create(rules, batch_size=BATCH_SIZE)
+        Event.objects.filter(pk__in=doomed).delete()
+
+        result.created = [event.pk for event in events]
+        result.updated = updated_ids
+        result.deleted = doomed
+        refresh.update(result.created + result.updated)
+        # Bulk writes skip signals; the deletes above send them and are logged that way
+        versioning.log_changes(user.pk, [
+            *((pk, CalendarChange.EVENT, pk, CalendarChange.CREATE) for pk in result.created),
+            *((pk, CalendarChange.EVENT, pk, CalendarChange.UPDATE) for pk in result.updated),
+            *((rule.event_id, CalendarChange.RULE, rule.pk, CalendarChange.CREATE) for rule in rules),
+        ])
+
+    return result
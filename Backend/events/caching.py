@@ -0,0 +1,92 @@
+"""
+Conditional GETs and a serialized-response cache for calendar reads.
+
+Both hang off the user's calendar version (events.versioning): the ETag is
+the version, and cached response data is keyed on (user, version, request
+path with query, media type). A write bumps the version, which retires every
+earlier ETag and cache entry of that user at once; nothing is deleted.
+
+Only the ETag decides a 304. Last-Modified is sent for information, but it
+has one-second resolution: a second write within the same second would leave
+it unchanged, so If-Modified-Since alone is never answered with a 304.
+"""
+import hashlib
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from . import versioning
+from .database import primary_reads, replica_behind
+
+DEFAULT_TIMEOUT = 300
+
+
+def response_cache_key(request, version, media_type=None):
+    target = f"{request.build_absolute_uri()}|{media_type or request.accepted_media_type}"
+    return f"events:response:{request.user.pk}:{version}:{hashlib.md5(target.encode()).hexdigest()}"
+
+
+def _validators(user, version, changed_at):
+    return f'"{user.pk}-{version}"', int(changed_at.timestamp()), version
+
+
+def validators(user):
+    """(ETag, Last-Modified timestamp) and version of the user's calendar."""
+    return _validators(user, *versioning.current(user))
+
+
+async def avalidators(user):
+    return _validators(user, *await versioning.acurrent(user))
+
+
+def cache_timeout():
+    return getattr(settings, 'EVENTS_RESPONSE_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def mark_private(response):
+    # Private per-user data; clients keep it but must revalidate each time
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Authorization', 'Accept'])
+    return response
+
+
+def conditional_response(request, etag):
+    """304 (or 412) response if the request's If-None-Match (or If-Match) settles it, else None."""
+    return get_conditional_response(request, etag=etag)
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+class VersionedReadMixin:
+    """
+    For views whose GET depends only on the requesting user's calendar and
+    the URL. Answers 304 to a matching If-None-Match, and
+    otherwise serves the response data from cache when it was built at the
+    current version.
+    """
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified, version = validators(request.user)
+        response = conditional_response(request, etag)
+        if response is None:
+            key = response_cache_key(request, version)
+            data = cache.get(key)
+            if data is not None:
+                response = Response(data)
+            else:
+                with primary_reads() if replica_behind(request.user.pk, version) else nullcontext():
+                    response = super().get(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                cache.set(key, response.data, cache_timeout())
+
+        set_validators(response, etag, last_modified)
+        return mark_private(response)
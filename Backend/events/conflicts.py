@@ -0,0 +1,118 @@
+"""
+Conflict detection for a saved event against the rest of its owner's calendar.
+
+The event's occurrences over its horizon (its own span, or the next year of a
+series) are checked against an IntervalIndex over the owner's other
+occurrences in that window, loaded in one query (see events.freebusy). The
+index keeps starts sorted, ends sorted and the running maximum of ends in
+start order. Whether an occurrence [s, e) conflicts at all is two binary
+searches: the intervals starting before e, minus those ending by s. Only
+occurrences that do conflict are listed, from the run of intervals between
+the first whose running end passes s and the last starting before e; a new
+daily series is checked against a busy calendar without comparing every pair.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from .batch import EPOCH, EPOCH_DATE, expand_batch
+from .freebusy import load_occurrences
+from .models import Event
+from .occurrence_index import cancelled_dates
+from .recurrence import get_rule
+
+# How far ahead the occurrences of a series are checked.
+CONFLICT_HORIZON = timedelta(days=365)
+
+# Most conflicts listed for one save.
+MAX_REPORTED_CONFLICTS = 100
+
+
+class IntervalIndex:
+    """Static index over half-open intervals for counting and listing overlaps."""
+
+    def __init__(self, starts, ends):
+        order = np.argsort(starts, kind='stable')
+        self.order = order
+        self.starts = starts[order]
+        self.ends = ends[order]
+        self.reach = np.maximum.accumulate(self.ends) if len(order) else self.ends
+        self.sorted_ends = np.sort(ends)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def count(self, starts, ends):
+        """Number of indexed intervals overlapping each [starts[i], ends[i])."""
+        return np.searchsorted(self.starts, ends, 'left') - np.searchsorted(self.sorted_ends, starts, 'right')
+
+    def overlapping(self, start, end):
+        """Positions (in the input arrays) of the intervals overlapping [start, end)."""
+        first = np.searchsorted(self.reach, start, 'right')
+        last = np.searchsorted(self.starts, end, 'left')
+        run = np.arange(first, last)
+        return self.order[run[self.ends[first:last] > start]]
+
+
+def conflict_window(event, now=None):
+    """Window over which `event`'s occurrences are checked, or None if it has none."""
+    start = event.start_datetime
+    if event.end_datetime <= start:
+        return None  # zero-length events occupy no time
+    if get_rule(event) is None:
+        return start, event.end_datetime
+    start = max(start, now or timezone.now())
+    return start, start + CONFLICT_HORIZON
+
+
+def _datetime(micros):
+    return EPOCH + timedelta(microseconds=int(micros))
+
+
+def _date(days):
+    return EPOCH_DATE + timedelta(days=int(days))
+
+
+def find_conflicts(event, now=None):
+    """
+    Occurrences of the owner's other events overlapping an occurrence of the
+    saved `event`, in start order, at most MAX_REPORTED_CONFLICTS of them.
+    """
+    # Reloaded so the rule is the one just written, not a cached or deleted instance
+    event = Event.objects.select_related('recurrence_rule').get(pk=event.pk)
+    window = conflict_window(event, now)
+    if window is None or not event.is_active:
+        return []
+
+    own = expand_batch([event], *window, cancelled_dates([event.pk], *window))
+    _, event_ids, starts, ends, days = load_occurrences([event.user_id], *window)
+    others = (event_ids != event.pk) & (ends > starts)
+    event_ids, starts, ends, days = event_ids[others], starts[others], ends[others], days[others]
+    index = IntervalIndex(starts, ends)
+    if not len(index) or not len(own.starts):
+        return []
+
+    own_starts, own_ends = own.starts.astype(np.int64), own.ends.astype(np.int64)
+    own_days = own.occurrence_dates.astype(np.int64)
+    hits = []
+    for position in np.flatnonzero(index.count(own_starts, own_ends) > 0):
+        for other in index.overlapping(own_starts[position], own_ends[position]):
+            hits.append((starts[other], event_ids[other], ends[other], days[other], own_days[position]))
+            if len(hits) >= MAX_REPORTED_CONFLICTS:
+                break
+        if len(hits) >= MAX_REPORTED_CONFLICTS:
+            break
+
+    titles = dict(Event.objects.filter(pk__in={int(hit[1]) for hit in hits}).values_list('pk', 'title'))
+    return [
+        {
+            'event_id': int(event_id),
+            'title': titles.get(int(event_id), ''),
+            'occurrence_date': _date(day),
+            'start': _datetime(start),
+            'end': _datetime(end),
+            'own_occurrence_date': _date(own_day),
+        }
+        for start, event_id, end, day, own_day in sorted(hits)
+    ]
@@ -0,0 +1,143 @@
+"""
+SQLite connection tuning and read-replica routing.
+
+Every new SQLite connection gets the pragmas in EVENTS_SQLITE_PRAGMAS. The
+defaults put the file in write-ahead-log mode, where readers no longer block
+the writer or each other, with `synchronous=NORMAL` (no fsync per commit; a
+power loss can drop the last commits but never corrupts the file), a 64 MB
+page cache per connection and up to 256 MB of the file memory-mapped.
+
+Views that only read wrap their work in replica_reads(). Inside it
+ReplicaRouter sends ORM reads to the EVENTS_READ_REPLICA alias when DATABASES
+defines it; without that alias the router has no opinion and everything stays
+on the default database. Writes, and reads inside a transaction on the
+default database (which must see their own writes), never go to the replica.
+The flag is a context variable, so it follows async views into the threads
+their queries run on.
+
+Calendar versions are always read from the default database: they become
+ETags and response cache keys (events.caching), and a lagging replica would
+hand out a version older than the client's. For the same reason a versioned
+read checks the replica's copy of the user's version before building a
+response, and reads from the default database if the replica is behind
+(replica_behind()), so data older than the version is never cached under it.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .models import CalendarVersion
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -64000,          # KiB
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+}
+
+# Read from the default database even inside replica_reads()
+PRIMARY_MODELS = {'events.CalendarVersion'}
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+
+def sqlite_pragmas():
+    return getattr(settings, 'EVENTS_SQLITE_PRAGMAS', SQLITE_PRAGMAS)
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    # On the driver connection, so the pragmas never show up in captured queries
+    for name, value in sqlite_pragmas().items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+@contextmanager
+def replica_reads():
+    """Let the ORM reads made inside go to the read replica."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Keep the ORM reads made inside on the default database, even within replica_reads()."""
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def replica_alias():
+    """The configured replica alias if DATABASES defines it, else None."""
+    alias = getattr(settings, 'EVENTS_READ_REPLICA', None)
+    return alias if alias in connections.settings else None
+
+
+def _version_on_replica(user_id):
+    """Queryset of the user's calendar version on the replica, or None when reads stay on the default database."""
+    if not _replica_reads.get():
+        return None
+    alias = replica_alias()
+    if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return None
+    return CalendarVersion.objects.using(alias).filter(user_id=user_id).values_list('version', flat=True)
+
+
+def replica_behind(user_id, version):
+    """Whether replica reads would miss the user's writes up to `version`."""
+    queryset = _version_on_replica(user_id)
+    return queryset is not None and (queryset.first() or 0) < version
+
+
+async def areplica_behind(user_id, version):
+    """replica_behind() for async views."""
+    queryset = _version_on_replica(user_id)
+    return queryset is not None and (await queryset.afirst() or 0) < version
+
+
+class ReplicaReadMixin:
+    """For DRF views whose GET only reads: runs it inside replica_reads()."""
+
+    def get(self, request, *args, **kwargs):
+        with replica_reads():
+            return super().get(request, *args, **kwargs)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get() or model._meta.label in PRIMARY_MODELS:
+            return None
+        alias = replica_alias()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS if replica_alias() else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        alias = replica_alias()
+        if alias is None:
+            return None
+        aliases = {DEFAULT_DB_ALIAS, alias}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the default database, never migrated itself
+        if db == replica_alias():
+            return False
+        return None
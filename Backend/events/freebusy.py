@@ -0,0 +1,172 @@
+"""
+Free/busy across several calendars.
+
+The busy time of all requested users is loaded at once: from the materialized
+Occurrence table when it covers the window, otherwise by batch-expanding
+their series (events.batch). Intervals are clipped to the window and merged
+with a sort-and-sweep in numpy: once sorted by start, an interval opens a new
+busy block exactly when it starts after the running maximum of the ends
+before it. The cost is one sort of all occurrences however many users are
+asked for; calendars are never compared pairwise. Free slots are the gaps
+between the merged blocks.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import Prefetch
+
+from . import occurrence_index
+from .batch import EPOCH, _days, _micros, expand_batch
+from .recurrence import DATE_MARGIN
+from .models import Event, EventException, Occurrence, overlapping_events
+
+EMPTY = np.empty(0, dtype=np.int64)
+
+
+def _datetime(micros):
+    return EPOCH + timedelta(microseconds=int(micros))
+
+
+def _index_rows(user_ids, window_start, window_end):
+    return (
+        Occurrence.objects.filter(user_id__in=user_ids, start__lt=window_end, end__gt=window_start)
+        .values_list('user_id', 'event_id', 'start', 'end', 'occurrence_date')
+    )
+
+
+def _row_arrays(rows):
+    users = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    event_ids = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+    starts = np.fromiter((_micros(row[2]) for row in rows), dtype=np.int64, count=len(rows))
+    ends = np.fromiter((_micros(row[3]) for row in rows), dtype=np.int64, count=len(rows))
+    days = np.fromiter((_days(row[4]) for row in rows), dtype=np.int64, count=len(rows))
+    return users, event_ids, starts, ends, days
+
+
+def _expandable_events(user_ids, window_start, window_end):
+    cancelled = EventException.objects.filter(
+        is_cancelled=True,
+        occurrence_date__gte=window_start.date() - DATE_MARGIN,
+        occurrence_date__lte=window_end.date() + DATE_MARGIN,
+    )
+    return (
+        Event.objects.filter(overlapping_events(window_start, window_end), user_id__in=user_ids, is_active=True)
+        .select_related('recurrence_rule')
+        .prefetch_related(Prefetch('exceptions', queryset=cancelled, to_attr='cancelled_exceptions'))
+        .order_by('pk')
+    )
+
+
+def _expanded_arrays(events, window_start, window_end):
+    cancelled = {
+        event.pk: {exception.occurrence_date for exception in event.cancelled_exceptions}
+        for event in events
+    }
+    occurrences = expand_batch(events, window_start, window_end, cancelled)
+    pks = np.array([event.pk for event in events], dtype=np.int64)
+    owners = np.array([event.user_id for event in events], dtype=np.int64)
+    users = owners[np.searchsorted(pks, occurrences.event_ids)] if len(events) else EMPTY
+    return (
+        users, occurrences.event_ids, occurrences.starts.astype(np.int64), occurrences.ends.astype(np.int64),
+        occurrences.occurrence_dates.astype(np.int64),
+    )
+
+
+def load_occurrences(user_ids, window_start, window_end):
+    """
+    Occurrences of the users' events overlapping [window_start, window_end),
+    unordered, as int64 arrays of user ids, event ids, UTC starts and ends in
+    microseconds since the epoch and occurrence dates in days since the epoch.
+    """
+    if occurrence_index.covers(window_start, window_end):
+        return _row_arrays(list(_index_rows(user_ids, window_start, window_end)))
+    return _expanded_arrays(list(_expandable_events(user_ids, window_start, window_end)), window_start, window_end)
+
+
+async def aload_occurrences(user_ids, window_start, window_end):
+    """load_occurrences() for async views."""
+    if await occurrence_index.acovers(window_start, window_end):
+        return _row_arrays([row async for row in _index_rows(user_ids, window_start, window_end)])
+    events = [event async for event in _expandable_events(user_ids, window_start, window_end)]
+    return _expanded_arrays(events, window_start, window_end)
+
+
+def _clip(occurrences, window_start, window_end):
+    users, _, starts, ends, _ = occurrences
+    starts = np.maximum(starts, _micros(window_start))
+    ends = np.minimum(ends, _micros(window_end))
+    busy = ends > starts
+    return users[busy], starts[busy], ends[busy]
+
+
+def busy_arrays(user_ids, window_start, window_end):
+    """
+    Busy intervals of the users inside [window_start, window_end), unordered,
+    as int64 arrays of user ids, starts and ends clipped to the window.
+    """
+    return _clip(load_occurrences(user_ids, window_start, window_end), window_start, window_end)
+
+
+def merge_intervals(starts, ends):
+    """Union of half-open intervals, as sorted (starts, ends) of disjoint blocks."""
+    if not len(starts):
+        return EMPTY, EMPTY
+    order = np.argsort(starts, kind='stable')
+    starts, ends = starts[order], ends[order]
+    reach = np.maximum.accumulate(ends)
+    # Touching intervals (start == previous reach) join one block
+    opens = np.flatnonzero(np.r_[True, starts[1:] > reach[:-1]])
+    closes = np.r_[opens[1:] - 1, len(starts) - 1]
+    return starts[opens], reach[closes]
+
+
+def free_slots(busy_starts, busy_ends, window_start, window_end, min_duration=timedelta(0)):
+    """Gaps of at least `min_duration` (and never empty) between merged busy blocks."""
+    starts = np.r_[_micros(window_start), busy_ends]
+    ends = np.r_[busy_starts, _micros(window_end)]
+    keep = ends - starts >= max(min_duration // timedelta(microseconds=1), 1)
+    return starts[keep], ends[keep]
+
+
+def _intervals(starts, ends):
+    return [{'start': _datetime(start), 'end': _datetime(end)} for start, end in zip(starts, ends)]
+
+
+def _summary(users, busy, window_start, window_end, min_duration):
+    user_ids, starts, ends = busy
+    calendars = {}
+    order = np.argsort(user_ids, kind='stable')
+    user_ids, starts, ends = user_ids[order], starts[order], ends[order]
+    present, first = np.unique(user_ids, return_index=True)
+    bounds = np.r_[first, len(user_ids)]
+    for position, user_id in enumerate(present):
+        run = slice(bounds[position], bounds[position + 1])
+        calendars[int(user_id)] = _intervals(*merge_intervals(starts[run], ends[run]))
+
+    busy_starts, busy_ends = merge_intervals(starts, ends)
+    return {
+        'start': window_start,
+        'end': window_end,
+        'calendars': [
+            {'user': user.username, 'busy': calendars.get(user.pk, [])}
+            for user in users
+        ],
+        'busy': _intervals(busy_starts, busy_ends),
+        'free': _intervals(*free_slots(busy_starts, busy_ends, window_start, window_end, min_duration)),
+    }
+
+
+def free_busy(users, window_start, window_end, min_duration=timedelta(0)):
+    """
+    Free/busy of `users` over [window_start, window_end): each user's merged
+    busy blocks, the union of everyone's busy time and the common free slots
+    of at least `min_duration`.
+    """
+    busy = busy_arrays([user.pk for user in users], window_start, window_end)
+    return _summary(users, busy, window_start, window_end, min_duration)
+
+
+async def afree_busy(users, window_start, window_end, min_duration=timedelta(0)):
+    """free_busy() for async views."""
+    occurrences = await aload_occurrences([user.pk for user in users], window_start, window_end)
+    return _summary(users, _clip(occurrences, window_start, window_end), window_start, window_end, min_duration)
@@ -0,0 +1,377 @@
+"""
+iCalendar (RFC 5545) export and import of a user's events.
+
+On export a series becomes one VEVENT whose RRULE is written from the
+compiled rule, so it carries the same defaults expansion applies (weekday, day
+and month of the start date), and whose cancelled occurrences become EXDATEs.
+Times are written in UTC, as they are stored, except that events in another
+time zone get DTSTART, DTEND and EXDATE in local time with the IANA name as
+TZID, so clients expand the series in wall-clock time too. The zone is given
+by reference, without a VTIMEZONE (RFC 7809). The calendar is produced as a
+generator of text chunks so it can be streamed.
+
+On import VEVENTs are read one at a time from an iterator of lines and turned
+into EventSerializer input plus cancelled dates. A DTSTART with an IANA TZID
+sets the event's time zone. RRULEs are mapped onto RecurrenceRule where it can
+express them; anything else is reported.
+"""
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.db.models import Prefetch
+
+from .models import Event, EventException
+from .recurrence import WEEKDAY_CODES, CompiledRule, get_rule
+from .timezones import UTC, WallClock, is_valid as is_valid_time_zone, transition_table
+
+PRODID = '-//Event Scheduler//Calendar Export//EN'
+UTC_FORMAT = '%Y%m%dT%H%M%SZ'
+LOCAL_FORMAT = '%Y%m%dT%H%M%S'
+LINE_LIMIT = 75  # octets per line, before folding
+EXPORT_CHUNK_SIZE = 500
+
+
+def escape_text(value):
+    return (
+        value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n').replace('\r', '\\n')
+    )
+
+
+def fold(line):
+    """Fold a content line at 75 octets without splitting a UTF-8 character."""
+    encoded = line.encode()
+    if len(encoded) <= LINE_LIMIT:
+        return line + '\r\n'
+    parts, start, limit = [], 0, LINE_LIMIT
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        while end < len(encoded) and encoded[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode())
+        start, limit = end, LINE_LIMIT - 1
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def format_utc(value):
+    return value.astimezone(dt_timezone.utc).strftime(UTC_FORMAT)
+
+
+def datetime_line(name, time_zone, values):
+    """Property `name` with `values` (aware datetimes) in UTC, or in local time with a TZID."""
+    if time_zone == UTC:
+        return f'{name}:' + ','.join(format_utc(value) for value in values)
+    table = transition_table(time_zone)
+    return f'{name};TZID={time_zone}:' + ','.join(table.to_local(value).strftime(LOCAL_FORMAT) for value in values)
+
+
+def rrule_for(event):
+    """RRULE value for a series, or None for a one-off (or unexpandable) event."""
+    rule = get_rule(event)
+    if rule is None:
+        return None
+    clock = WallClock(event)
+    try:
+        # Not through the shared compiled rule cache: one export would evict the hot entries
+        compiled = CompiledRule.from_rule(rule, clock.anchor)
+    except ValueError:
+        return None
+
+    parts = [f'FREQ={compiled.frequency}']
+    if compiled.interval > 1:
+        parts.append(f'INTERVAL={compiled.interval}')
+    if compiled.frequency == 'WEEKLY':
+        parts.append('BYDAY=' + ','.join(WEEKDAY_CODES[weekday] for weekday in compiled.weekdays))
+    if compiled.frequency == 'YEARLY':
+        parts.append(f'BYMONTH={compiled.month}')
+    if compiled.nth:
+        parts.append(f'BYDAY={compiled.nth}{WEEKDAY_CODES[compiled.weekday]}')
+    elif compiled.frequency in ('MONTHLY', 'YEARLY'):
+        parts.append(f'BYMONTHDAY={compiled.day}')
+    if compiled.until:
+        # `until` is an inclusive date; an occurrence on it starts at the series' time of day.
+        # UNTIL is in UTC even when DTSTART has a TZID.
+        parts.append(f'UNTIL={format_utc(clock.start_on(compiled.until))}')
+    if compiled.count:
+        parts.append(f'COUNT={compiled.count}')
+    return ';'.join(parts)
+
+
+def vevent(event, cancelled_dates=(), domain='event-scheduler'):
+    """Content lines of one event as a string."""
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:event-{event.pk}@{domain}',
+        f'DTSTAMP:{format_utc(event.updated_at)}',
+        f'LAST-MODIFIED:{format_utc(event.updated_at)}',
+        datetime_line('DTSTART', event.time_zone, [event.start_datetime]),
+        datetime_line('DTEND', event.time_zone, [event.end_datetime]),
+        f'SUMMARY:{escape_text(event.title)}',
+    ]
+    if event.description:
+        lines.append(f'DESCRIPTION:{escape_text(event.description)}')
+    rrule = rrule_for(event)
+    if rrule:
+        lines.append(f'RRULE:{rrule}')
+        if cancelled_dates:
+            clock = WallClock(event)
+            lines.append(datetime_line('EXDATE', event.time_zone, sorted(clock.start_on(day) for day in cancelled_dates)))
+    lines.append('END:VEVENT')
+    return ''.join(fold(line) for line in lines)
+
+
+def export_queryset(user):
+    cancelled = EventException.objects.filter(is_cancelled=True).only('event_id', 'occurrence_date')
+    return (
+        Event.objects.filter(user=user, is_active=True)
+        .select_related('recurrence_rule')
+        .prefetch_related(Prefetch('exceptions', queryset=cancelled, to_attr='cancelled'))
+        .order_by('pk')
+    )
+
+
+def iter_calendar(user, name='Event Scheduler', domain='event-scheduler'):
+    """
+    Yield the user's calendar as text chunks, one per batch of events, reading
+    the events with a chunked iterator so memory does not grow with their number.
+    """
+    yield ''.join(fold(line) for line in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{escape_text(name)}',
+    ])
+    chunk = []
+    for event in export_queryset(user).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        chunk.append(vevent(event, [exception.occurrence_date for exception in event.cancelled], domain))
+        if len(chunk) == EXPORT_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    chunk.append(fold('END:VCALENDAR'))
+    yield ''.join(chunk)
+
+
+# --- Import ---
+
+DURATION_PATTERN = re.compile(
+    r'^(?P<sign>[+-])?P(?:(?P<weeks>\d+)W)?(?:(?P<days>\d+)D)?'
+    r'(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?$'
+)
+NTH_WEEKDAY_PATTERN = re.compile(r'^([+-]?\d{1,2})?(MO|TU|WE|TH|FR|SA|SU)$')
+UNSUPPORTED_RULE_PARTS = ('BYSETPOS', 'BYWEEKNO', 'BYYEARDAY', 'BYHOUR', 'BYMINUTE', 'BYSECOND')
+
+
+def unfold(lines):
+    """Join folded continuation lines, yielding one content line at a time."""
+    current = None
+    for raw in lines:
+        line = raw.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def parse_content_line(line):
+    """Split 'NAME;PARAM=x:value' into (NAME, {PARAM: x}, value)."""
+    quoted = False
+    for position, char in enumerate(line):
+        if char == '"':
+            quoted = not quoted
+        elif char == ':' and not quoted:
+            break
+    else:
+        raise ValueError(f'Malformed line: {line[:40]}')
+    name, *params = line[:position].split(';')
+    params = dict(param.partition('=')[::2] for param in params)
+    return name.upper(), {key.upper(): value.strip('"') for key, value in params.items()}, line[position + 1:]
+
+
+def unescape_text(value):
+    return re.sub(r'\\([\\;,nN])', lambda match: '\n' if match.group(1) in 'nN' else match.group(1), value)
+
+
+def parse_ics_datetime(value, params):
+    """
+    Parse a DATE or DATE-TIME value into an aware UTC datetime. Returns
+    (datetime, is_date). Floating times and unknown TZIDs are taken as UTC.
+    """
+    value = value.strip()
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return datetime.strptime(value, '%Y%m%d').replace(tzinfo=dt_timezone.utc), True
+    if value.endswith('Z'):
+        return datetime.strptime(value, UTC_FORMAT).replace(tzinfo=dt_timezone.utc), False
+    zone = dt_timezone.utc
+    if params.get('TZID'):
+        try:
+            zone = ZoneInfo(params['TZID'])
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    local = datetime.strptime(value, '%Y%m%dT%H%M%S').replace(tzinfo=zone)
+    return local.astimezone(dt_timezone.utc), False
+
+
+def parse_duration(value):
+    match = DURATION_PATTERN.match(value.strip())
+    if not match or not any(match.group(name) for name in ('weeks', 'days', 'hours', 'minutes', 'seconds')):
+        raise ValueError(f'Unsupported DURATION: {value}')
+    parts = {name: int(match.group(name) or 0) for name in ('weeks', 'days', 'hours', 'minutes', 'seconds')}
+    duration = timedelta(**parts)
+    return -duration if match.group('sign') == '-' else duration
+
+
+def _nth_weekday(value):
+    match = NTH_WEEKDAY_PATTERN.match(value)
+    if not match:
+        raise ValueError(f'Unsupported BYDAY value: {value}')
+    return int(match.group(1)) if match.group(1) else None, match.group(2)
+
+
+def _single_int(parts, name):
+    value = parts.get(name)
+    if value is None:
+        return None
+    if ',' in value:
+        raise ValueError(f'Only a single {name} value is supported.')
+    return int(value)
+
+
+def recurrence_data_from_rrule(value, start):
+    """
+    Map an RRULE value onto RecurrenceRuleSerializer input for a series
+    starting at `start` (aware, in the series' time zone). Raises ValueError
+    for rules RecurrenceRule cannot express.
+    """
+    parts = {}
+    for part in value.split(';'):
+        if part:
+            key, _, part_value = part.partition('=')
+            parts[key.upper()] = part_value.upper()
+    unsupported = [name for name in UNSUPPORTED_RULE_PARTS if name in parts]
+    if unsupported:
+        raise ValueError(f"Unsupported RRULE parts: {', '.join(unsupported)}")
+
+    frequency = parts.get('FREQ')
+    interval = int(parts.get('INTERVAL', 1))
+    days = [_nth_weekday(code) for code in parts['BYDAY'].split(',')] if parts.get('BYDAY') else []
+    data = {'frequency': frequency, 'interval': interval}
+
+    if frequency == 'DAILY' and days and interval == 1 and not any(nth for nth, _ in days):
+        # "Every weekday" style rules; the same dates as a weekly rule
+        frequency = data['frequency'] = 'WEEKLY'
+    if frequency == 'DAILY':
+        if days or 'BYMONTHDAY' in parts or 'BYMONTH' in parts:
+            raise ValueError('BY* parts are not supported on DAILY rules.')
+    elif frequency == 'WEEKLY':
+        if any(nth for nth, _ in days) or 'BYMONTHDAY' in parts or 'BYMONTH' in parts:
+            raise ValueError('WEEKLY rules support plain BYDAY only.')
+        if interval > 1 and parts.get('WKST', 'MO') != 'MO':
+            raise ValueError('Only WKST=MO is supported for WEEKLY rules with an INTERVAL.')
+        data['weekdays'] = [code for _, code in days]
+    elif frequency in ('MONTHLY', 'YEARLY'):
+        day = _single_int(parts, 'BYMONTHDAY')
+        if len(days) > 1 or (days and (days[0][0] is None or day is not None)):
+            raise ValueError(f'{frequency} rules support one BYMONTHDAY or one nth BYDAY (e.g. 2MO).')
+        if days:
+            data['nth'], data['weekday_for_nth'] = days[0]
+        elif frequency == 'MONTHLY':
+            data['day_of_month'] = day or start.day
+        else:
+            data['day'] = day or start.day
+        if frequency == 'YEARLY':
+            data['month'] = _single_int(parts, 'BYMONTH') or start.month
+        elif 'BYMONTH' in parts:
+            raise ValueError('BYMONTH is not supported on MONTHLY rules.')
+    else:
+        raise ValueError(f'Unsupported FREQ: {frequency}')
+
+    if parts.get('COUNT'):
+        data['count'] = int(parts['COUNT'])
+    if parts.get('UNTIL'):
+        until, is_date = parse_ics_datetime(parts['UNTIL'], {})
+        until_day = until.date() if is_date else until.astimezone(start.tzinfo).date()
+        # An occurrence on the last day only counts if it starts by UNTIL
+        if not is_date and datetime.combine(until_day, start.timetz()) > until:
+            until_day -= timedelta(days=1)
+        data['until'] = until_day.isoformat()
+    return data
+
+
+def _event_record(properties):
+    """EventSerializer input and cancelled dates for one VEVENT's properties."""
+    if 'RECURRENCE-ID' in properties:
+        raise ValueError('Modified occurrences (RECURRENCE-ID) are not supported.')
+    if 'DTSTART' not in properties:
+        raise ValueError('DTSTART is required.')
+    params, value = properties['DTSTART'][0]
+    start, is_date = parse_ics_datetime(value, params)
+    time_zone = params.get('TZID', UTC)
+    if is_date or not is_valid_time_zone(time_zone):
+        time_zone = UTC
+    zone = dt_timezone.utc if time_zone == UTC else ZoneInfo(time_zone)
+    if 'DTEND' in properties:
+        params, value = properties['DTEND'][0]
+        end = parse_ics_datetime(value, params)[0]
+    elif 'DURATION' in properties:
+        end = start + parse_duration(properties['DURATION'][0][1])
+    else:
+        end = start + (timedelta(days=1) if is_date else timedelta())
+
+    def text(name):
+        return unescape_text(properties[name][0][1]) if name in properties else ''
+
+    item = {
+        'title': text('SUMMARY')[:255] or '(No title)',
+        'description': text('DESCRIPTION'),
+        'start_datetime': start.isoformat(),
+        'end_datetime': end.isoformat(),
+        'time_zone': time_zone,
+        'is_recurring': 'RRULE' in properties,
+    }
+    cancelled = set()
+    if 'RRULE' in properties:
+        item['recurrence_rule'] = recurrence_data_from_rrule(properties['RRULE'][0][1], start.astimezone(zone))
+        for params, value in properties.get('EXDATE', ()):
+            for part in value.split(','):
+                # EXDATEs name occurrence starts; exceptions are keyed by their local date
+                moment, is_date = parse_ics_datetime(part, params)
+                cancelled.add(moment.date() if is_date else moment.astimezone(zone).date())
+    return item, sorted(cancelled)
+
+
+def iter_ics_records(lines):
+    """
+    Read VEVENTs from an iterator of text lines, yielding (item, cancelled
+    dates, error) per VEVENT: the EventSerializer input and cancelled dates,
+    or None and None with an error message. Only one VEVENT is held at a time.
+    """
+    properties, depth = None, 0
+    for line in unfold(lines):
+        try:
+            name, params, value = parse_content_line(line)
+        except ValueError:
+            continue
+        if name == 'BEGIN':
+            if value.upper() == 'VEVENT' and properties is None:
+                properties, depth = {}, 0
+            elif properties is not None:
+                depth += 1  # e.g. a VALARM inside the VEVENT
+        elif name == 'END' and properties is not None:
+            if depth:
+                depth -= 1
+                continue
+            try:
+                item, cancelled = _event_record(properties)
+            except (ValueError, KeyError) as e:
+                yield None, None, str(e)
+            else:
+                yield item, cancelled, None
+            properties = None
+        elif properties is not None and not depth:
+            properties.setdefault(name, []).append((params, value))
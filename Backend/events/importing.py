@@ -0,0 +1,139 @@
+"""
+Bulk import of calendars from iCalendar or CSV.
+
+Files are read as a stream of records (a VEVENT or a CSV row), each turned into
+EventSerializer input plus cancelled dates. Records are written a batch at a
+time through events.bulk.bulk_write, with the cancelled dates as
+EventExceptions, each batch in its own transaction. After every batch the
+offset of the next unread record is reported; passing it back as `offset`
+resumes an interrupted import without duplicating what was committed.
+
+CSV files have a header row with the columns title, description,
+start_datetime, end_datetime (ISO 8601), time_zone (an IANA name, optional,
+default UTC), rrule (an RFC 5545 RRULE value, optional) and exdates (local
+dates as YYYY-MM-DD separated by spaces, optional).
+"""
+import csv
+from datetime import date
+from itertools import islice
+from zoneinfo import ZoneInfo
+
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from .bulk import bulk_write
+from .ical import iter_ics_records, recurrence_data_from_rrule
+from .models import EventException
+from .timezones import UTC, is_valid as is_valid_time_zone
+
+FORMATS = ('ics', 'csv')
+DEFAULT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+
+
+def iter_csv_records(lines):
+    """Read CSV rows from an iterator of text lines, yielding (item, cancelled dates, error)."""
+    for row in csv.DictReader(lines):
+        try:
+            start = parse_datetime(row.get('start_datetime') or '')
+            if start is None:
+                raise ValueError('start_datetime must be an ISO 8601 datetime.')
+            time_zone = row.get('time_zone') or UTC
+            item = {
+                'title': row.get('title') or '',
+                'description': row.get('description') or '',
+                'start_datetime': row['start_datetime'],
+                'end_datetime': row.get('end_datetime') or '',
+                'time_zone': time_zone,
+                'is_recurring': bool(row.get('rrule')),
+            }
+            if row.get('rrule'):
+                if start.tzinfo is not None and time_zone != UTC and is_valid_time_zone(time_zone):
+                    start = start.astimezone(ZoneInfo(time_zone))  # rule defaults come from the local date
+                item['recurrence_rule'] = recurrence_data_from_rrule(row['rrule'], start)
+            cancelled = sorted({date.fromisoformat(day) for day in (row.get('exdates') or '').split()})
+        except ValueError as e:
+            yield None, None, str(e)
+        else:
+            yield item, cancelled, None
+
+
+def iter_records(lines, file_format):
+    if file_format == 'ics':
+        return iter_ics_records(lines)
+    if file_format == 'csv':
+        return iter_csv_records(lines)
+    raise ValueError(f"Unknown format {file_format!r}; use one of {', '.join(FORMATS)}.")
+
+
+def guess_format(filename):
+    return 'csv' if filename.lower().endswith('.csv') else 'ics'
+
+
+class ImportResult:
+    def __init__(self, offset):
+        self.next_offset = offset
+        self.processed = 0
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, record, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'record': record, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'processed': self.processed,
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+            'next_offset': self.next_offset,
+        }
+
+
+def _write_batch(user, batch, result):
+    """Write one batch of (record number, item, cancelled dates) in a transaction."""
+    with transaction.atomic():
+        written = bulk_write(user, create=[item for _, item, _ in batch])
+        rejected = {error['index']: error['errors'] for error in written.errors}
+        exceptions = []
+        created = iter(written.created)
+        for index, (record, _, cancelled) in enumerate(batch):
+            if index in rejected:
+                result.error(record, rejected[index])
+                continue
+            event_id = next(created)
+            exceptions.extend(
+                EventException(event_id=event_id, occurrence_date=day, is_cancelled=True) for day in cancelled
+            )
+        EventException.objects.bulk_create(exceptions, batch_size=DEFAULT_BATCH_SIZE, ignore_conflicts=True)
+    result.created += len(written.created)
+
+
+def import_events(user, lines, file_format, offset=0, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Import the records of a text stream into `user`'s calendar, skipping the
+    first `offset` records. `progress`, if given, is called with the
+    ImportResult after each committed batch. Returns the ImportResult.
+    """
+    result = ImportResult(offset)
+    records = islice(enumerate(iter_records(lines, file_format)), offset, None)
+    while True:
+        chunk = list(islice(records, batch_size))
+        if not chunk:
+            return result
+        batch = []
+        for record, (item, cancelled, error) in chunk:
+            if error:
+                result.error(record, error)
+            else:
+                batch.append((record, item, cancelled))
+        if batch:
+            _write_batch(user, batch, result)
+        # Only advanced once the batch is committed, so it is always safe to resume from
+        result.processed += len(chunk)
+        result.next_offset = chunk[-1][0] + 1
+        if progress:
+            progress(result)
@@ -0,0 +1,131 @@
+import asyncio
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User
+from events.benchmarks import bench_host
+
+ENDPOINTS = {
+    'occurrences': ('event-occurrences', 'async-event-occurrences'),
+    'list': ('event-list-create', 'async-event-list'),
+    'free-busy': ('free-busy', 'async-free-busy'),
+}
+
+
+async def asgi_get(application, host, path, query, token):
+    """One GET through the ASGI application in-process. Returns (status, seconds)."""
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': [(b'host', host.encode()), (b'authorization', f'Bearer {token}'.encode())],
+        'client': ('127.0.0.1', 0),
+        'server': (host, 80),
+    }
+    status = None
+    requested = False
+    done = asyncio.Event()
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # Then the client stays connected until the response is complete
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif not message.get('more_body'):
+            done.set()
+
+    started = time.perf_counter()
+    await application(scope, receive, send)
+    return status, time.perf_counter() - started
+
+
+async def load(application, host, path, query, token, total, concurrency, cold):
+    """`total` requests from `concurrency` clients. Returns (seconds, latencies, failures)."""
+    latencies, failures = [], 0
+    numbers = iter(range(total))
+
+    async def client():
+        nonlocal failures
+        for number in numbers:
+            # A distinct query string per request keeps the response cache out of the picture
+            status, elapsed = await asgi_get(application, host, path, f'{query}&bench={number}' if cold else query, token)
+            latencies.append(elapsed)
+            failures += status != 200
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - started, latencies, failures
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the sync (DRF) and async read endpoints under concurrent load, driving the ASGI "
+        "application in-process against the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='User whose calendar is read (and looked up for free/busy).')
+        parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), action='append',
+                            help='Endpoint to compare; repeat for several (default: all).')
+        parser.add_argument('--requests', type=int, default=300)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--days', type=int, default=30, help='Window length for occurrences and free/busy.')
+        parser.add_argument('--warm', action='store_true', help='Let repeated reads hit the response cache.')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user {options['username']!r}")
+
+        token = str(AccessToken.for_user(user))
+        start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        window = f"start={start.date()}&end={(start + timedelta(days=options['days'])).date()}"
+        queries = {
+            'occurrences': window,
+            'list': 'page_size=100',
+            'free-busy': f'{window}&users={user.username}',
+        }
+        application = get_asgi_application()
+        host = bench_host()
+
+        self.stdout.write(
+            f"{options['requests']} requests per run, {options['concurrency']} concurrent clients, "
+            f"{'warm' if options['warm'] else 'cold'} cache\n"
+            f"{'endpoint':<12} {'path':<6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}"
+        )
+        for endpoint in options['endpoint'] or sorted(ENDPOINTS):
+            rates = []
+            for label, url_name in zip(('sync', 'async'), ENDPOINTS[endpoint]):
+                elapsed, latencies, failures = asyncio.run(load(
+                    application, host, reverse(url_name), queries[endpoint], token,
+                    options['requests'], options['concurrency'], not options['warm'],
+                ))
+                latencies.sort()
+                rates.append(len(latencies) / elapsed)
+                self.stdout.write(
+                    f"{endpoint:<12} {label:<6} {rates[-1]:8.1f} {statistics.median(latencies) * 1000:8.1f} "
+                    f"{latencies[int(len(latencies) * 0.95) - 1] * 1000:8.1f} {failures:7d}"
+                )
+            self.stdout.write(f"{'':<12} async/sync throughput: {rates[1] / rates[0]:.2f}x")
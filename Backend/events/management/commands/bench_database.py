@@ -0,0 +1,120 @@
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+from django.test.utils import override_settings
+
+from events import versioning
+from events.database import replica_reads, sqlite_pragmas
+from events.models import Event
+from events.rows import event_columns, serialize_events
+from events.serializers import EventSerializer
+
+# SQLite's own defaults: rollback journal, fsync on every commit, 2 MB cache, no mmap
+ROLLBACK_PRAGMAS = {'journal_mode': 'delete', 'synchronous': 'full', 'cache_size': -2000, 'mmap_size': 0}
+PAGE_SIZE = 100
+
+
+def worker(operation, deadline, reconnect, latencies, errors):
+    """Run `operation` until `deadline`, like requests on one server thread."""
+    rng = random.Random(threading.get_ident())
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                operation(rng)
+            except OperationalError:
+                errors.append(1)  # "database is locked"
+            else:
+                latencies.append(time.perf_counter() - started)
+            if reconnect:
+                # What the end of a request does with CONN_MAX_AGE = 0
+                connection.close()
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure read and write throughput of concurrent threads on the configured SQLite database, with "
+        "SQLite's default journal and per-request connections, then with EVENTS_SQLITE_PRAGMAS, then with "
+        "persistent connections as well. Run `manage.py seed_bench` first; writes re-save existing events."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='bench', help='Username prefix of the seeded users.')
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each run.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark compares SQLite settings; the default database is not SQLite.')
+        rows = list(Event.objects.filter(user__username__startswith=options['prefix']).values_list('pk', 'user_id'))
+        if not rows:
+            raise CommandError(f"No events for users named {options['prefix']}*; run `manage.py seed_bench` first.")
+        event_ids = [pk for pk, _ in rows]
+        user_ids = sorted({user_id for _, user_id in rows})
+        columns = event_columns(EventSerializer.Meta.fields)
+
+        def read(rng):
+            # What the event list endpoint reads: version, one page, its exceptions
+            user_id = rng.choice(user_ids)
+            with replica_reads():
+                versioning.current(user_id)
+                page = list(Event.objects.filter(user_id=user_id).order_by('start_datetime', 'id').values(*columns)[:PAGE_SIZE])
+                serialize_events(page)
+
+        def write(rng):
+            event = Event.objects.get(pk=rng.choice(event_ids))
+            with transaction.atomic():
+                event.save(update_fields=['description'])
+
+        runs = (
+            ('rollback journal, connection per request', ROLLBACK_PRAGMAS, True),
+            ('WAL + pragmas, connection per request', sqlite_pragmas(), True),
+            ('WAL + pragmas, persistent connections', sqlite_pragmas(), False),
+        )
+        self.stdout.write(
+            f"{options['readers']} reader and {options['writers']} writer threads, {options['seconds']}s per run, "
+            f"{len(user_ids)} users\n"
+            f"{'run':<42} {'reads/s':>8} {'p95 ms':>7} {'writes/s':>9} {'p95 ms':>7} {'locked':>7}"
+        )
+        baseline = None
+        for label, pragmas, reconnect in runs:
+            with override_settings(EVENTS_SQLITE_PRAGMAS=pragmas):
+                # Opening a connection applies the pragmas; the journal mode sticks to the file
+                connection.close()
+                connection.ensure_connection()
+                connection.close()
+                reads, writes, errors = [], [], []
+                deadline = time.perf_counter() + options['seconds']
+                threads = [
+                    threading.Thread(target=worker, args=(operation, deadline, reconnect, latencies, errors))
+                    for operation, latencies, count in ((read, reads, options['readers']), (write, writes, options['writers']))
+                    for _ in range(count)
+                ]
+                started = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - started
+            rates = (len(reads) / elapsed, len(writes) / elapsed)
+            baseline = baseline or rates
+            self.stdout.write(
+                f"{label:<42} {rates[0]:8.1f} {self.p95(reads):7.1f} {rates[1]:9.1f} {self.p95(writes):7.1f} {len(errors):7d}"
+            )
+        self.stdout.write(
+            f"{'':<42} reads x{rates[0] / max(baseline[0], 1e-9):.2f}, writes x{rates[1] / max(baseline[1], 1e-9):.2f} "
+            "against the first run"
+        )
+        connection.close()
+
+    def p95(self, latencies):
+        if not latencies:
+            return 0.0
+        latencies.sort()
+        return latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1000
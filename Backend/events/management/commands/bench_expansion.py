@@ -0,0 +1,55 @@
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+
+from events.batch import expand_batch
+from events.recurrence import expand_event
+from events.synthetic import synthetic_series
+
+
+class Command(BaseCommand):
+    help = "Compare scalar and NumPy batch expansion on synthetic series (no database access)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--series', type=int, default=3000)
+        parser.add_argument('--days', type=int, default=90, help='Window length in days.')
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        events = synthetic_series(options['series'], options['seed'])
+        window_start = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        window_end = window_start + timedelta(days=options['days'])
+        cancelled = {event.pk: {window_start.date() + timedelta(days=event.pk % 7)} for event in events}
+
+        def scalar():
+            return [expand_event(event, window_start, window_end, cancelled[event.pk]) for event in events]
+
+        def batch():
+            return expand_batch(events, window_start, window_end, cancelled)
+
+        scalar_time, scalar_result = self.best_of(scalar, options['repeat'])
+        batch_time, batch_result = self.best_of(batch, options['repeat'])
+
+        expected = [(o.event.pk, o.start.replace(tzinfo=None)) for spans in scalar_result for o in spans]
+        actual = list(zip(batch_result.event_ids.tolist(), batch_result.starts.tolist()))
+        if expected != actual:
+            self.stderr.write(self.style.ERROR("Batch expansion does not match the scalar path."))
+            return
+
+        self.stdout.write(
+            f"{options['series']} series, {options['days']} day window, {len(actual)} occurrences\n"
+            f"  scalar: {scalar_time * 1000:9.1f} ms\n"
+            f"  batch:  {batch_time * 1000:9.1f} ms\n"
+        )
+        self.stdout.write(self.style.SUCCESS(f"  speedup: {scalar_time / batch_time:.1f}x (results identical)"))
+
+    def best_of(self, func, repeat):
+        best, result = None, None
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
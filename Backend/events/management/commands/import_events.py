@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from events.importing import DEFAULT_BATCH_SIZE, FORMATS, guess_format, import_events
+
+
+class Command(BaseCommand):
+    help = "Import an iCalendar (.ics) or CSV file into a user's calendar, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension.')
+        parser.add_argument('--offset', type=int, default=0, help='Records to skip, to resume an interrupted import.')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(f"No user named {options['username']!r}.")
+        file_format = options['format'] or guess_format(options['path'])
+
+        self.next_offset = options['offset']
+        with open(options['path'], encoding='utf-8-sig', newline='') as lines:
+            try:
+                result = import_events(
+                    user, lines, file_format, options['offset'], options['batch_size'], progress=self.progress,
+                )
+            except (Exception, KeyboardInterrupt):
+                self.stderr.write(f"Import stopped; resume with --offset {self.next_offset}")
+                raise
+
+        for error in result.errors:
+            self.stdout.write(f"  record {error['record']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.created} events from {result.processed} records ({result.failed} failed)."
+        ))
+
+    def progress(self, result):
+        self.next_offset = result.next_offset
+        self.stdout.write(
+            f"  {result.next_offset} records read, {result.created} events created, {result.failed} failed"
+        )
@@ -0,0 +1,17 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from events.sync import prune
+
+
+class Command(BaseCommand):
+    help = 'Drop change log entries older than --days. Clients holding older sync tokens get a full snapshot. Run daily.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Days of changes to keep.')
+
+    def handle(self, *args, **options):
+        deleted = prune(timezone.now() - timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f'{deleted} changes pruned.'))
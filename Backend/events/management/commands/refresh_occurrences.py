@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from events.occurrence_index import roll_horizon
+
+
+class Command(BaseCommand):
+    help = "Roll the materialized occurrence index forward to today's horizon. Run daily."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Re-expand every event instead of only series reaching the new days.',
+        )
+
+    def handle(self, *args, **options):
+        (start, end), created, deleted = roll_horizon(full=options['full'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f"Occurrences materialized from {start:%Y-%m-%d} to {end:%Y-%m-%d} "
+            f"({created} created, {deleted} deleted)."
+        ))
@@ -0,0 +1,43 @@
+import json
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from accounts.models import User
+from events.benchmarks import CASES, run_suite
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the hot paths (rule expansion, list serialization, cancel-occurrence, login) on a seeded "
+        "calendar and print the results as JSON, for comparing runs between commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', default='bench0', help='Seeded user to run as (see seed_bench).')
+        parser.add_argument('--password', default='bench-pass-123')
+        parser.add_argument('--case', action='append', choices=sorted(CASES), help='Case to run; repeat for several.')
+        parser.add_argument('--rounds', type=int, default=20)
+        parser.add_argument('--window-start', default='2026-01-01', help='Start of the expansion window (YYYY-MM-DD).')
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['user']).first()
+        if user is None:
+            raise CommandError(f"No user {options['user']!r}; create one with `manage.py seed_bench`.")
+        day = parse_date(options['window_start'])
+        if day is None:
+            raise CommandError("--window-start must be YYYY-MM-DD.")
+        window_start = datetime(day.year, day.month, day.day, tzinfo=dt_timezone.utc)
+
+        report = run_suite(user, options['password'], window_start, max(options['rounds'], 1), options['case'],
+                           progress=self.progress)
+        text = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(text + '\n')
+        self.stdout.write(text)
+
+    def progress(self, name, result):
+        self.stderr.write(f"  {name:<26} median {result['median_ms']:9.3f} ms")
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from events.reminders import ReminderDispatcher, get_sink, reminder_setting
+
+
+class Command(BaseCommand):
+    help = (
+        "Long-running worker that delivers event reminders through the configured sink "
+        "(EVENTS_REMINDERS['SINK']). Run one instance."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sink', help='Dotted path of the sink class (default: the setting).')
+        parser.add_argument('--window', type=int, help='Seconds of reminders loaded ahead.')
+        parser.add_argument('--poll', type=float, help='Seconds between checks for edits.')
+
+    def handle(self, *args, **options):
+        dispatcher = ReminderDispatcher(get_sink(options['sink']), window=options['window'])
+        poll = options['poll'] or reminder_setting('POLL_INTERVAL')
+        self.stdout.write(f"Delivering reminders; checking for edits every {poll}s. Stop with Ctrl-C.")
+        try:
+            while True:
+                close_old_connections()
+                delivered = dispatcher.tick()
+                if delivered:
+                    self.stdout.write(f"  {len(delivered)} reminders delivered")
+                # Wake for the next due reminder if it comes before the next poll
+                next_due = dispatcher.next_due()
+                delay = poll
+                if next_due is not None:
+                    delay = min(poll, max((next_due - timezone.now()).total_seconds(), 0))
+                time.sleep(delay)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped.")
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from events.synthetic import seed_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Create synthetic users with events, every kind of recurrence rule and cancelled occurrences, "
+        "for `manage.py run_bench` and other measurements."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--events', type=int, default=500, help='Events per user.')
+        parser.add_argument('--recurring', type=float, default=0.6, help='Share of events that are series.')
+        parser.add_argument('--exceptions', type=int, default=2, help='Most cancelled occurrences per series.')
+        parser.add_argument('--prefix', default='bench', help='Usernames are the prefix plus a number.')
+        parser.add_argument('--password', default='bench-pass-123')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--replace', action='store_true', help='Delete existing users with the prefix first.')
+
+    def handle(self, *args, **options):
+        existing = User.objects.filter(username__startswith=options['prefix'])
+        if existing.exists():
+            if not options['replace']:
+                raise CommandError(f"Users named {options['prefix']}* exist; pass --replace to recreate them.")
+            self.stdout.write(f"Deleting {existing.count()} existing {options['prefix']}* users...")
+            existing.delete()
+
+        users, events, rules, exceptions = seed_users(
+            options['prefix'], options['users'], options['events'], options['recurring'], options['exceptions'],
+            options['password'], options['seed'], progress=self.progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {users} users, {events} events ({rules} series) and {exceptions} cancelled occurrences."
+        ))
+
+    def progress(self, users, events, rules, exceptions):
+        self.stdout.write(f"  {users} users, {events} events written")
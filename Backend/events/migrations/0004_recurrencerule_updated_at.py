@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_occurrence_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recurrencerule',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:04
+
+import django.core.validators
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_calendar_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='reminder_minutes',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True, validators=[django.core.validators.MaxValueValidator(10080)]),
+        ),
+        migrations.AlterField(
+            model_name='calendarversion',
+            name='changed_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='occurrence',
+            index=models.Index(fields=['start'], name='occurrence_start_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:28
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def start_logs(apps, schema_editor):
+    # Nothing before now is logged: tokens from existing versions get a full snapshot
+    CalendarVersion = apps.get_model('events', 'CalendarVersion')
+    CalendarVersion.objects.update(log_start=F('version'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0007_reminders'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calendarversion',
+            name='log_start',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='CalendarChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.PositiveBigIntegerField()),
+                ('event_id', models.BigIntegerField()),
+                ('kind', models.CharField(choices=[('event', 'Event'), ('rule', 'Recurrence rule'), ('exception', 'Exception')], max_length=10)),
+                ('object_id', models.BigIntegerField(blank=True, null=True)),
+                ('action', models.CharField(choices=[('create', 'Create'), ('update', 'Update'), ('delete', 'Delete')], max_length=6)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calendar_changes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'sequence'], name='change_user_sequence_idx')],
+            },
+        ),
+        migrations.RunPython(start_logs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0008_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='time_zone',
+            field=models.CharField(default='UTC', max_length=64),
+        ),
+    ]
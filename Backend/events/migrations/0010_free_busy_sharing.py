@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_remove_user_email_user_username'),
+        ('events', '0009_event_time_zone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FreeBusySharing',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='free_busy_sharing', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
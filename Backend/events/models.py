@@ -1,7 +1,13 @@
-from django.db import models
+from django.core.validators import MaxValueValidator
+from django.db import models, transaction
+from django.db.models import Q
 from django.conf import settings
 from django.utils import timezone
 from accounts.models import User
+from . import recurrence
+
+# Reminders can be set up to a week ahead.
+MAX_REMINDER_MINUTES = 7 * 24 * 60
 
 class Event(models.Model):
     """
@@ -12,6 +18,8 @@ class Event(models.Model):
     description = models.TextField(blank=True)
     start_datetime = models.DateTimeField()
     end_datetime = models.DateTimeField()
+    # IANA zone whose wall-clock time the occurrences keep (see events.timezones)
+    time_zone = models.CharField(max_length=64, default='UTC')
     is_recurring = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -19,9 +27,46 @@ class Event(models.Model):
     # Soft delete flag, optional
     is_active = models.BooleanField(default=True)
 
+    # Remind this many minutes before each occurrence starts (see events.reminders)
+    reminder_minutes = models.PositiveIntegerField(
+        blank=True, null=True, db_index=True, validators=[MaxValueValidator(MAX_REMINDER_MINUTES)],
+    )
+
+    class Meta:
+        indexes = [
+            # Keyset pagination and time-range filters on the event list
+            models.Index(fields=['user', 'start_datetime', 'id'], name='event_user_start_idx'),
+        ]
+
     def __str__(self):
         return f"{self.title} ({self.start_datetime})"
 
+    def next_occurrences(self, limit=1, after=None):
+        """The next `limit` non-cancelled occurrences starting at or after `after` (default now)."""
+        after = after or timezone.now()
+        cancelled = set(
+            self.exceptions.filter(is_cancelled=True, occurrence_date__gte=after.date() - recurrence.DATE_MARGIN).values_list('occurrence_date', flat=True)
+        )
+        return recurrence.next_occurrences(self, after, limit, cancelled)
+
+    def occurrence_on(self, day):
+        """(occurrence on `day` or None, whether it is cancelled)."""
+        occurrence = recurrence.occurrence_on(self, day)
+        if occurrence is None:
+            return None, False
+        return occurrence, self.exceptions.filter(occurrence_date=day, is_cancelled=True).exists()
+
+    def last_occurrence_date(self):
+        """Date of the final occurrence, or None for a series without end."""
+        return recurrence.last_occurrence_date(self)
+
+    def delete(self, *args, **kwargs):
+        from . import versioning  # imports this module
+
+        # The cascade fires a signal per rule and exception; bump the version once
+        with transaction.atomic(), versioning.batched_bumps():
+            return super().delete(*args, **kwargs)
+
 
 class RecurrenceRule(models.Model):
     event = models.OneToOneField(Event, on_delete=models.CASCADE, related_name='recurrence_rule')
@@ -56,6 +101,9 @@ class RecurrenceRule(models.Model):
     # Count of occurrences (optional, mutually exclusive with until)
     count = models.PositiveIntegerField(blank=True, null=True)
 
+    # Part of the compiled rule cache key (see events.recurrence.get_compiled_rule)
+    updated_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
         return f"Recurs {self.frequency} every {self.interval} interval(s)"
 
@@ -78,3 +126,114 @@ class EventException(models.Model):
     def __str__(self):
         status = "Cancelled" if self.is_cancelled else "Modified"
         return f"Exception on {self.occurrence_date} ({status})"
+
+
+class Occurrence(models.Model):
+    """
+    Materialized occurrence of an event inside the rolling horizon, so calendar
+    range reads are an indexed scan instead of recurrence math per request.
+    Maintained by events.occurrence_index; never edit rows by hand.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='occurrences')
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='occurrences')
+    occurrence_date = models.DateField()
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('event', 'occurrence_date')
+        indexes = [
+            models.Index(fields=['user', 'start', 'end'], name='occurrence_user_range_idx'),
+            # Reminder windows across all users
+            models.Index(fields=['start'], name='occurrence_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id} on {self.occurrence_date}"
+
+
+class OccurrenceHorizon(models.Model):
+    """
+    Single row holding the window currently materialized into Occurrence.
+    Absent until `manage.py refresh_occurrences` has run once.
+    """
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Occurrences materialized from {self.start} to {self.end}"
+
+
+class FreeBusySharing(models.Model):
+    """
+    Opt-in of a user to free/busy lookups by other signed-in users (see
+    FreeBusyView). Users without a row can only look up themselves.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='free_busy_sharing')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Free/busy of {self.user_id} shared"
+
+
+class CalendarVersion(models.Model):
+    """
+    Per-user counter bumped on every write to the user's events, rules or
+    exceptions. Drives ETags, the response cache and the sync tokens of the
+    change log (see events.versioning and events.sync).
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='calendar_version')
+    version = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField(default=timezone.now, db_index=True)
+    # CalendarChange holds every change after this version; older sync tokens get a full snapshot
+    log_start = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Calendar of {self.user_id} at version {self.version}"
+
+
+class CalendarChange(models.Model):
+    """
+    One create, update or delete of an event, rule or exception, logged with
+    the user's calendar version after the write. Deletes stay as tombstones
+    until `manage.py prune_changes` removes old entries.
+    """
+    EVENT, RULE, EXCEPTION = 'event', 'rule', 'exception'
+    KIND_CHOICES = [(EVENT, 'Event'), (RULE, 'Recurrence rule'), (EXCEPTION, 'Exception')]
+    CREATE, UPDATE, DELETE = 'create', 'update', 'delete'
+    ACTION_CHOICES = [(CREATE, 'Create'), (UPDATE, 'Update'), (DELETE, 'Delete')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='calendar_changes')
+    sequence = models.PositiveBigIntegerField()
+    # Plain ids rather than foreign keys, so tombstones outlive the rows
+    event_id = models.BigIntegerField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField(blank=True, null=True)
+    action = models.CharField(max_length=6, choices=ACTION_CHOICES)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'sequence'], name='change_user_sequence_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.action} {self.kind} {self.object_id} of event {self.event_id} at {self.sequence}"
+
+
+def overlapping_events(start=None, end=None):
+    """
+    Q matching events with an occurrence that may overlap [start, end): one-off
+    events by their own span, recurring series by start date and `until`.
+    """
+    query = Q()
+    if end is not None:
+        query &= Q(start_datetime__lt=end)
+    if start is not None:
+        query &= (
+            Q(is_recurring=True, recurrence_rule__isnull=False, recurrence_rule__until__isnull=True)
+            | Q(is_recurring=True, recurrence_rule__until__gte=start.date() - recurrence.DATE_MARGIN)
+            | Q(end_datetime__gte=start)
+        )
+    return query
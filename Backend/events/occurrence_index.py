@@ -0,0 +1,264 @@
+"""
+Maintenance of the materialized Occurrence table.
+
+The table covers a rolling horizon (see EVENTS_OCCURRENCE_INDEX in settings).
+Writes to a series re-expand only that series and apply the difference; the
+horizon itself is rolled forward by `manage.py refresh_occurrences`. Until that
+command has run once there is no OccurrenceHorizon row and reads fall back to
+expanding rules on the fly.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Event, EventException, Occurrence, OccurrenceHorizon
+from .recurrence import DATE_MARGIN, expand_event
+
+HORIZON_CACHE_KEY = 'events:occurrence-horizon'
+HORIZON_CACHE_TIMEOUT = 60
+
+# Event ids whose refresh is being collected by batched_refresh(), per thread
+_pending = threading.local()
+
+DEFAULTS = {
+    'PAST_DAYS': 90,
+    'FUTURE_DAYS': 548,
+    'BATCH_SIZE': 500,
+}
+
+
+def index_setting(name):
+    return getattr(settings, 'EVENTS_OCCURRENCE_INDEX', {}).get(name, DEFAULTS[name])
+
+
+def target_horizon(today=None):
+    """The window the index should cover as of `today`."""
+    today = today or timezone.now().date()
+    start = datetime.combine(today - timedelta(days=index_setting('PAST_DAYS')), time.min)
+    end = datetime.combine(today + timedelta(days=index_setting('FUTURE_DAYS')), time.min)
+    return timezone.make_aware(start), timezone.make_aware(end)
+
+
+def published_horizon():
+    """
+    Bounds readers may rely on, cached briefly. The end only ever moves
+    forward, so a stale value never claims future days that are not filled.
+    """
+    bounds = cache.get(HORIZON_CACHE_KEY)
+    if bounds is None:
+        row = OccurrenceHorizon.objects.first()
+        bounds = (row.start, row.end) if row else ()
+        cache.set(HORIZON_CACHE_KEY, bounds, HORIZON_CACHE_TIMEOUT)
+    return bounds or None
+
+
+async def apublished_horizon():
+    """published_horizon() for async views."""
+    bounds = await cache.aget(HORIZON_CACHE_KEY)
+    if bounds is None:
+        row = await OccurrenceHorizon.objects.afirst()
+        bounds = (row.start, row.end) if row else ()
+        await cache.aset(HORIZON_CACHE_KEY, bounds, HORIZON_CACHE_TIMEOUT)
+    return bounds or None
+
+
+def _within(horizon, window_start, window_end):
+    return horizon is not None and horizon[0] <= window_start and window_end <= horizon[1]
+
+
+def covers(window_start, window_end):
+    return _within(published_horizon(), window_start, window_end)
+
+
+async def acovers(window_start, window_end):
+    return _within(await apublished_horizon(), window_start, window_end)
+
+
+def _write_horizon():
+    """
+    Window a series must be materialized over when it changes: whatever is
+    published, widened to today's target so a concurrent roll-forward cannot
+    publish bounds this write did not fill. None while the index is inactive.
+    """
+    row = OccurrenceHorizon.objects.first()
+    if row is None:
+        return None
+    start, end = target_horizon()
+    return min(row.start, start), max(row.end, end)
+
+
+def _chunks(items, size):
+    for offset in range(0, len(items), size):
+        yield items[offset:offset + size]
+
+
+def sync_event(event, horizon, cancelled_dates):
+    """
+    Bring the Occurrence rows of one event in line with its rule over `horizon`,
+    writing only the rows that changed. Returns (created, deleted).
+    """
+    wanted = set()
+    if event.is_active:
+        wanted = {
+            (occurrence.occurrence_date, occurrence.start, occurrence.end)
+            for occurrence in expand_event(event, *horizon, cancelled_dates)
+        }
+    existing = {
+        (occurrence_date, start, end): pk
+        for pk, occurrence_date, start, end in Occurrence.objects.filter(event=event).values_list(
+            'pk', 'occurrence_date', 'start', 'end'
+        )
+    }
+
+    stale = [pk for key, pk in existing.items() if key not in wanted]
+    fresh = [
+        Occurrence(user_id=event.user_id, event=event, occurrence_date=day, start=start, end=end)
+        for day, start, end in wanted
+        if (day, start, end) not in existing
+    ]
+    if not stale and not fresh:
+        return 0, 0
+
+    batch_size = index_setting('BATCH_SIZE')
+    with transaction.atomic():
+        for pks in _chunks(stale, batch_size):
+            Occurrence.objects.filter(pk__in=pks).delete()
+        Occurrence.objects.bulk_create(fresh, batch_size=batch_size)
+    return len(fresh), len(stale)
+
+
+def cancelled_dates(event_ids, window_start, window_end):
+    """Cancelled occurrence dates around a window, as event id -> set of dates."""
+    cancelled = {}
+    rows = EventException.objects.filter(
+        event_id__in=event_ids,
+        is_cancelled=True,
+        occurrence_date__gte=window_start.date() - DATE_MARGIN,
+        occurrence_date__lte=window_end.date() + DATE_MARGIN,
+    ).values_list('event_id', 'occurrence_date')
+    for event_id, occurrence_date in rows:
+        cancelled.setdefault(event_id, set()).add(occurrence_date)
+    return cancelled
+
+
+def refresh_event(event_id):
+    """Recompute the materialized occurrences of a single series."""
+    horizon = _write_horizon()
+    if horizon is None:
+        return
+    event = Event.objects.select_related('recurrence_rule').filter(pk=event_id).first()
+    if event is None:
+        Occurrence.objects.filter(event_id=event_id).delete()
+        return
+    sync_event(event, horizon, cancelled_dates([event_id], *horizon).get(event_id, set()))
+
+
+def refresh_events(event_ids):
+    """Recompute the materialized occurrences of several series, a batch at a time."""
+    horizon = _write_horizon()
+    if horizon is None:
+        return
+    event_ids = list(event_ids)
+    for ids in _chunks(event_ids, index_setting('BATCH_SIZE')):
+        events = list(Event.objects.select_related('recurrence_rule').filter(pk__in=ids))
+        # One commit per batch rather than one per series
+        with transaction.atomic():
+            _sync_batch(events, horizon, 0, 0)
+
+
+def schedule_refresh(event_id):
+    """
+    Refresh a series now, inside the current transaction, or at the end of the
+    enclosing batched_refresh() block. The rows commit with the write and its
+    version bump, so no reader can cache the old occurrences under the new
+    version.
+    """
+    event_ids = getattr(_pending, 'event_ids', None)
+    if event_ids is not None:
+        event_ids.add(event_id)
+        return
+    refresh_event(event_id)
+
+
+@contextmanager
+def batched_refresh():
+    """
+    Collect the refreshes scheduled inside the block (by signals, or by adding
+    ids to the yielded set) and run them as one refresh_events() when it ends.
+    Use inside the transaction doing the writes, so the index commits with them.
+    """
+    if getattr(_pending, 'event_ids', None) is not None:
+        yield _pending.event_ids
+        return
+    _pending.event_ids = set()
+    try:
+        yield _pending.event_ids
+        event_ids = _pending.event_ids
+    finally:
+        _pending.event_ids = None
+    if event_ids:
+        refresh_events(event_ids)
+
+
+def drop_occurrence(event_id, occurrence_date):
+    """Remove a single cancelled occurrence without re-expanding its series."""
+    Occurrence.objects.filter(event_id=event_id, occurrence_date=occurrence_date).delete()
+
+
+def drop_occurrences(event_id, occurrence_dates):
+    """Remove several cancelled occurrences of one series in a single statement."""
+    Occurrence.objects.filter(event_id=event_id, occurrence_date__in=occurrence_dates).delete()
+
+
+def roll_horizon(today=None, full=False, stdout=None):
+    """
+    Move the materialized window to today's target. Only series that can have
+    occurrences in the newly covered days are re-expanded, unless `full` is set
+    or the index is being built for the first time.
+    """
+    horizon = target_horizon(today)
+    previous = OccurrenceHorizon.objects.first()
+    events = Event.objects.select_related('recurrence_rule').order_by('pk')
+    if previous is not None and not full:
+        ongoing_series = Q(is_recurring=True, recurrence_rule__isnull=False) & (
+            Q(recurrence_rule__until__isnull=True) | Q(recurrence_rule__until__gte=previous.end.date() - DATE_MARGIN)
+        )
+        newly_covered = Q(start_datetime__gte=previous.end - timedelta(days=1), start_datetime__lt=horizon[1])
+        events = events.filter(ongoing_series | newly_covered)
+
+    batch_size = index_setting('BATCH_SIZE')
+    created = deleted = 0
+    batch = []
+    for event in events.iterator(chunk_size=batch_size):
+        batch.append(event)
+        if len(batch) == batch_size:
+            created, deleted = _sync_batch(batch, horizon, created, deleted)
+            batch = []
+            if stdout:
+                stdout.write(f"  {created} created, {deleted} deleted so far")
+    created, deleted = _sync_batch(batch, horizon, created, deleted)
+
+    # One-off events and finished series are never re-expanded; just drop what fell out.
+    deleted += Occurrence.objects.filter(end__lt=horizon[0]).delete()[0]
+
+    if previous is None:
+        previous = OccurrenceHorizon(start=horizon[0], end=horizon[1])
+    previous.start, previous.end = horizon
+    previous.save()
+    cache.delete(HORIZON_CACHE_KEY)
+    return horizon, created, deleted
+
+
+def _sync_batch(events, horizon, created, deleted):
+    cancelled = cancelled_dates([event.pk for event in events], *horizon)
+    for event in events:
+        added, removed = sync_event(event, horizon, cancelled.get(event.pk, set()))
+        created += added
+        deleted += removed
+    return created, deleted
@@ -0,0 +1,155 @@
+"""
+Process-pool expansion of many calendars, for org-wide exports and reports.
+
+Expansion is CPU-bound, so one process tops out at one core whatever the
+thread count. Here the parent streams the series overlapping a window out of
+the database in (user, event) order with a single `values_list` query, the
+cancelled dates joined in (one row per cancellation), and cuts them into
+chunks of plain tuples: ids, start and end in microseconds, time zone, the
+RecurrenceRule fields and the cancelled dates. Its only per-chunk work is
+grouping those rows, never another query. Workers never touch the database or
+model instances; they rebuild lightweight series objects, run the same
+vectorized expansion as events.batch and send back numpy arrays, which pickle
+as raw buffers.
+
+Chunks are cut by series count, not by user, so one very large calendar is
+still spread over every worker. At most a few chunks per worker are in flight
+and results are yielded in submission order, so memory stays bounded and the
+output is ordered by user, event and start as if expanded in one process.
+"""
+import os
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import FilteredRelation, Q
+
+from .batch import EPOCH, _micros, expand_batch
+from .models import Event, overlapping_events
+from .recurrence import DATE_MARGIN, RULE_FIELDS
+
+DEFAULT_CHUNK_SIZE = 2000
+
+# Chunks queued per worker; keeps every worker busy without reading ahead unbounded.
+CHUNKS_IN_FLIGHT = 2
+
+SERIES_FIELDS = (
+    'pk', 'user_id', 'start_datetime', 'end_datetime', 'time_zone', 'is_recurring',
+    *(f'recurrence_rule__{field}' for field in RULE_FIELDS),
+)
+
+ExpandedChunk = namedtuple('ExpandedChunk', ['user_ids', 'event_ids', 'occurrence_dates', 'starts', 'ends'])
+
+RuleFields = namedtuple('RuleFields', RULE_FIELDS + ('updated_at',))
+
+
+class Series:
+    """The parts of an Event expansion reads, rebuilt from a compact tuple."""
+    __slots__ = ('pk', 'user_id', 'start_datetime', 'end_datetime', 'time_zone', 'is_recurring', 'recurrence_rule')
+
+    # Never cached in the compiled rule LRU: each series is expanded once per run
+    updated_at = None
+
+    def __init__(self, pk, user_id, start_us, end_us, time_zone, rule):
+        self.pk = pk
+        self.user_id = user_id
+        self.start_datetime = EPOCH + timedelta(microseconds=start_us)
+        self.end_datetime = EPOCH + timedelta(microseconds=end_us)
+        self.time_zone = time_zone
+        self.is_recurring = rule is not None
+        self.recurrence_rule = RuleFields(*rule, None) if rule is not None else None
+
+
+def default_workers():
+    return getattr(settings, 'EVENTS_EXPANSION_WORKERS', None) or os.cpu_count() or 1
+
+
+def series_rows(window_start, window_end, user_ids=None):
+    """
+    Active events overlapping the window as compact tuples
+    (pk, user id, start us, end us, time zone, rule field values or None,
+    cancelled dates around the window), ordered by user and event.
+    """
+    cancellations = FilteredRelation('exceptions', condition=Q(
+        exceptions__is_cancelled=True,
+        exceptions__occurrence_date__gte=window_start.date() - DATE_MARGIN,
+        exceptions__occurrence_date__lte=window_end.date() + DATE_MARGIN,
+    ))
+    queryset = Event.objects.filter(overlapping_events(window_start, window_end), is_active=True)
+    if user_ids is not None:
+        queryset = queryset.filter(user_id__in=user_ids)
+    rows = (
+        queryset.annotate(cancellation=cancellations)
+        .order_by('user_id', 'pk')
+        .values_list(*SERIES_FIELDS, 'cancellation__occurrence_date')
+    )
+    series = None
+    for pk, user_id, start, end, time_zone, is_recurring, *rule, cancelled in rows.iterator(chunk_size=DEFAULT_CHUNK_SIZE):
+        if series is None or series[0] != pk:
+            if series is not None:
+                yield series
+            # rule[0] is the frequency; None when the event has no rule row
+            rule = tuple(rule) if is_recurring and rule[0] else None
+            series = (pk, user_id, _micros(start), _micros(end), time_zone, rule, [])
+        if cancelled is not None:
+            series[-1].append(cancelled)
+    if series is not None:
+        yield series
+
+
+def expand_chunk(rows, window_start, window_end):
+    """Worker side: expand a chunk of series tuples."""
+    series = [Series(*row[:-1]) for row in rows]
+    cancelled = {row[0]: set(row[-1]) for row in rows if row[-1]}
+    occurrences = expand_batch(series, window_start, window_end, cancelled)
+    pks = np.array([row[0] for row in rows], dtype=np.int64)
+    owners = np.array([row[1] for row in rows], dtype=np.int64)
+    # Sorted by user, then pk: a chunk spanning users need not be sorted by pk alone
+    order = np.argsort(pks, kind='stable')
+    positions = order[np.searchsorted(pks[order], occurrences.event_ids)] if len(rows) else np.empty(0, dtype=np.int64)
+    return ExpandedChunk(owners[positions], *occurrences)
+
+
+def _chunks(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _init_worker():
+    # Started by spawn/forkserver the worker imports Django afresh; fork inherits it
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def expand_parallel(window_start, window_end, user_ids=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Expand every active series of `user_ids` (all users when None) over
+    [window_start, window_end) on `workers` processes, yielding ExpandedChunks
+    in user, event and start order. With one worker the chunks are expanded in
+    this process.
+    """
+    workers = workers or default_workers()
+    chunks = _chunks(series_rows(window_start, window_end, user_ids), chunk_size)
+    if workers <= 1:
+        for rows in chunks:
+            yield expand_chunk(rows, window_start, window_end)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        pending = deque()
+        for rows in chunks:
+            pending.append(executor.submit(expand_chunk, rows, window_start, window_end))
+            if len(pending) >= workers * CHUNKS_IN_FLIGHT:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
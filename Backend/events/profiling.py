@@ -0,0 +1,287 @@
+"""
+Opt-in request profiling: Server-Timing headers and Prometheus metrics.
+
+With EVENTS_PROFILING['ENABLED'], ProfilingMiddleware times each request and
+splits the time into
+- db: queries run and their time, on any database and any thread the
+  request's queries run on (async views included);
+- serialize: turning rows and model instances into response data
+  (events.rows and the serializers using TimedSerializerMixin);
+- render: encoding the response body (DRF's renderers);
+and records the response size. The breakdown goes back to the client as a
+`Server-Timing` header (browser dev tools show it next to the request), and
+is aggregated per URL name and method in memory: a histogram of wall time
+and running totals of the rest. GET /api/metrics/ serves them in
+Prometheus text format to the addresses in 'METRICS_IPS'.
+
+Everything is per process; Prometheus adds up the workers. With
+'SAMPLE_RATE' below 1 only that fraction of requests is profiled (the rest
+pay one random() call) and the counts are of profiled requests. Disabled,
+the middleware removes itself at startup, and what remains is one context
+variable lookup per query and per serialized page.
+"""
+import bisect
+import contextvars
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import Http404, HttpResponse
+from rest_framework import serializers
+
+DEFAULTS = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 1.0,       # fraction of requests profiled
+    'SERVER_TIMING': True,    # send the breakdown to clients
+    'BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),  # seconds
+    'METRICS_IPS': ('127.0.0.1', '::1'),
+}
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def profiling_setting(name):
+    return getattr(settings, 'EVENTS_PROFILING', {}).get(name, DEFAULTS[name])
+
+
+class Profile:
+    """What one request spent where."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sections = defaultdict(float)  # seconds by section name
+        self.active = set()
+
+
+# The profile of the current request; None when it is not profiled
+_profile = contextvars.ContextVar('events_profile', default=None)
+
+
+@contextmanager
+def timed(section):
+    """Add the time spent in the block to `section` of the current profile, if any."""
+    profile = _profile.get()
+    if profile is None or section in profile.active:
+        yield  # not profiled, or already counted by an enclosing block
+        return
+    profile.active.add(section)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.sections[section] += time.perf_counter() - started
+        profile.active.discard(section)
+
+
+def record_query(execute, sql, params, many, context):
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        # Queries of concurrent tasks of one request may overlap; each is counted whole
+        profile.sections['db'] += time.perf_counter() - started
+        profile.queries += 1
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # The wrapper list survives reconnects
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedSerializerMixin:
+    """
+    Times `.data` as 'serialize'. Set Meta.list_serializer_class to
+    TimedListSerializer to time many=True as well.
+    """
+
+    @property
+    def data(self):
+        with timed('serialize'):
+            return super().data
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    pass
+
+
+class Histogram:
+    """Counts per bucket (not cumulative), sum and count of observed values."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Per (URL name, method) latency histograms and totals, thread-safe."""
+
+    TOTALS = (
+        ('db_queries_total', 'Database queries run by profiled requests.'),
+        ('db_seconds_total', 'Time profiled requests spent in database queries.'),
+        ('serialize_seconds_total', 'Time profiled requests spent serializing response data.'),
+        ('render_seconds_total', 'Time profiled requests spent rendering response bodies.'),
+        ('response_bytes_total', 'Size of the non-streaming responses of profiled requests.'),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latency = {}
+            self.totals = defaultdict(lambda: defaultdict(float))
+
+    def observe(self, view, method, wall_time, profile, size):
+        key = (view, method)
+        with self._lock:
+            histogram = self.latency.get(key)
+            if histogram is None:
+                histogram = self.latency[key] = Histogram(tuple(profiling_setting('BUCKETS')))
+            histogram.observe(wall_time)
+            totals = self.totals[key]
+            totals['db_queries_total'] += profile.queries
+            totals['db_seconds_total'] += profile.sections.get('db', 0)
+            totals['serialize_seconds_total'] += profile.sections.get('serialize', 0)
+            totals['render_seconds_total'] += profile.sections.get('render', 0)
+            totals['response_bytes_total'] += size
+
+    def prometheus(self):
+        """The metrics in Prometheus text exposition format."""
+        def labels(key, **extra):
+            pairs = {'view': key[0], 'method': key[1], **extra}
+            return ','.join(f'{name}="{escape(value)}"' for name, value in pairs.items())
+
+        with self._lock:
+            latency = {key: (histogram.buckets, list(histogram.counts), histogram.sum, histogram.count)
+                       for key, histogram in self.latency.items()}
+            totals = {key: dict(values) for key, values in self.totals.items()}
+
+        lines = [
+            '# HELP http_request_duration_seconds Wall time of profiled requests.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for key, (buckets, counts, total, count) in sorted(latency.items()):
+            cumulative = 0
+            for bound, bucket_count in zip((*buckets, '+Inf'), counts):
+                cumulative += bucket_count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels(key, le=bound)}}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels(key)}}} {total!r}')
+            lines.append(f'http_request_duration_seconds_count{{{labels(key)}}} {count}')
+        for name, help_text in self.TOTALS:
+            lines += [f'# HELP http_request_{name} {help_text}', f'# TYPE http_request_{name} counter']
+            for key, values in sorted(totals.items()):
+                lines.append(f'http_request_{name}{{{labels(key)}}} {format_number(values[name])}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_number(value):
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+metrics = Metrics()
+
+
+def server_timing(wall_time, profile):
+    """The Server-Timing header value for `profile` (durations in ms)."""
+    entries = [f'db;dur={profile.sections.get("db", 0) * 1000:.2f};desc="{profile.queries} queries"']
+    entries += [
+        f'{section};dur={profile.sections[section] * 1000:.2f}'
+        for section in ('serialize', 'render') if section in profile.sections
+    ]
+    entries.append(f'total;dur={wall_time * 1000:.2f}')
+    return ', '.join(entries)
+
+
+class ProfilingMiddleware:
+    """See the module docstring. List it first in MIDDLEWARE so the wall time covers the rest."""
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        if not profiling_setting('ENABLED'):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.sample_rate = profiling_setting('SAMPLE_RATE')
+        self.server_timing = profiling_setting('SERVER_TIMING')
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        profile = Profile()
+        token = _profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _profile.reset(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        profile = Profile()
+        token = _profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _profile.reset(token)
+        return self.finish(request, response, profile)
+
+    def process_template_response(self, request, response):
+        # DRF responses render after the view returns; time that as 'render'
+        profile = _profile.get()
+        if profile is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                profile.sections['render'] += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, profile):
+        wall_time = time.perf_counter() - profile.started
+        match = request.resolver_match
+        view = match.view_name if match is not None else '<unresolved>'
+        size = 0 if response.streaming else len(response.content)
+        metrics.observe(view, request.method, wall_time, profile, size)
+        if self.server_timing:
+            response['Server-Timing'] = server_timing(wall_time, profile)
+        return response
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint: GET /api/metrics/, from METRICS_IPS only."""
+    if request.META.get('REMOTE_ADDR') not in profiling_setting('METRICS_IPS'):
+        raise Http404()
+    return HttpResponse(metrics.prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,179 @@
+"""
+Server-sent change notifications, fanned out in process.
+
+A client opens GET /api/async/events/stream/ (an EventSource) and gets an SSE
+`change` message whenever the user's events, rules or exceptions are written:
+
+    id: 42
+    event: change
+    data: {"token": "42", "changes": [[12, "exception", "update"], ...]}
+
+`token` is the calendar version after the write, the same token the sync
+endpoint hands out (events.sync), and each change is [event id, kind,
+action]. The changes are a hint for what to re-read; clients catch up with
+GET /api/events/sync/?token=<their last token>. `changes` is left out when a
+write touched more than EVENTS_PUSH['MAX_CHANGES'] rows, or when the change
+was noticed by polling (below).
+
+Streams are async views, so each costs a coroutine and a queue, not a
+thread, under an ASGI server. Writes (events.versioning) hand their changes
+to the broker after commit, and only when a stream of that user is open in
+this process, so with nobody listening a write costs a dict lookup. Writes
+made by other processes never reach this broker: every HEARTBEAT seconds
+each stream reads the user's version (one indexed row) and sends a
+notification without `changes` if it moved, else a keep-alive comment. A
+stream that falls QUEUE_SIZE messages behind drops messages, and catches up
+the same way. Browsers reconnect with Last-Event-ID, and are told at once if
+they missed anything.
+
+A stream lives only as long as the token that opened it: at its expiry the
+stream sends an `expired` event and ends, and the client opens a new one with
+a fresh token (and its last token as `last_event_id`). A revoked or expired
+session therefore never keeps receiving notifications.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from .models import CalendarVersion
+
+DEFAULTS = {
+    'HEARTBEAT': 15,     # seconds between keep-alives and version checks
+    'QUEUE_SIZE': 100,   # notifications held per stream before dropping
+    'MAX_CHANGES': 100,  # changes listed per notification
+    'TOKEN_LIFETIME': 300,  # seconds a stream token from /api/events/stream-token/ opens a stream for
+}
+
+EXPIRED = 'event: expired\ndata: {}\n\n'
+
+
+def push_setting(name):
+    return getattr(settings, 'EVENTS_PUSH', {}).get(name, DEFAULTS[name])
+
+
+class Subscription:
+    """One open stream: the user it follows and the queue its notifications go to, on its event loop."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(push_setting('QUEUE_SIZE'))
+
+    def deliver(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            pass  # the version check catches up
+
+
+class Broker:
+    """Thread-safe map of user id -> open subscriptions."""
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def listening(self, user_ids):
+        """The users among `user_ids` with a stream open in this process."""
+        if not self._subscriptions:
+            return set()
+        with self._lock:
+            return {user_id for user_id in user_ids if user_id in self._subscriptions}
+
+    def publish(self, user_id, message):
+        """Queue `message` on each of the user's streams; callable from any thread."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                self.unsubscribe(subscription)  # its loop is closed
+
+
+broker = Broker()
+
+
+def publish_changes(user_ids, changes):
+    """
+    Notify the streams of `user_ids` of (user id, event id, kind, object id,
+    action) changes. Run after the writes commit.
+    """
+    versions = dict(CalendarVersion.objects.filter(user_id__in=user_ids).values_list('user_id', 'version'))
+    by_user = defaultdict(dict)
+    for user_id, event_id, kind, _, action in changes:
+        by_user[user_id][event_id, kind, action] = None  # ordered set
+    for user_id in user_ids:
+        if user_id not in versions:
+            continue
+        message = {'token': str(versions[user_id])}
+        user_changes = by_user[user_id]
+        if len(user_changes) <= push_setting('MAX_CHANGES'):
+            message['changes'] = [list(change) for change in user_changes]
+        broker.publish(user_id, message)
+
+
+def sse(message):
+    """`message` as an SSE `change` event."""
+    return f"id: {message['token']}\nevent: change\ndata: {json.dumps(message, separators=(',', ':'))}\n\n"
+
+
+async def current_version(user_id):
+    return await CalendarVersion.objects.filter(user_id=user_id).values_list('version', flat=True).afirst() or 0
+
+
+async def stream(subscription, token=None, expires=None):
+    """
+    The SSE body for `subscription`, whose client last saw `token` (a
+    version, or None for a new client), ending at `expires` (a Unix time, or
+    None for never). Unsubscribes when the client goes away.
+    """
+    heartbeat = push_setting('HEARTBEAT')
+    try:
+        # Subscribed first, so nothing written from here on is missed
+        version = await current_version(subscription.user_id)
+        if token is None or token > version:
+            token = version
+        yield f'retry: {round(heartbeat * 1000)}\n\n'
+        if version > token:
+            token = version
+            yield sse({'token': str(version)})
+        while True:
+            remaining = heartbeat if expires is None else expires - time.time()
+            if remaining <= 0:
+                yield EXPIRED
+                return
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                if expires is not None and time.time() >= expires:
+                    continue
+                version = await current_version(subscription.user_id)
+                if version <= token:
+                    yield ': keep-alive\n\n'
+                    continue
+                message = {'token': str(version)}
+            if int(message['token']) <= token:
+                continue  # already covered by a later notification
+            token = int(message['token'])
+            yield sse(message)
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,598 @@
+"""
+Recurrence expansion for events.
+
+Turns an Event + its RecurrenceRule + cancelled EventExceptions into concrete
+occurrences inside a [window_start, window_end) window.
+
+A rule repeats over "units" (days, Monday-based weeks, months or years) counted
+from the unit holding the event's start date; every `interval`-th unit is an
+active "step". The first step touching the window is computed arithmetically,
+and `count` limits are enforced by counting the occurrences of the skipped steps
+in closed form, so expanding a window costs the same for a series created
+yesterday and one created ten years ago.
+
+Units are counted in the event's time zone: the rule is anchored on the local
+date of the first occurrence and every occurrence starts at the same local time
+of day (events.timezones), so occurrence dates are local dates.
+
+Rules are parsed once into an immutable CompiledRule, kept in a per-process LRU
+keyed on the event id and the event/rule `updated_at` stamps. Each entry also
+records the fields it was compiled from, so an edit that keeps the same stamp
+(a coarse clock, or a queryset update()) is recompiled rather than served stale.
+"""
+import calendar
+import threading
+from bisect import bisect_right
+from collections import OrderedDict, namedtuple
+from datetime import date, timedelta
+from functools import lru_cache
+from math import gcd
+
+from django.conf import settings
+
+from .timezones import WallClock, local_date
+
+WEEKDAY_CODES = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+RULE_FIELDS = (
+    'frequency', 'interval', 'weekdays', 'nth', 'weekday_for_nth', 'day_of_month',
+    'month', 'day', 'until', 'count',
+)
+
+# The Gregorian calendar, weekdays included, repeats every 400 years.
+CYCLE_YEARS = 400
+CYCLE_MONTHS = CYCLE_YEARS * 12
+
+# (weekday of the 1st, days in month) for each month of the cycle,
+# indexed by (year * 12 + month - 1) % CYCLE_MONTHS. 2000 starts a cycle.
+MONTH_TABLE = tuple(
+    calendar.monthrange(2000 + index // 12, index % 12 + 1) for index in range(CYCLE_MONTHS)
+)
+
+# Occurrences overlapping a window have local dates within this of the window's
+# UTC dates: a day for the time of day, and up to another for the zone offset.
+DATE_MARGIN = timedelta(days=2)
+
+OccurrenceSpan = namedtuple('OccurrenceSpan', ['event', 'occurrence_date', 'start', 'end'])
+
+
+def month_info(year, month):
+    """(weekday of the 1st, number of days) for the given month."""
+    return MONTH_TABLE[(year * 12 + month - 1) % CYCLE_MONTHS]
+
+
+def parse_weekdays(value):
+    """
+    Turn the stored comma-joined weekday codes (or a list of codes) into
+    sorted weekday numbers, Monday being 0.
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    # Rows written before weekdays were joined hold the list's repr ("['MO', 'WE']").
+    codes = {code.strip(" []'\"") for code in value}
+    return [index for index, code in enumerate(WEEKDAY_CODES) if code in codes]
+
+
+def nth_weekday_of_month(year, month, nth, weekday):
+    """
+    Day of the month of the nth `weekday` (0=Monday) in the given month, where
+    negative `nth` counts from the end (-1 is the last one). None if the month
+    has no such day (e.g. a 5th Friday).
+    """
+    first_weekday, days_in_month = month_info(year, month)
+    if nth > 0:
+        day = 1 + (weekday - first_weekday) % 7 + (nth - 1) * 7
+    elif nth < 0:
+        last_weekday = (first_weekday + days_in_month - 1) % 7
+        day = days_in_month - (last_weekday - weekday) % 7 + (nth + 1) * 7
+    else:
+        return None
+    if 1 <= day <= days_in_month:
+        return day
+    return None
+
+
+def _day_in_month(year, month, day, nth, weekday):
+    if nth:
+        return nth_weekday_of_month(year, month, nth, weekday)
+    if day <= month_info(year, month)[1]:
+        return day
+    return None
+
+
+def _week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+@lru_cache(maxsize=512)
+def _valid_step_prefix(frequency, interval, month, day, nth, weekday, cycle_offset):
+    """
+    Prefix sums of MONTHLY/YEARLY steps that produce a date, over one cycle.
+
+    `cycle_offset` is the position of the series' first unit inside the
+    400 year cycle. Entry k is the number of steps in [0, k) with a date.
+    """
+    cycle = CYCLE_MONTHS if frequency == 'MONTHLY' else CYCLE_YEARS
+    period = cycle // gcd(cycle, interval)
+    prefix = [0]
+    for step in range(period):
+        position = (cycle_offset + step * interval) % cycle
+        if frequency == 'MONTHLY':
+            year, month_number = 2000 + position // 12, position % 12 + 1
+        else:
+            year, month_number = 2000 + position, month
+        valid = _day_in_month(year, month_number, day, nth, weekday) is not None
+        prefix.append(prefix[-1] + valid)
+    return tuple(prefix)
+
+
+class CompiledRule:
+    """
+    Immutable, pre-parsed RecurrenceRule. Weekdays are held as a bitmask and
+    a sorted tuple, the nth-weekday code as a number, and MONTHLY/YEARLY rules
+    that can skip units carry a per-cycle prefix table of valid steps.
+
+    Compiled without an `anchor` (the series start date) it only validates;
+    expansion needs the anchor, which also fills in RFC 5545 style defaults
+    (weekday, day of month and month of the start date).
+
+    Raises ValueError for values no expansion could honour.
+    """
+    __slots__ = (
+        'frequency', 'interval', 'weekday_mask', 'weekdays', 'month', 'day', 'nth',
+        'weekday', 'until', 'count', 'anchor', 'lead', 'prefix',
+    )
+
+    def __init__(self, frequency, interval=1, weekdays=None, nth=None, weekday_for_nth=None,
+                 day_of_month=None, month=None, day=None, until=None, count=None, anchor=None):
+        if frequency not in FREQUENCIES:
+            raise ValueError(f"Unsupported frequency value: {frequency}")
+        interval = interval or 1
+        if interval < 1:
+            raise ValueError("Field 'interval' must be at least 1.")
+
+        weekday_list = parse_weekdays(weekdays) if frequency == 'WEEKLY' else []
+        if frequency == 'WEEKLY' and not weekday_list and anchor is not None:
+            weekday_list = [anchor.weekday()]
+
+        if day_of_month is not None and not 1 <= day_of_month <= 31:
+            raise ValueError("Field 'day_of_month' must be between 1 and 31.")
+        if month is not None and not 1 <= month <= 12:
+            raise ValueError("Field 'month' must be between 1 and 12.")
+
+        # nth/weekday_for_nth only apply when no fixed day is given.
+        uses_nth = bool(nth) and (
+            (frequency == 'MONTHLY' and not day_of_month)
+            or (frequency == 'YEARLY' and not day)
+        )
+        weekday = None
+        if uses_nth:
+            if not -5 <= nth <= 5:
+                raise ValueError("Field 'nth' must be between -5 and 5.")
+            if weekday_for_nth not in WEEKDAY_CODES:
+                raise ValueError(f"Field 'weekday_for_nth' must be one of {', '.join(WEEKDAY_CODES)}.")
+            weekday = WEEKDAY_CODES.index(weekday_for_nth)
+        else:
+            nth = None
+
+        if frequency == 'MONTHLY':
+            month, day = None, day_of_month or (anchor.day if anchor else None)
+        elif frequency == 'YEARLY':
+            month = month or (anchor.month if anchor else None)
+            if day and month and day > calendar.monthrange(2000, month)[1]:
+                raise ValueError(f"Field 'day' is out of range for month {month}.")
+            day = day or (anchor.day if anchor and not nth else None)
+        else:
+            month = day = None
+
+        init = super().__setattr__
+        init('frequency', frequency)
+        init('interval', interval)
+        init('weekdays', tuple(weekday_list))
+        init('weekday_mask', sum(1 << wd for wd in weekday_list))
+        init('month', month)
+        init('day', day)
+        init('nth', nth)
+        init('weekday', weekday)
+        init('until', until)
+        init('count', count or None)
+        init('anchor', anchor)
+        init('lead', 0)
+        init('prefix', None)
+        if anchor is not None:
+            init('lead', len([d for d in self.unit_dates(0) if d < anchor]))
+            init('prefix', self._prefix())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CompiledRule is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("CompiledRule is immutable")
+
+    def __repr__(self):
+        return f"<CompiledRule {self.frequency}/{self.interval} from {self.anchor}>"
+
+    @classmethod
+    def from_rule(cls, rule, anchor=None):
+        return cls(**{field: getattr(rule, field) for field in RULE_FIELDS}, anchor=anchor)
+
+    @classmethod
+    def from_data(cls, data, anchor=None):
+        return cls(**{field: data.get(field) for field in RULE_FIELDS}, anchor=anchor)
+
+    def _prefix(self):
+        """Valid-step table for MONTHLY/YEARLY rules that can skip a unit, else None."""
+        if self.frequency in ('DAILY', 'WEEKLY'):
+            return None
+        if self.nth:
+            always_valid = -4 <= self.nth <= 4
+        elif self.frequency == 'MONTHLY':
+            always_valid = self.day <= 28
+        else:
+            # 2001 is not a leap year, so February 29th counts as sometimes missing.
+            always_valid = self.day <= calendar.monthrange(2001, self.month)[1]
+        if always_valid:
+            return None
+
+        if self.frequency == 'MONTHLY':
+            offset = (self.anchor.year * 12 + self.anchor.month - 1) % CYCLE_MONTHS
+        else:
+            offset = self.anchor.year % CYCLE_YEARS
+        return _valid_step_prefix(
+            self.frequency, self.interval, self.month, self.day, self.nth, self.weekday, offset,
+        )
+
+    @property
+    def is_empty(self):
+        """True for rules whose units never produce a date (e.g. Feb 29th every 4 years from 2001)."""
+        return self.prefix is not None and self.prefix[-1] == 0
+
+    def unit_index(self, day):
+        """Number of units between the unit holding the anchor and the one holding `day`."""
+        if self.frequency == 'DAILY':
+            return (day - self.anchor).days
+        if self.frequency == 'WEEKLY':
+            return (day - _week_start(self.anchor)).days // 7
+        if self.frequency == 'MONTHLY':
+            return (day.year - self.anchor.year) * 12 + day.month - self.anchor.month
+        return day.year - self.anchor.year
+
+    def unit_start(self, unit):
+        anchor = self.anchor
+        if self.frequency == 'DAILY':
+            return anchor + timedelta(days=unit)
+        if self.frequency == 'WEEKLY':
+            return _week_start(anchor) + timedelta(weeks=unit)
+        if self.frequency == 'MONTHLY':
+            year, month = divmod(anchor.year * 12 + anchor.month - 1 + unit, 12)
+            return anchor.replace(year=year, month=month + 1, day=1)
+        return anchor.replace(year=anchor.year + unit, month=1, day=1)
+
+    def unit_dates(self, unit):
+        """Dates the rule produces inside the given unit, ignoring the series bounds."""
+        start = self.unit_start(unit)
+        if self.frequency == 'DAILY':
+            return [start]
+        if self.frequency == 'WEEKLY':
+            return [start + timedelta(days=wd) for wd in self.weekdays]
+        month = self.month or start.month
+        day_number = _day_in_month(start.year, month, self.day, self.nth, self.weekday)
+        if day_number is None:
+            return []
+        return [start.replace(month=month, day=day_number)]
+
+    def step_for(self, day):
+        """First active step whose unit is not before the one holding `day`."""
+        return max(0, -(-self.unit_index(day) // self.interval))
+
+    def dates_before_step(self, step):
+        """Number of rule dates in steps [0, step), including any before the anchor in step 0."""
+        if self.frequency == 'WEEKLY':
+            return step * len(self.weekdays)
+        if self.prefix is None:
+            return step
+        period = len(self.prefix) - 1
+        full_cycles, rest = divmod(step, period)
+        return full_cycles * self.prefix[period] + self.prefix[rest]
+
+    def step_of_index(self, index):
+        """
+        (step, position within the unit's dates) of the index-th rule date,
+        counted like dates_before_step from the start of step 0.
+        """
+        if self.frequency == 'WEEKLY':
+            return divmod(index, len(self.weekdays))
+        if self.prefix is None:
+            return index, 0
+        period = len(self.prefix) - 1
+        full_cycles, rest = divmod(index, self.prefix[period])
+        return full_cycles * period + bisect_right(self.prefix, rest) - 1, 0
+
+    def ordinal(self, day):
+        """
+        Position of `day` among the series' dates counted from the start date
+        (0 for the first occurrence), ignoring `until` and `count`; None if
+        the rule does not produce `day`.
+        """
+        if day < self.anchor:
+            return None
+        steps, off_step = divmod(self.unit_index(day), self.interval)
+        if off_step:
+            return None
+        dates = self.unit_dates(steps * self.interval)
+        if day not in dates:
+            return None
+        return self.dates_before_step(steps) + dates.index(day) - self.lead
+
+    def nth_date(self, ordinal):
+        """The series' date at `ordinal` (0-based), ignoring `until` and `count`; None past year 9999."""
+        if self.is_empty:
+            return None
+        step, position = self.step_of_index(ordinal + self.lead)
+        try:
+            return self.unit_dates(step * self.interval)[position]
+        except (ValueError, OverflowError):
+            return None
+
+    def occurs_on(self, day):
+        """Whether the series has an occurrence on `day`, honouring `until` and `count`."""
+        if self.until and day > self.until:
+            return False
+        ordinal = self.ordinal(day)
+        return ordinal is not None and (not self.count or ordinal < self.count)
+
+    def total_dates(self):
+        """Number of dates in the whole series, or None if it never ends."""
+        if not self.count and not self.until:
+            return None
+        # Counted up to `until`, or to the end of the calendar for `count` rules
+        last = self.until or date.max
+        if self.is_empty or last < self.anchor:
+            return 0
+        steps = self.unit_index(last) // self.interval
+        before = self.dates_before_step(steps) - self.lead if steps else 0
+        unit = steps * self.interval
+        try:
+            dates = self.unit_dates(unit)
+        except OverflowError:
+            # The week holding date.max runs past the end of the calendar
+            dates = [self.unit_start(unit) + timedelta(days=wd) for wd in self.weekdays if wd <= last.weekday()]
+        through_last = before + len([day for day in dates if self.anchor <= day <= last])
+        return min(self.count, through_last) if self.count else through_last
+
+    def last_date(self):
+        """Date of the series' final occurrence, or None if it never ends (or has no dates)."""
+        total = self.total_dates()
+        return self.nth_date(total - 1) if total else None
+
+    def iter_dates(self, first, last=None):
+        """
+        Yield the series' dates in [first, last] in order, honouring the start
+        date, `until` and `count`. `last=None` leaves the end to the rule itself.
+        """
+        first = max(first, self.anchor)
+        if self.until and (last is None or self.until < last):
+            last = self.until
+        if (last is not None and first > last) or self.is_empty:
+            return
+
+        step = self.step_for(first)
+        ordinal = 0
+        if self.count:
+            # Dates of step 0 preceding the start date never count towards `count`.
+            ordinal = self.dates_before_step(step) - self.lead if step else 0
+        while True:
+            unit = step * self.interval
+            try:
+                if last is not None and self.unit_start(unit) > last:
+                    return
+                dates = self.unit_dates(unit)
+            except (ValueError, OverflowError):
+                return  # ran past year 9999
+            for day in dates:
+                if day < self.anchor:
+                    continue
+                if (last is not None and day > last) or (self.count and ordinal >= self.count):
+                    return
+                ordinal += 1
+                if day >= first:
+                    yield day
+            step += 1
+
+
+class LRUCache:
+    """Small thread-safe mapping that keeps the `maxsize` most recently used entries."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+compiled_rules = LRUCache(getattr(settings, 'EVENTS_COMPILED_RULE_CACHE_SIZE', 4096))
+
+
+def get_rule(event):
+    """The event's RecurrenceRule if it should be expanded, else None."""
+    if not event.is_recurring:
+        return None
+    return getattr(event, 'recurrence_rule', None)
+
+
+def get_compiled_rule(event, rule=None):
+    """
+    CompiledRule for a saved event, compiled at most once per process for each
+    (event id, event updated_at, rule updated_at) as long as the fields it was
+    compiled from are unchanged. Unsaved objects are compiled on every call.
+    """
+    rule = rule or get_rule(event)
+    if event.pk is None or event.updated_at is None or rule.updated_at is None:
+        return CompiledRule.from_rule(rule, local_date(event))
+
+    key = (event.pk, event.updated_at, rule.updated_at)
+    source = (event.start_datetime, event.time_zone, *(getattr(rule, field) for field in RULE_FIELDS))
+    entry = compiled_rules.get(key)
+    if entry is None or entry[0] != source:
+        entry = (source, CompiledRule.from_rule(rule, local_date(event)))
+        compiled_rules.set(key, entry)
+    return entry[1]
+
+
+def _compiled_or_none(event):
+    """
+    CompiledRule of a recurring event, or None for one-off events and for
+    rules stored before validation could reject them.
+    """
+    rule = get_rule(event)
+    if rule is None:
+        return None
+    try:
+        return get_compiled_rule(event, rule)
+    except ValueError:
+        return None
+
+
+def occurrence_dates(event, first, last):
+    """Local dates in [first, last] on which `event` occurs, ignoring cancellations."""
+    compiled = _compiled_or_none(event)
+    if compiled is not None:
+        return list(compiled.iter_dates(first, last))
+    day = local_date(event)
+    return [day] if first <= day <= last else []
+
+
+def _overlaps(start, end, window_start, window_end):
+    return start < window_end and (end > window_start or start >= window_start)
+
+
+def _single_occurrence(event, window_start, window_end, cancelled_dates):
+    start, end = event.start_datetime, event.end_datetime
+    if not _overlaps(start, end, window_start, window_end):
+        return []
+    day = local_date(event)
+    if day in cancelled_dates:
+        return []
+    return [OccurrenceSpan(event, day, start, end)]
+
+
+def expand_event(event, window_start, window_end, cancelled_dates=()):
+    """
+    List the OccurrenceSpans of `event` overlapping [window_start, window_end),
+    in chronological order, skipping dates listed in `cancelled_dates`.
+    """
+    compiled = _compiled_or_none(event)
+    if compiled is None:
+        return _single_occurrence(event, window_start, window_end, cancelled_dates)
+
+    clock = WallClock(event)
+    duration = event.end_datetime - event.start_datetime
+    # Any occurrence starting before `first` has ended before the window opens.
+    first = (window_start - duration).date() - DATE_MARGIN
+    last = window_end.date() + DATE_MARGIN
+
+    occurrences = []
+    for day in compiled.iter_dates(first, last):
+        if day in cancelled_dates:
+            continue
+        start = clock.start_on(day)
+        end = start + duration
+        if _overlaps(start, end, window_start, window_end):
+            occurrences.append(OccurrenceSpan(event, day, start, end))
+    return occurrences
+
+
+def next_occurrences(event, after, limit, cancelled_dates=()):
+    """
+    The first `limit` OccurrenceSpans of `event` starting at or after `after`.
+    The rule jumps straight to the step holding `after`, so only the
+    occurrences returned (and cancelled ones in between) are generated.
+    """
+    compiled = _compiled_or_none(event)
+    if compiled is None:
+        if event.start_datetime < after or local_date(event) in cancelled_dates:
+            return []
+        return [OccurrenceSpan(event, local_date(event), event.start_datetime, event.end_datetime)][:limit]
+
+    clock = WallClock(event)
+    duration = event.end_datetime - event.start_datetime
+    occurrences = []
+    for day in compiled.iter_dates(after.date() - DATE_MARGIN):
+        if len(occurrences) >= limit:
+            break
+        start = clock.start_on(day)
+        if day in cancelled_dates or start < after:
+            continue
+        occurrences.append(OccurrenceSpan(event, day, start, start + duration))
+    return occurrences
+
+
+def occurrence_on(event, day):
+    """
+    The OccurrenceSpan of `event` on `day` (a date in the event's time zone),
+    cancelled or not, or None if the series has no occurrence that day.
+    Constant time.
+    """
+    compiled = _compiled_or_none(event)
+    clock = WallClock(event)
+    start = event.start_datetime
+    if compiled is None:
+        occurs = clock.anchor == day
+    else:
+        occurs = compiled.occurs_on(day)
+        start = clock.start_on(day)
+    if not occurs:
+        return None
+    return OccurrenceSpan(event, day, start, start + (event.end_datetime - event.start_datetime))
+
+
+def last_occurrence_date(event):
+    """Date of the series' final occurrence, or None if it repeats forever (or has none)."""
+    compiled = _compiled_or_none(event)
+    if compiled is None:
+        return local_date(event)
+    return compiled.last_date()
+
+
+def expand_events(events, window_start, window_end):
+    """
+    Expand several events (with `recurrence_rule` joined and `exceptions`
+    prefetched) and return all their occurrences sorted by start time.
+    """
+    occurrences = []
+    for event in events:
+        cancelled = {
+            exception.occurrence_date
+            for exception in event.exceptions.all()
+            if exception.is_cancelled
+        }
+        occurrences.extend(expand_event(event, window_start, window_end, cancelled))
+    occurrences.sort(key=lambda occurrence: (occurrence.start, occurrence.event.id))
+    return occurrences
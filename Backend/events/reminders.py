@@ -0,0 +1,204 @@
+"""
+Reminders before event occurrences, for the `run_reminders` worker.
+
+An event with `reminder_minutes` set is due for a reminder that many minutes
+before each of its occurrences. The worker never scans the whole calendar:
+
+- Reminders are loaded one window ahead (EVENTS_REMINDERS['WINDOW']) into a
+  min-heap keyed on due time. Loading a window is one indexed range query on
+  Occurrence.start per distinct reminder offset in use (there are only a
+  handful: 5, 15, 60 minutes...), so its cost follows the occurrences in the
+  window, not the number of series. Outside the materialized horizon the
+  series are expanded with events.batch instead.
+- Edits are found through CalendarVersion, which every write to a user's
+  events, rules or exceptions bumps: each tick reads the versions changed
+  since the previous one (an indexed range on `changed_at`). The heap entries
+  of those users are invalidated lazily, by bumping a per-user generation that
+  stale entries no longer match, and their part of the loaded window is
+  reloaded by expanding their series, never from the index, whose rows for
+  the change may not be written by the time the version is seen.
+  Cancellations, rule edits, moves and deletes are all covered.
+
+Due reminders are handed in batches to a sink: any object with a
+`deliver(reminders)` method, chosen by its dotted path in
+EVENTS_REMINDERS['SINK']. The default writes them to the
+'events.reminders' logger.
+"""
+import heapq
+import logging
+from collections import namedtuple
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import occurrence_index
+from .batch import expand_batch
+from .models import CalendarVersion, Event, Occurrence, overlapping_events
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'WINDOW': 300,        # seconds of reminders held in memory ahead of time
+    'POLL_INTERVAL': 5,   # seconds between checks for edits
+    'CHANGE_GRACE': 30,   # seconds a write may take to commit after stamping changed_at
+    'SINK': 'events.reminders.LogSink',
+}
+
+Reminder = namedtuple('Reminder', ['due', 'event_id', 'occurrence_date', 'start', 'user_id', 'title'])
+
+
+def reminder_setting(name):
+    return getattr(settings, 'EVENTS_REMINDERS', {}).get(name, DEFAULTS[name])
+
+
+class LogSink:
+    """Writes each reminder to the 'events.reminders' logger."""
+
+    def deliver(self, reminders):
+        for reminder in reminders:
+            logger.info(
+                'Reminder for user %s: %r starts at %s', reminder.user_id, reminder.title, reminder.start.isoformat(),
+            )
+
+
+def get_sink(path=None):
+    return import_string(path or reminder_setting('SINK'))()
+
+
+def _reminder_events(user_ids):
+    queryset = Event.objects.filter(reminder_minutes__isnull=False, is_active=True)
+    if user_ids is not None:
+        queryset = queryset.filter(user_id__in=user_ids)
+    return queryset
+
+
+def _indexed_reminders(offsets, window_start, window_end, user_ids):
+    reminders = []
+    for minutes in offsets:
+        lead = timedelta(minutes=minutes)
+        # Filtering on the offset in Python keeps the planner on the start index
+        rows = Occurrence.objects.filter(
+            start__gte=window_start + lead, start__lt=window_end + lead,
+            event__reminder_minutes__isnull=False, event__is_active=True,
+        )
+        if user_ids is not None:
+            rows = rows.filter(user_id__in=user_ids)
+        for event_id, occurrence_date, start, user_id, title, event_minutes in rows.values_list(
+            'event_id', 'occurrence_date', 'start', 'user_id', 'event__title', 'event__reminder_minutes',
+        ):
+            if event_minutes == minutes:
+                reminders.append(Reminder(start - lead, event_id, occurrence_date, start, user_id, title))
+    return reminders
+
+
+def _expanded_reminders(window_start, window_end, latest, user_ids):
+    events = {
+        event.pk: event for event in
+        _reminder_events(user_ids).filter(overlapping_events(window_start, latest)).select_related('recurrence_rule')
+    }
+    occurrences = expand_batch(events.values(), window_start, latest)
+    reminders = []
+    for event_id, occurrence_date, start in zip(
+        occurrences.event_ids.tolist(), occurrences.occurrence_dates.tolist(), occurrences.starts.tolist(),
+    ):
+        event = events[event_id]
+        start = start.replace(tzinfo=dt_timezone.utc)
+        due = start - timedelta(minutes=event.reminder_minutes)
+        if window_start <= due < window_end:
+            reminders.append(Reminder(due, event_id, occurrence_date, start, event.user_id, event.title))
+    return reminders
+
+
+def due_reminders(window_start, window_end, user_ids=None, indexed=True):
+    """
+    Reminders due in [window_start, window_end), optionally for some users
+    only. With `indexed` False the series are expanded even inside the
+    materialized horizon.
+    """
+    offsets = list(
+        _reminder_events(user_ids).order_by().values_list('reminder_minutes', flat=True).distinct()
+    )
+    if not offsets:
+        return []
+    latest = window_end + timedelta(minutes=max(offsets))
+    if indexed and occurrence_index.covers(window_start, latest):
+        return _indexed_reminders(offsets, window_start, window_end, user_ids)
+    return _expanded_reminders(window_start, window_end, latest, user_ids)
+
+
+class ReminderDispatcher:
+    """
+    Heap of the reminders due in the loaded window. Call tick() periodically;
+    it picks up edits, loads the next window when needed and delivers what is
+    due. Reminders due before the dispatcher started are not sent.
+    """
+
+    def __init__(self, sink, window=None, now=None):
+        self.sink = sink
+        self.window = timedelta(seconds=window or reminder_setting('WINDOW'))
+        self.grace = timedelta(seconds=reminder_setting('CHANGE_GRACE'))
+        self.heap = []
+        self.generations = {}
+        self.dispatched_until = self.loaded_until = now or timezone.now()
+        # Change detection runs on the database's write stamps, not on `now`
+        self.changes_since = timezone.now()
+        self.seen_versions = {}
+
+    def _push(self, reminders):
+        for reminder in reminders:
+            generation = self.generations.get(reminder.user_id, 0)
+            heapq.heappush(self.heap, (reminder.due, reminder.event_id, reminder.occurrence_date, generation, reminder))
+
+    def next_due(self):
+        """Due time of the earliest loaded reminder, possibly a stale one, or None."""
+        return self.heap[0][0] if self.heap else None
+
+    def apply_changes(self):
+        """Reload the loaded window for users whose calendar changed. Returns their ids."""
+        rows = CalendarVersion.objects.filter(changed_at__gte=self.changes_since - self.grace)
+        changed = []
+        for user_id, version, changed_at in rows.values_list('user_id', 'version', 'changed_at'):
+            if self.seen_versions.get(user_id, (None,))[0] != version:
+                changed.append(user_id)
+            self.seen_versions[user_id] = (version, changed_at)
+            self.changes_since = max(self.changes_since, changed_at)
+        # Versions older than the grace period are never read again
+        cutoff = self.changes_since - self.grace
+        self.seen_versions = {
+            user_id: seen for user_id, seen in self.seen_versions.items() if seen[1] >= cutoff
+        }
+
+        if changed:
+            for user_id in changed:
+                self.generations[user_id] = self.generations.get(user_id, 0) + 1
+            if self.loaded_until > self.dispatched_until:
+                # From the rules themselves: the version is enough to trust them
+                self._push(due_reminders(self.dispatched_until, self.loaded_until, changed, indexed=False))
+        return changed
+
+    def load_ahead(self, now):
+        """Load the reminders due up to one window past `now`."""
+        end = now + self.window
+        if self.loaded_until < end:
+            self._push(due_reminders(self.loaded_until, end))
+            self.loaded_until = end
+
+    def dispatch(self, now):
+        """Deliver the reminders due before `now`, skipping invalidated entries."""
+        due = []
+        while self.heap and self.heap[0][0] < now:
+            _, _, _, generation, reminder = heapq.heappop(self.heap)
+            if generation == self.generations.get(reminder.user_id, 0):
+                due.append(reminder)
+        self.dispatched_until = max(self.dispatched_until, now)
+        if due:
+            self.sink.deliver(due)
+        return due
+
+    def tick(self, now=None):
+        now = now or timezone.now()
+        self.apply_changes()
+        self.load_ahead(now)
+        return self.dispatch(now)
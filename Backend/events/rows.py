@@ -0,0 +1,157 @@
+"""
+Read-only fast path for the event list and occurrence endpoints.
+
+ModelSerializer spends most of a large page in per-field machinery: field
+lookup, `get_attribute`, `to_representation` and nested serializers for every
+row. Here the rows come from `.values()` / `.values_list()` with only the
+columns the requested fields need (the rule through a LEFT JOIN, exceptions
+in one extra query), and dicts are built directly with the same keys, order
+and value formats as EventSerializer and OccurrenceSerializer. Writes,
+the detail endpoint and anything else still use the DRF serializers.
+"""
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from .models import EventException
+from .profiling import timed
+from .recurrence import RULE_FIELDS
+from .serializers import EventSerializer
+
+RULE_COLUMNS = tuple(f'recurrence_rule__{name}' for name in RULE_FIELDS)
+EXCEPTION_COLUMNS = ('id', 'event_id', 'occurrence_date', 'is_cancelled')
+OCCURRENCE_COLUMNS = ('event_id', 'event__title', 'occurrence_date', 'start', 'end', 'event__is_recurring')
+
+_datetime_field = serializers.DateTimeField()
+_date_field = serializers.DateField()
+
+
+def datetime_formatter():
+    """DateTimeField().to_representation, minus the field machinery for ISO 8601."""
+    if (api_settings.DATETIME_FORMAT or '').lower() != ISO_8601:
+        return _datetime_field.to_representation
+    zone = timezone.get_current_timezone()
+
+    def format_datetime(value):
+        if not value:
+            return None
+        value = value.astimezone(zone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return format_datetime
+
+
+def date_formatter():
+    if (api_settings.DATE_FORMAT or '').lower() != ISO_8601:
+        return _date_field.to_representation
+    return lambda value: value.isoformat() if value else None
+
+
+def event_columns(fields):
+    """The .values() columns needed to serialize `fields` (plus the pagination key)."""
+    columns = ['id', 'start_datetime']
+    for name in fields:
+        if name == 'recurrence_rule':
+            columns.extend(RULE_COLUMNS)
+        elif name != 'exceptions' and name not in columns:
+            columns.append(name)
+    return columns
+
+
+def exception_rows(event_ids):
+    return (
+        EventException.objects.filter(event_id__in=event_ids)
+        .order_by('event_id', 'pk').values_list(*EXCEPTION_COLUMNS)
+    )
+
+
+def group_exceptions(rows):
+    """Exception rows as event id -> list of EventExceptionSerializer dicts."""
+    format_date = date_formatter()
+    grouped = {}
+    for pk, event_id, occurrence_date, is_cancelled in rows:
+        grouped.setdefault(event_id, []).append({
+            'id': pk, 'event': event_id, 'occurrence_date': format_date(occurrence_date), 'is_cancelled': is_cancelled,
+        })
+    return grouped
+
+
+def _rule(row, format_date):
+    frequency = row['recurrence_rule__frequency']
+    if frequency is None:
+        return None  # no rule row joined
+    weekdays = row['recurrence_rule__weekdays']
+    return {
+        'frequency': frequency,
+        'interval': row['recurrence_rule__interval'],
+        'weekdays': weekdays.split(',') if frequency == 'WEEKLY' and weekdays else [],
+        'nth': row['recurrence_rule__nth'],
+        'weekday_for_nth': row['recurrence_rule__weekday_for_nth'],
+        'day_of_month': row['recurrence_rule__day_of_month'],
+        'month': row['recurrence_rule__month'],
+        'day': row['recurrence_rule__day'],
+        'until': format_date(row['recurrence_rule__until']),
+        'count': row['recurrence_rule__count'],
+    }
+
+
+def event_dicts(rows, fields=None, exceptions=None):
+    """
+    EventSerializer(many=True, fields=fields).data for `.values(*event_columns(fields))`
+    rows. `exceptions` is group_exceptions() of the rows' exceptions.
+    """
+    fields = [name for name in EventSerializer.Meta.fields if fields is None or name in fields]
+    format_datetime, format_date = datetime_formatter(), date_formatter()
+    getters = []
+    for name in fields:
+        if name == 'recurrence_rule':
+            getters.append((name, lambda row: _rule(row, format_date)))
+        elif name == 'exceptions':
+            getters.append((name, lambda row: exceptions.get(row['id'], [])))
+        elif name in ('start_datetime', 'end_datetime'):
+            getters.append((name, lambda row, name=name: format_datetime(row[name])))
+        else:
+            getters.append((name, lambda row, name=name: row[name]))
+    with timed('serialize'):
+        return [{name: get(row) for name, get in getters} for row in rows]
+
+
+def serialize_events(rows, fields=None):
+    """event_dicts() with the exceptions loaded in one query when asked for."""
+    exceptions = None
+    if fields is None or 'exceptions' in fields:
+        exceptions = group_exceptions(exception_rows([row['id'] for row in rows]))
+    return event_dicts(rows, fields, exceptions)
+
+
+async def aserialize_events(rows, fields=None):
+    """serialize_events() for async views."""
+    exceptions = None
+    if fields is None or 'exceptions' in fields:
+        exceptions = group_exceptions([row async for row in exception_rows([row['id'] for row in rows])])
+    return event_dicts(rows, fields, exceptions)
+
+
+def occurrence_row_dicts(rows):
+    """OccurrenceSerializer(many=True).data for `.values_list(*OCCURRENCE_COLUMNS)` rows."""
+    format_datetime, format_date = datetime_formatter(), date_formatter()
+    with timed('serialize'):
+        return [
+            {
+                'event_id': event_id,
+                'title': title,
+                'occurrence_date': format_date(occurrence_date),
+                'start': format_datetime(start),
+                'end': format_datetime(end),
+                'is_recurring': is_recurring,
+            }
+            for event_id, title, occurrence_date, start, end, is_recurring in rows
+        ]
+
+
+def occurrence_dicts(occurrences):
+    """OccurrenceSerializer(many=True).data for expanded OccurrenceSpans."""
+    return occurrence_row_dicts(
+        (o.event.id, o.event.title, o.occurrence_date, o.start, o.end, o.event.is_recurring) for o in occurrences
+    )
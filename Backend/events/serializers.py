@@ -1,5 +1,25 @@
+from django.db import transaction
 from rest_framework import serializers
+from . import occurrence_index
 from .models import Event, RecurrenceRule, EventException
+from .profiling import TimedListSerializer, TimedSerializerMixin
+from .conflicts import find_conflicts
+from .recurrence import CompiledRule
+from .timezones import is_valid as is_valid_time_zone
+
+
+def prepare_recurrence_data(recurrence_data):
+    """
+    Turn validated RecurrenceRuleSerializer data into model field values: weekdays
+    are stored comma-joined, and only for WEEKLY rules.
+    """
+    if recurrence_data:
+        weekdays_list = recurrence_data.pop('weekdays', [])
+        if recurrence_data.get('frequency') == 'WEEKLY':
+            recurrence_data['weekdays'] = ",".join(weekdays_list)
+        else:
+            recurrence_data['weekdays'] = ''
+    return recurrence_data
 
 
 class RecurrenceRuleSerializer(serializers.ModelSerializer):
@@ -108,41 +128,95 @@ class RecurrenceRuleSerializer(serializers.ModelSerializer):
         else:
             raise serializers.ValidationError(f"Unsupported frequency value: {frequency}")
 
+        # Ranges (nth, day_of_month, month/day) are checked by compiling the rule
+        try:
+            CompiledRule.from_data(data)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+
         return data
 
     def create(self, validated_data):
-        weekdays_list = validated_data.pop('weekdays', [])
-        if validated_data.get('frequency') == 'WEEKLY':
-            validated_data['weekdays'] = ",".join(weekdays_list)
-        else:
-            validated_data['weekdays'] = ''
-        return super().create(validated_data)
+        return super().create(prepare_recurrence_data(validated_data))
 
     def update(self, instance, validated_data):
-        weekdays_list = validated_data.pop('weekdays', [])
-        if validated_data.get('frequency') == 'WEEKLY':
-            validated_data['weekdays'] = ",".join(weekdays_list)
-        else:
-            validated_data['weekdays'] = ''
-        return super().update(instance, validated_data)
+        return super().update(instance, prepare_recurrence_data(validated_data))
+
+
+class EventExceptionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = EventException
+        fields = ['id', 'event', 'occurrence_date', 'is_cancelled']
+        list_serializer_class = TimedListSerializer
+
+    def validate(self, data):
+        if not data.get('is_cancelled', False):
+            raise serializers.ValidationError("Currently only cancelled exceptions are supported.")
+        return data
 
 
-class EventSerializer(serializers.ModelSerializer):
+class EventSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     recurrence_rule = RecurrenceRuleSerializer(required=False)
+    exceptions = EventExceptionSerializer(many=True, read_only=True)
 
     class Meta:
         model = Event
-        fields = ['id', 'title', 'description', 'start_datetime', 'end_datetime', 'is_recurring', 'recurrence_rule']
+        fields = [
+            'id', 'title', 'description', 'start_datetime', 'end_datetime', 'time_zone', 'is_recurring',
+            'reminder_minutes', 'recurrence_rule', 'exceptions',
+        ]
+        list_serializer_class = TimedListSerializer
+
+    def __init__(self, *args, **kwargs):
+        # Optional sparse fieldset: only these fields are serialized
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        self.conflicts = None
+
+    def validate_time_zone(self, value):
+        if not is_valid_time_zone(value):
+            raise serializers.ValidationError(f"Unknown time zone '{value}'; use an IANA name such as 'Europe/Paris'.")
+        return value
+
+    def wants_conflicts(self):
+        """Conflicts are reported when asked for with ?check_conflicts=true."""
+        if 'check_conflicts' in self.context:
+            return self.context['check_conflicts']
+        request = self.context.get('request')
+        return request is not None and request.query_params.get('check_conflicts') in ('1', 'true', 'True')
+
+    def save(self, **kwargs):
+        event = super().save(**kwargs)
+        if self.wants_conflicts():
+            self.conflicts = find_conflicts(event)
+        return event
+
+    def to_representation(self, instance):
+        rep = super().to_representation(instance)
+        if self.conflicts is not None and instance is self.instance:
+            rep['conflicts'] = self.conflicts
+        return rep
 
+    # The occurrence index refreshes once, after the event and its rule are both written
+    @transaction.atomic
     def create(self, validated_data):
-        recurrence_data = validated_data.pop('recurrence_rule', None)
-        event = Event.objects.create(**validated_data)
-        if recurrence_data:
-            RecurrenceRule.objects.create(event=event, **recurrence_data)
+        recurrence_data = prepare_recurrence_data(validated_data.pop('recurrence_rule', None))
+        with occurrence_index.batched_refresh():
+            event = Event.objects.create(**validated_data)
+            if recurrence_data:
+                RecurrenceRule.objects.create(event=event, **recurrence_data)
         return event
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        recurrence_data = validated_data.pop('recurrence_rule', None)
+        with occurrence_index.batched_refresh():
+            return self._update(instance, validated_data)
+
+    def _update(self, instance, validated_data):
+        recurrence_data = prepare_recurrence_data(validated_data.pop('recurrence_rule', None))
 
         # Update base event fields
         for attr, value in validated_data.items():
@@ -164,12 +238,17 @@ class EventSerializer(serializers.ModelSerializer):
 
         return instance
 
-class EventExceptionSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = EventException
-        fields = ['id', 'event', 'occurrence_date', 'is_cancelled']
 
-    def validate(self, data):
-        if not data.get('is_cancelled', False):
-            raise serializers.ValidationError("Currently only cancelled exceptions are supported.")
-        return data
\ No newline at end of file
+class OccurrenceSerializer(TimedSerializerMixin, serializers.Serializer):
+    """
+    Read-only representation of one expanded occurrence of an event.
+    """
+    event_id = serializers.IntegerField(source='event.id', read_only=True)
+    title = serializers.CharField(source='event.title', read_only=True)
+    occurrence_date = serializers.DateField(read_only=True)
+    start = serializers.DateTimeField(read_only=True)
+    end = serializers.DateTimeField(read_only=True)
+    is_recurring = serializers.BooleanField(source='event.is_recurring', read_only=True)
+
+    class Meta:
+        list_serializer_class = TimedListSerializer
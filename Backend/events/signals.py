@@ -0,0 +1,61 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from accounts.models import User
+from . import occurrence_index, versioning
+from .models import CalendarChange, CalendarVersion, Event, EventException, RecurrenceRule
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, **kwargs):
+    if created:
+        CalendarVersion.objects.get_or_create(user=instance)
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    versioning.start_user_deletion(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    # Sent after the cascade: the user's row goes last
+    versioning.end_user_deletion(instance.pk)
+
+
+@receiver(post_save, sender=Event)
+def event_saved(sender, instance, created, **kwargs):
+    versioning.log_instance(instance, CalendarChange.CREATE if created else CalendarChange.UPDATE)
+    occurrence_index.schedule_refresh(instance.pk)
+
+
+@receiver(post_delete, sender=Event)
+def event_deleted(sender, instance, **kwargs):
+    versioning.log_instance(instance, CalendarChange.DELETE)
+
+
+@receiver(post_save, sender=RecurrenceRule)
+def recurrence_rule_saved(sender, instance, created, **kwargs):
+    versioning.log_instance(instance, CalendarChange.CREATE if created else CalendarChange.UPDATE)
+    occurrence_index.schedule_refresh(instance.event_id)
+
+
+@receiver(post_delete, sender=RecurrenceRule)
+def recurrence_rule_deleted(sender, instance, **kwargs):
+    versioning.log_instance(instance, CalendarChange.DELETE)
+    occurrence_index.schedule_refresh(instance.event_id)
+
+
+@receiver(post_save, sender=EventException)
+def event_exception_saved(sender, instance, created, **kwargs):
+    versioning.log_instance(instance, CalendarChange.CREATE if created else CalendarChange.UPDATE)
+    if instance.is_cancelled:
+        occurrence_index.drop_occurrence(instance.event_id, instance.occurrence_date)
+    else:
+        occurrence_index.schedule_refresh(instance.event_id)
+
+
+@receiver(post_delete, sender=EventException)
+def event_exception_deleted(sender, instance, **kwargs):
+    versioning.log_instance(instance, CalendarChange.DELETE)
+    occurrence_index.schedule_refresh(instance.event_id)
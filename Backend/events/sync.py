@@ -0,0 +1,65 @@
+"""
+Delta sync from the per-user change log.
+
+Every write to an event, its rule or its exceptions logs a CalendarChange
+stamped with the user's new calendar version (events.versioning), deletes
+included, so the log holds tombstones that `updated_at` cannot. A client
+keeps the token of its last sync, which is the version it saw, and asks for
+what changed after it: the events touched by the changes with a later
+sequence, re-serialized whole (rule and exceptions included), and the ids of
+those touched events that no longer exist.
+
+The log is pruned from the front (`manage.py prune_changes`). A token older
+than the start of the retained log, or one this server never issued, gets a
+full snapshot instead, flagged with `full`, after which the client replaces
+its copy.
+"""
+from django.db import transaction
+from django.db.models import Max, Subquery
+
+from .models import CalendarChange, CalendarVersion, Event
+from .rows import event_columns, serialize_events
+from .serializers import EventSerializer
+
+
+def parse_token(value):
+    """The sequence a token stands for, None for no token; raises ValueError for a malformed one."""
+    if value in (None, ''):
+        return None
+    token = int(value)
+    if token < 0:
+        raise ValueError(value)
+    return token
+
+
+def changes_since(user, token):
+    """The sync response for `user` from `token` (a sequence, or None for a snapshot)."""
+    version, log_start = (
+        CalendarVersion.objects.filter(user=user).values_list('version', 'log_start').first() or (0, 0)
+    )
+    events = Event.objects.filter(user=user)
+    full = token is None or token < log_start or token > version
+    if not full:
+        touched = CalendarChange.objects.filter(user=user, sequence__gt=token, sequence__lte=version)
+        changed_ids = set(touched.values_list('event_id', flat=True).distinct())
+        events = events.filter(pk__in=Subquery(touched.values('event_id')))
+    rows = list(events.order_by('id').values(*event_columns(EventSerializer.Meta.fields)))
+    deleted = [] if full else sorted(changed_ids - {row['id'] for row in rows})
+    return {
+        'token': str(version),
+        'full': full,
+        'events': serialize_events(rows),
+        'deleted': deleted,
+    }
+
+
+def prune(before):
+    """Drop the changes logged before `before`; returns the number deleted."""
+    deleted = 0
+    ends = CalendarChange.objects.filter(changed_at__lt=before).values('user_id').annotate(through=Max('sequence'))
+    for user_id, through in ends.values_list('user_id', 'through'):
+        # Whole versions only: a token is valid if every change after it is still there
+        with transaction.atomic():
+            deleted += CalendarChange.objects.filter(user_id=user_id, sequence__lte=through).delete()[0]
+            CalendarVersion.objects.filter(user_id=user_id, log_start__lt=through).update(log_start=through)
+    return deleted
@@ -0,0 +1,157 @@
+"""
+Synthetic calendars for benchmarks.
+
+Every rule variant expansion knows about is generated, in rotation so even a
+small dataset has each of them: daily and every-n-days, weekly on one or
+several weekdays, monthly on a day of the month (29-31 included, so some
+months are skipped) or on the nth / last weekday, yearly on a date or on the
+nth weekday of a month; each open-ended, limited by `count` or by `until`.
+Cancelled occurrences are real occurrence dates of their series.
+
+`seed_users` writes with bulk_create in batches, so a dataset of millions of
+events is practical; the users share one password hash, computed once.
+"""
+import random
+from itertools import cycle
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from accounts.models import User
+from . import occurrence_index
+from .models import CalendarVersion, Event, EventException, RecurrenceRule
+from .recurrence import WEEKDAY_CODES, CompiledRule
+
+BATCH_SIZE = 1000
+
+# (frequency, extra rule fields) in rotation; None values are filled in randomly
+RULE_VARIANTS = (
+    ('DAILY', {}),
+    ('DAILY', {'interval': None}),
+    ('WEEKLY', {'weekdays': 1}),
+    ('WEEKLY', {'weekdays': 3}),
+    ('WEEKLY', {'weekdays': 2, 'interval': None}),
+    ('MONTHLY', {'day_of_month': None}),
+    ('MONTHLY', {'day_of_month': 31}),
+    ('MONTHLY', {'nth': None}),
+    ('MONTHLY', {'nth': -1}),
+    ('YEARLY', {'day': None}),
+    ('YEARLY', {'nth': None}),
+)
+ENDINGS = ('open', 'open', 'count', 'until')
+DURATIONS = (15, 30, 30, 60, 60, 90, 120)
+
+
+def random_rule(rng, variant, start):
+    """RecurrenceRule field values for one of RULE_VARIANTS starting at `start`."""
+    frequency, extra = variant
+    fields = {'frequency': frequency, 'interval': 1}
+    if 'interval' in extra:
+        fields['interval'] = rng.choice([2, 3, 4])
+    if 'weekdays' in extra:
+        fields['weekdays'] = ','.join(sorted(rng.sample(WEEKDAY_CODES, extra['weekdays']), key=WEEKDAY_CODES.index))
+    if 'day_of_month' in extra:
+        fields['day_of_month'] = extra['day_of_month'] or rng.randint(1, 28)
+    if 'nth' in extra:
+        fields['nth'] = extra['nth'] or rng.choice([1, 2, 3, 4])
+        fields['weekday_for_nth'] = rng.choice(WEEKDAY_CODES)
+    if frequency == 'YEARLY':
+        fields['month'] = rng.randint(1, 12)
+        if 'day' in extra:
+            fields['day'] = rng.randint(1, 28)
+
+    ending = rng.choice(ENDINGS)
+    if ending == 'count':
+        fields['count'] = rng.randint(5, 500)
+    elif ending == 'until':
+        fields['until'] = start.date() + timedelta(days=rng.randint(30, 3650))
+    return fields
+
+
+def random_start(rng, first_year=2015, last_year=2027):
+    return datetime(rng.randint(first_year, last_year), rng.randint(1, 12), rng.randint(1, 28),
+                    rng.randint(7, 18), rng.choice([0, 15, 30, 45]), tzinfo=dt_timezone.utc)
+
+
+def synthetic_series(count, seed):
+    """Unsaved events with rules covering every variant; no database needed."""
+    rng = random.Random(seed)
+    stamp = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+    events = []
+    for pk in range(1, count + 1):
+        start = random_start(rng, last_year=2025)
+        event = Event(pk=pk, title=f"Series {pk}", start_datetime=start,
+                      end_datetime=start + timedelta(minutes=rng.choice(DURATIONS)),
+                      is_recurring=True, updated_at=stamp)
+        fields = random_rule(rng, RULE_VARIANTS[pk % len(RULE_VARIANTS)], start)
+        event.recurrence_rule = RecurrenceRule(event=event, updated_at=stamp, **fields)
+        events.append(event)
+    return events
+
+
+def sample_dates(rng, fields, start, number):
+    """Up to `number` distinct dates on which a series with these rule fields occurs."""
+    compiled = CompiledRule(**fields, anchor=start.date())
+    total = compiled.total_dates()
+    span = min(total, 1000) if total is not None else 1000
+    dates = {compiled.nth_date(rng.randrange(span)) for _ in range(number) if span}
+    dates.discard(None)
+    return dates
+
+
+def seed_users(prefix, users, events_per_user, recurring_share=0.6, exceptions_per_series=2,
+               password='bench-pass-123', seed=1, progress=None):
+    """
+    Create `users` users named `{prefix}0`, `{prefix}1`... each with
+    `events_per_user` events, of which `recurring_share` are series with up to
+    `exceptions_per_series` cancelled occurrences. Returns the number of
+    (users, events, rules, exceptions) written.
+    """
+    rng = random.Random(seed)
+    variants = cycle(RULE_VARIANTS)
+    password_hash = make_password(password)
+    totals = [0, 0, 0, 0]
+    # About BATCH_SIZE events per transaction
+    users_per_batch = max(BATCH_SIZE // max(events_per_user, 1), 1)
+    for offset in range(0, users, users_per_batch):
+        count = min(users_per_batch, users - offset)
+        with transaction.atomic():
+            batch = User.objects.bulk_create([
+                User(username=f'{prefix}{offset + index}', password=password_hash) for index in range(count)
+            ])
+            # Seeded events are not logged: start the log after them, so sync clients begin with a snapshot
+            CalendarVersion.objects.bulk_create([CalendarVersion(user=user, version=1, log_start=1) for user in batch])
+
+            events, rules = [], []
+            for user in batch:
+                for number in range(events_per_user):
+                    start = random_start(rng)
+                    recurring = rng.random() < recurring_share
+                    events.append(Event(
+                        user=user, title=f'{"Series" if recurring else "Meeting"} {number}',
+                        description=rng.choice(['', 'Agenda to follow.', 'Room 4B, bring the slides.']),
+                        start_datetime=start, end_datetime=start + timedelta(minutes=rng.choice(DURATIONS)),
+                        is_recurring=recurring,
+                    ))
+                    if recurring:
+                        rules.append((len(events) - 1, random_rule(rng, next(variants), start)))
+            events = Event.objects.bulk_create(events, batch_size=BATCH_SIZE)
+
+            exceptions = []
+            for position, fields in rules:
+                event = events[position]
+                for day in sample_dates(rng, fields, event.start_datetime, rng.randint(0, exceptions_per_series)):
+                    exceptions.append(EventException(event=event, occurrence_date=day, is_cancelled=True))
+            RecurrenceRule.objects.bulk_create(
+                [RecurrenceRule(event=events[position], **fields) for position, fields in rules], batch_size=BATCH_SIZE,
+            )
+            EventException.objects.bulk_create(exceptions, batch_size=BATCH_SIZE)
+            # Bulk writes skip signals; index the new series if the index is in use
+            occurrence_index.refresh_events([event.pk for event in events])
+
+        for index, written in enumerate((len(batch), len(events), len(rules), len(exceptions))):
+            totals[index] += written
+        if progress:
+            progress(*totals)
+    return tuple(totals)
@@ -1,3 +1,1370 @@
-from django.test import TestCase
+import asyncio
+import tempfile
+import time
+from io import StringIO
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from unittest import mock
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User
+from . import push, versioning
+from .async_views import change_stream
+from .authentication import stream_token
+from .models import CalendarChange, CalendarVersion, Event, EventException, FreeBusySharing, Occurrence, OccurrenceHorizon, RecurrenceRule
+from .batch import expand_batch
+from .benchmarks import run_suite
+from .database import ReplicaRouter, primary_reads, replica_behind, replica_reads
+from .ical import iter_calendar, iter_ics_records
+from .occurrence_index import cancelled_dates, covers, roll_horizon
+from .profiling import metrics
+from .parallel import expand_parallel
+from .recurrence import compiled_rules, expand_event, expand_events, get_compiled_rule
+from .reminders import ReminderDispatcher
+from .serializers import EventSerializer, OccurrenceSerializer
+from .synthetic import seed_users
+from .timezones import EPOCH, NAIVE_EPOCH, transition_table
+from .views import parse_window
+
+
+class QueryBudgetMixin:
+    """
+    Asserts that a request to an endpoint runs at most the number of SQL
+    queries budgeted for it, however many rows it returns.
+    """
+    query_budgets = {}
+
+    def request_within_budget(self, url_name, method='get', data=None, **url_kwargs):
+        url = reverse(url_name, kwargs=url_kwargs or None)
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, data, format='json' if method != 'get' else None)
+        queries = [query['sql'] for query in context.captured_queries]
+        budget = self.query_budgets[url_name]
+        self.assertLessEqual(
+            len(queries), budget,
+            f"{method.upper()} {url_name} ran {len(queries)} queries (budget {budget}):\n" + "\n".join(queries),
+        )
+        return response
+
+
+class RecurrenceExpansionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('expander', 'secret-pass-123')
+        self.client.force_authenticate(self.user)
+
+    def series(self, start, frequency, **rule):
+        event = Event.objects.create(
+            user=self.user, title=frequency, start_datetime=start, end_datetime=start + timedelta(hours=1),
+            is_recurring=True,
+        )
+        RecurrenceRule.objects.create(event=event, frequency=frequency, **rule)
+        return Event.objects.select_related('recurrence_rule').get(pk=event.pk)
+
+    def dates(self, start, frequency, window_start, window_end, cancelled=(), **rule):
+        event = self.series(datetime.combine(start, datetime.min.time(), dt_timezone.utc).replace(hour=9), frequency, **rule)
+        window = [datetime.combine(day, datetime.min.time(), dt_timezone.utc) for day in (window_start, window_end)]
+        return [occurrence.occurrence_date for occurrence in expand_event(event, *window, cancelled)]
+
+    def test_daily_and_weekly(self):
+        self.assertEqual(
+            self.dates(date(2026, 1, 1), 'DAILY', date(2026, 1, 1), date(2026, 1, 15), interval=3),
+            [date(2026, 1, day) for day in (1, 4, 7, 10, 13)],
+        )
+        # Every other week from a Wednesday: that week's Monday is before the start
+        self.assertEqual(
+            self.dates(date(2026, 1, 7), 'WEEKLY', date(2026, 1, 1), date(2026, 2, 7), interval=2, weekdays='MO,FR'),
+            [date(2026, 1, 9), date(2026, 1, 19), date(2026, 1, 23), date(2026, 2, 2), date(2026, 2, 6)],
+        )
+        # Without weekdays, the start's weekday
+        self.assertEqual(
+            self.dates(date(2026, 1, 7), 'WEEKLY', date(2026, 1, 1), date(2026, 1, 22), cancelled={date(2026, 1, 14)}),
+            [date(2026, 1, 7), date(2026, 1, 21)],
+        )
+
+    def test_monthly_days_past_the_end_of_the_month_are_skipped(self):
+        self.assertEqual(
+            self.dates(date(2026, 1, 31), 'MONTHLY', date(2026, 1, 1), date(2026, 9, 1), day_of_month=31),
+            [date(2026, 1, 31), date(2026, 3, 31), date(2026, 5, 31), date(2026, 7, 31), date(2026, 8, 31)],
+        )
+        self.assertEqual(
+            self.dates(date(2026, 1, 29), 'MONTHLY', date(2026, 1, 1), date(2026, 4, 1)),
+            [date(2026, 1, 29), date(2026, 3, 29)],
+        )
+        self.assertEqual(
+            self.dates(date(2024, 2, 29), 'YEARLY', date(2024, 1, 1), date(2029, 1, 1), month=2, day=29),
+            [date(2024, 2, 29), date(2028, 2, 29)],
+        )
+
+    def test_nth_weekdays(self):
+        window = (date(2026, 1, 1), date(2026, 4, 1))
+        self.assertEqual(
+            self.dates(date(2026, 1, 1), 'MONTHLY', *window, nth=2, weekday_for_nth='TU'),
+            [date(2026, 1, 13), date(2026, 2, 10), date(2026, 3, 10)],
+        )
+        self.assertEqual(
+            self.dates(date(2026, 1, 1), 'MONTHLY', *window, nth=-1, weekday_for_nth='FR'),
+            [date(2026, 1, 30), date(2026, 2, 27), date(2026, 3, 27)],
+        )
+        # Only months with five Mondays
+        self.assertEqual(
+            self.dates(date(2026, 1, 1), 'MONTHLY', date(2026, 1, 1), date(2026, 7, 1), nth=5, weekday_for_nth='MO'),
+            [date(2026, 3, 30), date(2026, 6, 29)],
+        )
+        self.assertEqual(
+            self.dates(date(2026, 1, 1), 'YEARLY', date(2026, 1, 1), date(2029, 1, 1), month=5, nth=-1, weekday_for_nth='MO'),
+            [date(2026, 5, 25), date(2027, 5, 31), date(2028, 5, 29)],
+        )
+
+    def test_count_and_until(self):
+        # `count` includes the occurrences before the window
+        self.assertEqual(
+            self.dates(date(2026, 1, 1), 'DAILY', date(2026, 1, 3), date(2026, 2, 1), count=5),
+            [date(2026, 1, 3), date(2026, 1, 4), date(2026, 1, 5)],
+        )
+        # ...but not the months a day-31 rule skips
+        self.assertEqual(
+            self.dates(date(2026, 1, 31), 'MONTHLY', date(2026, 1, 1), date(2027, 1, 1), count=3),
+            [date(2026, 1, 31), date(2026, 3, 31), date(2026, 5, 31)],
+        )
+        self.assertEqual(
+            self.dates(date(2026, 1, 7), 'WEEKLY', date(2026, 1, 1), date(2026, 3, 1), until=date(2026, 1, 21)),
+            [date(2026, 1, 7), date(2026, 1, 14), date(2026, 1, 21)],
+        )
+        # Decades of skipped steps are counted arithmetically
+        self.assertEqual(
+            self.dates(date(1990, 1, 1), 'DAILY', date(2044, 10, 1), date(2044, 11, 1), count=20000),
+            [date(2044, 10, 1), date(2044, 10, 2), date(2044, 10, 3)],
+        )
+
+    def test_window_edges(self):
+        event = self.series(datetime(2026, 1, 1, 9, tzinfo=dt_timezone.utc), 'DAILY')
+
+        def days(window_start, window_end):
+            return [occurrence.occurrence_date.day for occurrence in expand_event(event, window_start, window_end)]
+
+        # Ends exactly at the window start, or starts exactly at its end: outside
+        self.assertEqual(days(datetime(2026, 1, 2, 10, tzinfo=dt_timezone.utc), datetime(2026, 1, 4, 9, tzinfo=dt_timezone.utc)), [3])
+        # Overlapping either edge: inside
+        self.assertEqual(
+            days(datetime(2026, 1, 2, 9, 30, tzinfo=dt_timezone.utc), datetime(2026, 1, 4, 9, 1, tzinfo=dt_timezone.utc)),
+            [2, 3, 4],
+        )
+        self.assertEqual(days(datetime(2025, 12, 1, tzinfo=dt_timezone.utc), datetime(2026, 1, 1, 9, tzinfo=dt_timezone.utc)), [])
+
+    def test_occurrence_endpoint(self):
+        self.series(datetime(2026, 1, 1, 9, tzinfo=dt_timezone.utc), 'WEEKLY', weekdays='TH')
+        url = reverse('event-occurrences')
+        response = self.client.get(url, {'start': '2026-01-01T10:00:00Z', 'end': '2026-01-16'})
+        self.assertEqual([occurrence['start'] for occurrence in response.data], ['2026-01-08T09:00:00Z', '2026-01-15T09:00:00Z'])
+        for params in ({'start': '2026-01-01'}, {'start': '2026-01-05', 'end': '2026-01-05'},
+                       {'start': '2026-01-01', 'end': '2027-06-01'}, {'start': 'soon', 'end': '2026-02-01'}):
+            self.assertEqual(self.client.get(url, params).status_code, 400, params)
+
+
+class CompiledRuleCacheTests(APITestCase):
+    def setUp(self):
+        compiled_rules.clear()
+        user = User.objects.create_user('compiler', 'secret-pass-123')
+        start = datetime(2026, 1, 5, 9, tzinfo=dt_timezone.utc)
+        self.event = Event.objects.create(
+            user=user, title='Sync', start_datetime=start, end_datetime=start + timedelta(hours=1), is_recurring=True,
+        )
+        RecurrenceRule.objects.create(event=self.event, frequency='WEEKLY', weekdays='MO')
+
+    def dates(self):
+        event = Event.objects.select_related('recurrence_rule').get(pk=self.event.pk)
+        window = (datetime(2026, 1, 1, tzinfo=dt_timezone.utc), datetime(2026, 1, 20, tzinfo=dt_timezone.utc))
+        return [occurrence.occurrence_date.day for occurrence in expand_event(event, *window)]
+
+    def test_compiled_once_per_version(self):
+        self.assertEqual(self.dates(), [5, 12, 19])
+        event = Event.objects.select_related('recurrence_rule').get(pk=self.event.pk)
+        self.assertIs(get_compiled_rule(event), get_compiled_rule(event))
+        self.assertEqual(compiled_rules.misses, 1)
+
+    def test_edits_invalidate_the_entry(self):
+        self.assertEqual(self.dates(), [5, 12, 19])
+        rule = RecurrenceRule.objects.get(event=self.event)
+        rule.weekdays = 'MO,TH'
+        rule.save()
+        self.assertEqual(self.dates(), [5, 8, 12, 15, 19])
+
+        self.event.refresh_from_db()
+        self.event.start_datetime += timedelta(days=7)
+        self.event.end_datetime += timedelta(days=7)
+        self.event.save()
+        self.assertEqual(self.dates(), [12, 15, 19])
+
+    def test_edits_with_the_same_timestamp_invalidate_the_entry(self):
+        self.assertEqual(self.dates(), [5, 12, 19])
+        # update() leaves updated_at alone, as two saves within the clock's resolution would
+        RecurrenceRule.objects.filter(event=self.event).update(interval=2)
+        self.assertEqual(self.dates(), [5, 19])
+        Event.objects.filter(pk=self.event.pk).update(start_datetime=datetime(2026, 1, 12, 9, tzinfo=dt_timezone.utc))
+        self.assertEqual(self.dates(), [12])
+
+
+class BatchExpansionTests(APITestCase):
+    def test_matches_scalar_expansion(self):
+        seed_users('batch', 2, 60, recurring_share=0.8, exceptions_per_series=3)
+        user = User.objects.get(username='batch0')
+        Event.objects.filter(user=user, pk__in=Event.objects.filter(user=user).values('pk')[:20]).update(
+            time_zone='America/New_York',
+        )
+        start = datetime(2024, 2, 29, 23, 30, tzinfo=dt_timezone.utc)
+        for time_zone, frequency, rule in [
+            ('Pacific/Auckland', 'DAILY', {'interval': 2}),
+            ('UTC', 'YEARLY', {'month': 2, 'day': 29}),
+            ('Europe/Berlin', 'MONTHLY', {'nth': 5, 'weekday_for_nth': 'FR'}),
+            ('UTC', 'YEARLY', {'month': 10, 'nth': -1, 'weekday_for_nth': 'SU', 'count': 6}),
+            ('America/New_York', 'MONTHLY', {'day_of_month': 30, 'count': 40}),
+        ]:
+            event = Event.objects.create(
+                user=user, title=frequency, start_datetime=start, end_datetime=start + timedelta(hours=3),
+                time_zone=time_zone, is_recurring=True,
+            )
+            RecurrenceRule.objects.create(event=event, frequency=frequency, **rule)
+
+        events = list(Event.objects.select_related('recurrence_rule').order_by('pk'))
+        utc = dt_timezone.utc
+        for window in [
+            (datetime(2026, 1, 1, tzinfo=utc), datetime(2027, 1, 1, tzinfo=utc)),
+            (datetime(2019, 3, 30, 12, tzinfo=utc), datetime(2019, 4, 2, tzinfo=utc)),
+            (datetime(2028, 2, 28, tzinfo=utc), datetime(2028, 3, 1, 6, tzinfo=utc)),
+        ]:
+            cancelled = cancelled_dates([event.pk for event in events], *window)
+            batch = expand_batch(events, *window)
+            self.assertEqual(
+                [(int(event_id), day.astype(object), start.astype(object).replace(tzinfo=utc),
+                  end.astype(object).replace(tzinfo=utc))
+                 for event_id, day, start, end in zip(batch.event_ids, batch.occurrence_dates, batch.starts, batch.ends)],
+                [(event.pk, occurrence.occurrence_date, occurrence.start, occurrence.end)
+                 for event in events for occurrence in expand_event(event, *window, cancelled.get(event.pk, set()))],
+            )
+
+
+class EventQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    query_budgets = {
+        'event-list-create': 3,   # calendar version, page of events joined with rules, exceptions prefetch
+        'event-detail': 3,
+        'event-occurrences': 4,   # version, horizon lookup (cached), then events + exceptions or index rows
+        'cancel-occurrence': 7,   # event + rule, upsert, index row delete, version bump and change log in a savepoint
+        'event-bulk': 20,         # lookups, then a fixed set of inserts, updates and cascaded deletes, version bump, change log, index horizon
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('budget', 'secret-pass-123')
+        self.client.force_authenticate(self.user)
+
+    def make_events(self, count):
+        start = datetime(2026, 1, 5, 9, tzinfo=dt_timezone.utc)
+        events = []
+        for _ in range(count):
+            event = Event.objects.create(
+                user=self.user, title='Standup', start_datetime=start,
+                end_datetime=start + timedelta(minutes=15), is_recurring=True,
+            )
+            RecurrenceRule.objects.create(event=event, frequency='WEEKLY', weekdays='MO,WE')
+            EventException.objects.create(event=event, occurrence_date=date(2026, 1, 7), is_cancelled=True)
+            events.append(event)
+        return events
+
+    def test_list_query_count_does_not_grow_with_page_size(self):
+        self.make_events(2)
+        response = self.request_within_budget('event-list-create')
+        self.assertEqual(len(response.data['results']), 2)
+
+        self.make_events(40)
+        response = self.request_within_budget('event-list-create')
+        self.assertEqual(len(response.data['results']), 42)
+        self.assertEqual(response.data['results'][0]['recurrence_rule']['weekdays'], ['MO', 'WE'])
+        self.assertEqual(response.data['results'][0]['exceptions'][0]['occurrence_date'], '2026-01-07')
+
+    def test_detail_query_count(self):
+        event = self.make_events(1)[0]
+        response = self.request_within_budget('event-detail', pk=event.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['exceptions']), 1)
+
+    def test_occurrences_query_count_does_not_grow_with_series(self):
+        self.make_events(30)
+        response = self.request_within_budget('event-occurrences', data={'start': '2026-01-05', 'end': '2026-01-12'})
+        # Monday and Wednesday each week, minus the cancelled Wednesday
+        self.assertEqual(len(response.data), 30)
+
+    def test_materialized_occurrences_query_count(self):
+        self.make_events(30)
+        roll_horizon(today=date(2026, 1, 1))
+        response = self.request_within_budget('event-occurrences', data={'start': '2026-01-05', 'end': '2026-01-12'})
+        self.assertEqual(len(response.data), 30)
+
+    def test_cancel_occurrence_query_count(self):
+        event = self.make_events(1)[0]
+        response = self.request_within_budget(
+            'cancel-occurrence', method='post', data={'occurrence_date': '2026-01-12'}, event_id=event.pk,
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def test_cancel_occurrence_range_query_count(self):
+        event = self.make_events(1)[0]
+        response = self.request_within_budget(
+            'cancel-occurrence', method='post',
+            data={'start_date': '2026-01-05', 'end_date': '2026-01-25', 'weekdays': ['MO']}, event_id=event.pk,
+        )
+        self.assertEqual(response.data['cancelled_dates'], ['2026-01-05', '2026-01-12', '2026-01-19'])
+        self.assertEqual(event.exceptions.filter(is_cancelled=True).count(), 4)
+
+    def test_bulk_query_count_does_not_grow_with_items(self):
+        existing = self.make_events(44)
+        item = {
+            'title': 'Sync', 'start_datetime': '2026-01-05T09:00:00Z', 'end_datetime': '2026-01-05T09:30:00Z',
+            'is_recurring': True, 'recurrence_rule': {'frequency': 'WEEKLY', 'weekdays': ['TU']},
+        }
+        offset = 0
+        for count in (2, 20):
+            updated, deleted = existing[offset:offset + count], existing[offset + count:offset + 2 * count]
+            offset += 2 * count
+            response = self.request_within_budget('event-bulk', method='post', data={
+                'create': [item] * count,
+                'update': [dict(item, id=event.pk) for event in updated],
+                'delete': [event.pk for event in deleted],
+            })
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertEqual(len(response.data['created']), count)
+        self.assertEqual(RecurrenceRule.objects.filter(weekdays='TU').count(), 2 * (2 + 20))
+        self.assertEqual(Event.objects.count(), 44 - 22 + 22)
+
+
+@override_settings(EVENTS_OCCURRENCE_INDEX={'PAST_DAYS': 7, 'FUTURE_DAYS': 31})
+class OccurrenceIndexTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('indexer', 'secret-pass-123')
+        self.client.force_authenticate(self.user)
+        roll_horizon(today=date(2026, 1, 1))  # 2025-12-25 to 2026-02-01
+
+    def indexed(self, event_id):
+        """Materialized January dates; writes may also fill days around today."""
+        rows = Occurrence.objects.filter(
+            event_id=event_id, occurrence_date__gte=date(2026, 1, 1), occurrence_date__lt=date(2026, 2, 1),
+        )
+        return [row.occurrence_date.day for row in rows.order_by('occurrence_date')]
+
+    def create_series(self, **rule):
+        response = self.client.post(reverse('event-list-create'), {
+            'title': 'Review', 'start_datetime': '2026-01-05T09:00:00Z', 'end_datetime': '2026-01-05T10:00:00Z',
+            'is_recurring': True, 'recurrence_rule': {'frequency': 'WEEKLY', 'weekdays': ['MO'], **rule},
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def test_rows_follow_event_and_rule_writes(self):
+        pk = self.create_series()
+        self.assertEqual(self.indexed(pk), [5, 12, 19, 26])
+
+        self.client.patch(reverse('event-detail', args=[pk]), {
+            'recurrence_rule': {'frequency': 'WEEKLY', 'weekdays': ['MO', 'TH']},
+        }, format='json')
+        self.assertEqual(self.indexed(pk), [5, 8, 12, 15, 19, 22, 26, 29])
+
+        self.client.patch(reverse('event-detail', args=[pk]), {
+            'start_datetime': '2026-01-12T09:00:00Z', 'end_datetime': '2026-01-12T10:00:00Z',
+            'recurrence_rule': {'frequency': 'WEEKLY', 'weekdays': ['MO', 'TH']},
+        }, format='json')
+        self.assertEqual(self.indexed(pk), [12, 15, 19, 22, 26, 29])
+        self.assertEqual(
+            Occurrence.objects.get(event_id=pk, occurrence_date=date(2026, 1, 15)).start,
+            datetime(2026, 1, 15, 9, tzinfo=dt_timezone.utc),
+        )
+
+        RecurrenceRule.objects.get(event_id=pk).delete()
+        self.assertEqual(self.indexed(pk), [12])
+
+        self.client.delete(reverse('event-detail', args=[pk]))
+        self.assertFalse(Occurrence.objects.filter(event_id=pk).exists())
+
+    def test_rows_follow_exception_writes(self):
+        pk = self.create_series()
+        self.client.post(reverse('cancel-occurrence', args=[pk]), {'occurrence_date': '2026-01-12'}, format='json')
+        self.assertEqual(self.indexed(pk), [5, 19, 26])
+
+        exception = EventException.objects.create(event_id=pk, occurrence_date=date(2026, 1, 19), is_cancelled=True)
+        self.assertEqual(self.indexed(pk), [5, 26])
+
+        exception.is_cancelled = False
+        exception.save()
+        self.assertEqual(self.indexed(pk), [5, 19, 26])
+
+        EventException.objects.get(event_id=pk, occurrence_date=date(2026, 1, 12)).delete()
+        self.assertEqual(self.indexed(pk), [5, 12, 19, 26])
+
+    def test_reads_outside_the_horizon_expand_live(self):
+        pk = self.create_series()
+        url = reverse('event-occurrences')
+        inside = {'start': '2026-01-01', 'end': '2026-01-13'}
+        outside = {'start': '2026-03-01', 'end': '2026-03-10'}
+        self.assertTrue(covers(datetime(2026, 1, 1, tzinfo=dt_timezone.utc), datetime(2026, 1, 13, tzinfo=dt_timezone.utc)))
+        self.assertFalse(covers(datetime(2026, 3, 1, tzinfo=dt_timezone.utc), datetime(2026, 3, 10, tzinfo=dt_timezone.utc)))
+
+        # Without index rows, a window inside the horizon reads nothing and one outside still expands
+        Occurrence.objects.filter(event_id=pk).delete()
+        self.assertEqual(self.client.get(url, inside).data, [])
+        self.assertEqual(
+            [occurrence['start'] for occurrence in self.client.get(url, outside).data],
+            ['2026-03-02T09:00:00Z', '2026-03-09T09:00:00Z'],
+        )
+
+    def test_refresh_command_rolls_the_window(self):
+        pk = self.create_series()
+        Occurrence.objects.filter(event_id=pk).delete()
+        roll_horizon(today=date(2026, 1, 1), full=True)
+        self.assertEqual(self.indexed(pk), [5, 12, 19, 26])
+
+        with mock.patch('django.utils.timezone.now', return_value=datetime(2026, 2, 1, tzinfo=dt_timezone.utc)):
+            call_command('refresh_occurrences', stdout=StringIO())
+        horizon = OccurrenceHorizon.objects.get()
+        self.assertEqual((horizon.start.date(), horizon.end.date()), (date(2026, 1, 25), date(2026, 3, 4)))
+        # Days that fell out are dropped; the new ones are filled
+        dates = list(Occurrence.objects.filter(event_id=pk).order_by('occurrence_date').values_list('occurrence_date', flat=True))
+        self.assertEqual(dates, [date(2026, 1, 26), date(2026, 2, 2), date(2026, 2, 9), date(2026, 2, 16),
+                                 date(2026, 2, 23), date(2026, 3, 2)])
+        self.assertTrue(covers(datetime(2026, 2, 1, tzinfo=dt_timezone.utc), datetime(2026, 3, 1, tzinfo=dt_timezone.utc)))
+
+
+class EventListPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('pager', 'secret-pass-123')
+        self.client.force_authenticate(self.user)
+        self.url = reverse('event-list-create')
+
+    def create(self, title, day, hour=9, hours=1, **fields):
+        start = datetime(2026, 1, day, hour, tzinfo=dt_timezone.utc)
+        return Event.objects.create(
+            user=self.user, title=title, start_datetime=start, end_datetime=start + timedelta(hours=hours), **fields,
+        )
+
+    def follow(self, params):
+        """Titles of every page reached through `next` links, and the number of pages."""
+        titles, pages = [], 0
+        response = self.client.get(self.url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            titles += [event['title'] for event in response.data['results']]
+            pages += 1
+            if response.data['next'] is None:
+                return titles, pages
+            response = self.client.get(response.data['next'])
+
+    def test_next_links_cover_every_event_once(self):
+        # Three events share a start: the id breaks the tie, so none is skipped or repeated
+        for title, day in [('e', 9), ('a', 5), ('b', 6), ('c', 6), ('d', 6), ('f', 12), ('g', 12)]:
+            self.create(title, day)
+        self.assertEqual(self.follow({'page_size': 2}), (list('abcdefg'), 4))
+        self.assertEqual(self.follow({'page_size': 3}), (list('abcdefg'), 3))
+        self.assertEqual(self.follow({}), (list('abcdefg'), 1))
+
+    def test_pages_do_not_shift_when_rows_are_inserted(self):
+        for title, day in [('a', 5), ('b', 6), ('c', 7), ('d', 8)]:
+            self.create(title, day)
+        first = self.client.get(self.url, {'page_size': 2}).data
+        self.create('early', 1)
+        self.create('tie', 6)  # same start as the last row of the page, higher id
+        second = self.client.get(first['next']).data
+        self.assertEqual([event['title'] for event in second['results']], ['tie', 'c'])
+
+    def test_fields_and_window_filters(self):
+        self.create('before', 1)
+        self.create('spans', 4, hours=48)
+        self.create('inside', 8)
+        self.create('after', 20)
+        series = self.create('series', 1, is_recurring=True)
+        RecurrenceRule.objects.create(event=series, frequency='DAILY')
+
+        response = self.client.get(self.url, {'start': '2026-01-05', 'end': '2026-01-10', 'fields': 'id,title'})
+        self.assertEqual([set(event) for event in response.data['results']], [{'id', 'title'}] * 3)
+        self.assertEqual([event['title'] for event in response.data['results']], ['series', 'spans', 'inside'])
+        response = self.client.get(self.url, {'start': '2026-01-08T09:30:00Z', 'fields': 'title, start_datetime'})
+        self.assertEqual(response.data['results'], [
+            {'title': 'series', 'start_datetime': '2026-01-01T09:00:00Z'},
+            {'title': 'inside', 'start_datetime': '2026-01-08T09:00:00Z'},
+            {'title': 'after', 'start_datetime': '2026-01-20T09:00:00Z'},
+        ])
+
+    def test_invalid_parameters(self):
+        self.create('a', 5)
+        for params in ({'start': 'tomorrow'}, {'end': '2026-13-01'}, {'fields': 'title,password'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.data)
+        self.assertEqual(self.client.get(self.url, {'cursor': 'not-a-cursor'}).status_code, 404)
+        # Out-of-range page sizes are clamped
+        self.assertEqual(len(self.client.get(self.url, {'page_size': 0}).data['results']), 1)
+
+
+class ConditionalGetTests(QueryBudgetMixin, APITestCase):
+    query_budgets = {
+        'event-list-create': 1,   # calendar version only: 304 or cached data
+        'event-occurrences': 1,
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('etag', 'secret-pass-123')
+        self.client.force_authenticate(self.user)
+        start = datetime(2026, 1, 5, 9, tzinfo=dt_timezone.utc)
+        self.event = Event.objects.create(
+            user=self.user, title='Standup', start_datetime=start, end_datetime=start + timedelta(minutes=15),
+        )
+
+    def test_unchanged_calendar_is_not_modified(self):
+        etag = self.client.get(reverse('event-list-create'))['ETag']
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('event-list-create'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(context.captured_queries), 1)
+
+    def test_if_modified_since_alone_is_not_enough(self):
+        # Two writes within one second share a Last-Modified; only the ETag tells them apart
+        url = reverse('event-list-create')
+        last_modified = self.client.get(url)['Last-Modified']
+        Event.objects.filter(pk=self.event.pk).update(title='Retro')
+        versioning.log_changes(self.user.pk, [(self.event.pk, CalendarChange.EVENT, self.event.pk, CalendarChange.UPDATE)])
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['title'], 'Retro')
+
+    def test_repeat_reads_are_served_from_cache(self):
+        window = {'start': '2026-01-01', 'end': '2026-02-01'}
+        first = self.client.get(reverse('event-occurrences'), window)
+        second = self.request_within_budget('event-occurrences', data=window)
+        self.assertEqual(first.data, second.data)
+        first = self.client.get(reverse('event-list-create'))
+        second = self.request_within_budget('event-list-create')
+        self.assertEqual(first.data, second.data)
+
+    def test_writes_change_etag_and_cached_data(self):
+        list_url = reverse('event-list-create')
+        etag = self.client.get(list_url)['ETag']
+
+        EventException.objects.create(event=self.event, occurrence_date=date(2026, 1, 6), is_cancelled=True)
+        response = self.client.get(list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.data['results'][0]['exceptions']), 1)
+
+        etag = response['ETag']
+        self.client.delete(reverse('event-detail', kwargs={'pk': self.event.pk}))
+        response = self.client.get(list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.data['results'], [])
+
+    def test_materialized_reads_see_the_write_with_its_version(self):
+        roll_horizon(today=date(2026, 1, 1))
+        window = {'start': '2026-01-05', 'end': '2026-01-06'}
+        self.client.get(reverse('event-occurrences'), window)
+
+        # A read between commit and the on_commit callbacks must not cache the old rows
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.client.patch(
+                reverse('event-detail', kwargs={'pk': self.event.pk}),
+                {'start_datetime': '2026-01-05T10:00:00Z', 'end_datetime': '2026-01-05T10:15:00Z'}, format='json',
+            )
+            during = self.client.get(reverse('event-occurrences'), window)
+        for callback in callbacks:
+            callback()
+        after = self.client.get(reverse('event-occurrences'), window, HTTP_IF_NONE_MATCH=during['ETag'])
+        self.assertEqual(during.data[0]['start'], '2026-01-05T10:00:00Z')
+        self.assertEqual(after.status_code, 304)
+
+
+class CalendarExportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ics', 'secret-pass-123')
+        start = datetime(2026, 1, 5, 9, tzinfo=dt_timezone.utc)
+        self.event = Event.objects.create(
+            user=self.user, title='Standup; daily, mostly', start_datetime=start,
+            end_datetime=start + timedelta(minutes=15), is_recurring=True,
+        )
+        RecurrenceRule.objects.create(event=self.event, frequency='WEEKLY', weekdays='MO,WE', until=date(2026, 3, 2))
+        EventException.objects.create(event=self.event, occurrence_date=date(2026, 1, 7), is_cancelled=True)
+
+    def get_calendar(self, url, **headers):
+        response = self.client.get(url, **headers)
+        return response, b''.join(response.streaming_content).decode() if response.status_code == 200 else ''
+
+    def test_series_is_exported_with_rrule_and_exdate(self):
+        self.client.force_authenticate(self.user)
+        response, body = self.get_calendar(reverse('calendar-export'))
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        self.assertIn('SUMMARY:Standup\\; daily\\, mostly\r\n', body)
+        self.assertIn('RRULE:FREQ=WEEKLY;BYDAY=MO,WE;UNTIL=20260302T090000Z\r\n', body)
+        self.assertIn('EXDATE:20260107T090000Z\r\n', body)
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n') and body.endswith('END:VCALENDAR\r\n'))
+
+        response, _ = self.get_calendar(reverse('calendar-export'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_feed_url_works_without_jwt(self):
+        self.client.force_authenticate(self.user)
+        url = self.client.get(reverse('calendar-feed-url')).data['url']
+        self.client.force_authenticate(None)
+
+        response, body = self.get_calendar(url.replace('http://testserver', ''), HTTP_ACCEPT='text/calendar')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('UID:event-%d@' % self.event.pk, body)
+        response, _ = self.get_calendar(reverse('calendar-export') + '?token=%d:forged' % self.user.pk)
+        self.assertEqual(response.status_code, 401)
+
+
+class CalendarImportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('importer', 'secret-pass-123')
+        self.client.force_authenticate(self.user)
+
+    def upload(self, name, content, **fields):
+        return self.client.post(
+            reverse('event-import'), {'file': SimpleUploadedFile(name, content.encode()), **fields}, format='multipart',
+        )
+
+    def test_exported_calendar_imports_back_identically(self):
+        source = User.objects.create_user('source', 'secret-pass-123')
+        start = datetime(2026, 1, 5, 9, tzinfo=dt_timezone.utc)
+        for frequency, extra in [('WEEKLY', {'weekdays': 'TU,FR', 'count': 9}), ('MONTHLY', {'nth': -1, 'weekday_for_nth': 'FR'})]:
+            event = Event.objects.create(
+                user=source, title=f'{frequency}, imported', start_datetime=start,
+                end_datetime=start + timedelta(hours=1), is_recurring=True,
+            )
+            RecurrenceRule.objects.create(event=event, frequency=frequency, **extra)
+            EventException.objects.create(event=event, occurrence_date=date(2026, 1, 30), is_cancelled=True)
+        Event.objects.create(user=source, title='One-off', start_datetime=start, end_datetime=start + timedelta(hours=2))
+
+        response = self.upload('export.ics', ''.join(iter_calendar(source)))
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['created'], 3)
+
+        def without_ids(calendar):
+            return sorted(line for line in calendar.split('\r\n') if not line.startswith(('UID', 'DTSTAMP', 'LAST-MOD')))
+        self.assertEqual(without_ids(''.join(iter_calendar(self.user))), without_ids(''.join(iter_calendar(source))))
+
+    def test_csv_rows_are_reported_and_import_resumes_from_offset(self):
+        content = (
+            'title,description,start_datetime,end_datetime,rrule,exdates\n'
+            'Gym,,2026-01-05T18:00:00Z,2026-01-05T19:00:00Z,FREQ=WEEKLY;BYDAY=MO;INTERVAL=2,2026-01-19\n'
+            'Broken,,yesterday,,,\n'
+            'Review,,2026-01-06T10:00:00Z,2026-01-06T11:00:00Z,FREQ=MONTHLY;BYDAY=MO,TU;BYSETPOS=1,\n'
+            'Lunch,,2026-01-07T12:00:00Z,2026-01-07T13:00:00Z,,\n'
+        )
+        response = self.upload('calendar.csv', content)
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([error['record'] for error in response.data['errors']], [1, 2])
+        self.assertEqual(response.data['next_offset'], 4)
+        gym = Event.objects.get(user=self.user, title='Gym')
+        self.assertEqual((gym.recurrence_rule.interval, gym.recurrence_rule.weekdays), (2, 'MO'))
+        self.assertEqual([e.occurrence_date for e in gym.exceptions.all()], [date(2026, 1, 19)])
+
+        response = self.upload('calendar.csv', content, offset=3)
+        self.assertEqual((response.data['processed'], response.data['created']), (1, 1))
+        self.assertEqual(Event.objects.filter(user=self.user, title='Lunch').count(), 2)
+
+
+class FreeBusyTests(QueryBudgetMixin, APITestCase):
+    query_budgets = {
+        'free-busy': 4,   # users, horizon lookup (cached), then events joined with rules + exceptions, or index rows
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user('alice', 'secret-pass-123')
+        self.bob = User.objects.create_user('bob', 'secret-pass-123')
+        FreeBusySharing.objects.create(user=self.bob)
+        self.client.force_authenticate(self.alice)
+        day = datetime(2026, 1, 5, tzinfo=dt_timezone.utc)
+        standup = Event.objects.create(
+            user=self.alice, title='Standup', start_datetime=day.replace(hour=9),
+            end_datetime=day.replace(hour=10), is_recurring=True,
+        )
+        RecurrenceRule.objects.create(event=standup, frequency='DAILY')
+        EventException.objects.create(event=standup, occurrence_date=date(2026, 1, 6), is_cancelled=True)
+        Event.objects.create(user=self.bob, title='Dentist', start_datetime=day.replace(hour=9, minute=30),
+                             end_datetime=day.replace(hour=11))
+        Event.objects.create(user=self.bob, title='Lunch', start_datetime=day.replace(hour=11),
+                             end_datetime=day.replace(hour=12))
+
+    def get_free_busy(self, **params):
+        params = {'users': 'alice,bob', 'start': '2026-01-05T08:00:00Z', 'end': '2026-01-06T12:00:00Z', **params}
+        return self.client.get(reverse('free-busy'), params)
+
+    def spans(self, intervals):
+        return [(interval['start'].strftime('%d %H:%M'), interval['end'].strftime('%d %H:%M')) for interval in intervals]
+
+    def test_busy_time_is_merged_across_users(self):
+        for index_active in (False, True):
+            if index_active:
+                roll_horizon(today=date(2026, 1, 1))
+                cache.clear()
+            with self.subTest(index_active=index_active):
+                response = self.request_within_budget('free-busy', data={
+                    'users': 'alice,bob', 'start': '2026-01-05T08:00:00Z', 'end': '2026-01-06T12:00:00Z',
+                })
+                self.assertEqual(self.spans(response.data['busy']), [('05 09:00', '05 12:00')])
+                self.assertEqual(self.spans(response.data['calendars'][0]['busy']), [('05 09:00', '05 10:00')])
+                self.assertEqual(self.spans(response.data['free']), [('05 08:00', '05 09:00'), ('05 12:00', '06 12:00')])
+                self.assertNotIn('Dentist', str(response.data))
+
+    def test_short_free_slots_and_unknown_users(self):
+        response = self.get_free_busy(min_duration=90)
+        self.assertEqual(self.spans(response.data['free']), [('05 12:00', '06 12:00')])
+        response = self.get_free_busy(users='alice,carol')
+        self.assertEqual(response.status_code, 400)
+
+    def test_only_sharing_users_can_be_looked_up(self):
+        User.objects.create_user('carol', 'secret-pass-123')
+        not_sharing = self.get_free_busy(users='alice,carol')
+        unknown = self.get_free_busy(users='alice,dave')
+        self.assertEqual(not_sharing.status_code, 400)
+        self.assertEqual(not_sharing.data['error'], unknown.data['error'].replace('dave', 'carol'))
+
+        self.client.force_authenticate(self.bob)
+        self.assertEqual(self.get_free_busy(users='alice').status_code, 400)
+        url = reverse('free-busy-sharing')
+        self.assertEqual(self.client.put(url, {'shared': 'yes'}, format='json').status_code, 400)
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(self.client.put(url, {'shared': True}, format='json').data, {'shared': True})
+        self.client.force_authenticate(self.bob)
+        self.assertEqual(self.get_free_busy(users='alice').status_code, 200)
+        self.client.put(url, {'shared': False}, format='json')
+        self.assertEqual(self.client.get(url).data, {'shared': False})
+
+
+class ConflictCheckTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('booked', 'secret-pass-123')
+        self.client.force_authenticate(self.user)
+        start = datetime(2030, 3, 4, 9, tzinfo=dt_timezone.utc)  # a Monday
+        self.standup = Event.objects.create(
+            user=self.user, title='Standup', start_datetime=start,
+            end_datetime=start + timedelta(minutes=30), is_recurring=True,
+        )
+        RecurrenceRule.objects.create(event=self.standup, frequency='WEEKLY', weekdays='MO,WE', count=4)
+
+    def create(self, start, end, query='?check_conflicts=true', **extra):
+        return self.client.post(reverse('event-list-create') + query, {
+            'title': 'Review', 'start_datetime': start, 'end_datetime': end, **extra,
+        }, format='json')
+
+    def test_conflicts_with_series_occurrences_are_reported(self):
+        response = self.create('2030-03-06T09:15:00Z', '2030-03-06T10:00:00Z')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [(c['event_id'], str(c['occurrence_date'])) for c in response.data['conflicts']],
+            [(self.standup.pk, '2030-03-06')],
+        )
+        self.assertNotIn('conflicts', self.create('2030-03-06T09:15:00Z', '2030-03-06T10:00:00Z', query='').data)
+
+    def test_new_series_is_checked_over_its_occurrences(self):
+        response = self.create(
+            '2030-03-04T09:29:00Z', '2030-03-04T09:45:00Z', is_recurring=True,
+            recurrence_rule={'frequency': 'DAILY', 'count': 10},
+        )
+        # Overlaps the standup on Mon 4, Wed 6, Mon 11 and Wed 13, not after its count ends
+        self.assertEqual(
+            [str(c['own_occurrence_date']) for c in response.data['conflicts']],
+            ['2030-03-04', '2030-03-06', '2030-03-11', '2030-03-13'],
+        )
+        response = self.create('2030-03-04T09:30:00Z', '2030-03-04T10:00:00Z')
+        self.assertEqual(len(response.data['conflicts']), 1)  # the series above, not the standup it touches
+
+
+class NextOccurrenceTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('widget', 'secret-pass-123')
+        self.client.force_authenticate(self.user)
+        start = datetime(1990, 1, 31, 8, tzinfo=dt_timezone.utc)
+        self.event = Event.objects.create(
+            user=self.user, title='Rent', start_datetime=start,
+            end_datetime=start + timedelta(hours=1), is_recurring=True,
+        )
+        # Last Friday of the month, 500 times
+        RecurrenceRule.objects.create(event=self.event, frequency='MONTHLY', nth=-1, weekday_for_nth='FR', count=500)
+        EventException.objects.create(event=self.event, occurrence_date=date(2026, 1, 30), is_cancelled=True)
+
+    def test_next_occurrences_skip_cancelled_dates(self):
+        response = self.client.get(
+            reverse('event-next-occurrences', kwargs={'pk': self.event.pk}), {'after': '2026-01-01', 'limit': 3},
+        )
+        self.assertEqual(
+            [str(occurrence['occurrence_date']) for occurrence in response.data['occurrences']],
+            ['2026-02-27', '2026-03-27', '2026-04-24'],
+        )
+        # 500th last Friday after January 1990
+        self.assertEqual(response.data['ends_on'], date(2031, 9, 26))
+
+    def test_occurs_on(self):
+        url = reverse('event-occurs-on', kwargs={'pk': self.event.pk})
+        self.assertTrue(self.client.get(url, {'date': '2026-02-27'}).data['occurs'])
+        self.assertFalse(self.client.get(url, {'date': '2026-02-20'}).data['occurs'])
+        response = self.client.get(url, {'date': '2026-01-30'})
+        self.assertEqual((response.data['occurs'], response.data['cancelled']), (False, True))
+        self.assertFalse(self.client.get(url, {'date': '2031-10-31'}).data['occurs'])
+
+
+class AsyncReadTests(APITestCase):
+    """The async read endpoints answer exactly like their DRF counterparts."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('async', 'secret-pass-123')
+        User.objects.create_user('other', 'secret-pass-123')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        start = datetime(2026, 1, 5, 9, tzinfo=dt_timezone.utc)
+        for number in range(3):
+            event = Event.objects.create(
+                user=self.user, title=f'Standup {number}', start_datetime=start + timedelta(hours=number),
+                end_datetime=start + timedelta(hours=number, minutes=15), is_recurring=True,
+            )
+            RecurrenceRule.objects.create(event=event, frequency='WEEKLY', weekdays='MO,WE')
+        EventException.objects.create(event=event, occurrence_date=date(2026, 1, 7), is_cancelled=True)
+
+    def assertSameResponse(self, sync_name, async_name, params):
+        for index_active in (False, True):
+            if index_active:
+                roll_horizon(today=date(2026, 1, 1))
+            cache.clear()
+            expected = self.client.get(reverse(sync_name), params, HTTP_ACCEPT='application/json')
+            actual = self.client.get(reverse(async_name), params)
+            self.assertEqual(actual.status_code, expected.status_code)
+            self.assertEqual(actual.content.replace(b'/async/', b'/'), expected.content)
+
+    def test_responses_match_sync_views(self):
+        window = {'start': '2026-01-05', 'end': '2026-01-19'}
+        self.assertSameResponse('event-list-create', 'async-event-list', {'page_size': 2, 'fields': 'id,title'})
+        self.assertSameResponse('event-occurrences', 'async-event-occurrences', window)
+        self.assertSameResponse('free-busy', 'async-free-busy', {**window, 'users': 'async,other'})
+        self.assertSameResponse('event-occurrences', 'async-event-occurrences', {'start': 'soon'})
+
+    def test_conditional_get_and_authentication(self):
+        url = reverse('async-event-occurrences')
+        params = {'start': '2026-01-05', 'end': '2026-01-19'}
+        response = self.client.get(url, params)
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.client.credentials()
+        response = self.client.get(url, params)
+        self.assertEqual((response.status_code, response['WWW-Authenticate']), (401, 'Bearer realm="api"'))
+
+
+class ParallelExpansionTests(APITestCase):
+    def test_pool_matches_single_process_expansion_in_order(self):
+        start = datetime(2026, 1, 5, 9, tzinfo=dt_timezone.utc)
+        users = [User.objects.create_user(username, 'secret-pass-123') for username in ('zed', 'amy')]
+        # Alternating between users, so a chunk spanning both is not in pk order
+        for offset, frequency in enumerate(['DAILY', 'WEEKLY', None, 'MONTHLY']):
+            for user in users:
+                event = Event.objects.create(
+                    user=user, title=f'{user.username} {offset}', start_datetime=start + timedelta(hours=offset),
+                    end_datetime=start + timedelta(hours=offset, minutes=30), is_recurring=bool(frequency),
+                )
+                if frequency:
+                    RecurrenceRule.objects.create(event=event, frequency=frequency, count=20)
+                    for day, is_cancelled in [(date(2026, 1, 7), True), (date(2026, 2, 5), True),
+                                              (date(2026, 1, 12), False), (date(2026, 6, 5), True)]:
+                        EventException.objects.create(event=event, occurrence_date=day, is_cancelled=is_cancelled)
+        window = (datetime(2026, 1, 1, tzinfo=dt_timezone.utc), datetime(2026, 3, 1, tzinfo=dt_timezone.utc))
+
+        events = Event.objects.select_related('recurrence_rule').order_by('user_id', 'pk')
+        expected = expand_batch(events, *window)
+        expected = [(Event.objects.get(pk=event_id).user_id, int(event_id), start)
+                    for event_id, start in zip(expected.event_ids, expected.starts)]
+        # The series and their cancellations are one streamed query, whatever the chunk count
+        with self.assertNumQueries(1):
+            single = list(expand_parallel(*window, workers=1, chunk_size=3))
+        chunks = list(expand_parallel(*window, workers=2, chunk_size=3))
+        self.assertEqual(len(chunks), 3)
+        for result in (single, chunks):
+            self.assertEqual(
+                [(int(user_id), int(event_id), start) for chunk in result
+                 for user_id, event_id, start in zip(chunk.user_ids, chunk.event_ids, chunk.starts)],
+                expected,
+            )
+
+
+class ReminderTests(APITestCase):
+    class ListSink:
+        def __init__(self):
+            self.delivered = []
+
+        def deliver(self, reminders):
+            self.delivered.extend(reminders)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('forgetful', 'secret-pass-123')
+        start = datetime(2030, 3, 4, 9, tzinfo=dt_timezone.utc)
+        self.event = Event.objects.create(
+            user=self.user, title='Standup', start_datetime=start, end_datetime=start + timedelta(minutes=15),
+            is_recurring=True, reminder_minutes=15,
+        )
+        RecurrenceRule.objects.create(event=self.event, frequency='DAILY')
+
+    def at(self, day, hour, minute=0):
+        return datetime(2030, 3, day, hour, minute, tzinfo=dt_timezone.utc)
+
+    def check_reminders_follow_edits(self):
+        sink = self.ListSink()
+        dispatcher = ReminderDispatcher(sink, window=2 * 3600, now=self.at(4, 8))
+        self.assertEqual(dispatcher.tick(self.at(4, 8, 30)), [])
+        self.assertEqual([r.due for r in dispatcher.tick(self.at(4, 8, 50))], [self.at(4, 8, 45)])
+
+        EventException.objects.create(event=self.event, occurrence_date=date(2030, 3, 5), is_cancelled=True)
+        self.assertEqual(dispatcher.tick(self.at(5, 9, 30)), [])
+
+        # Loaded with the 15 minute reminder, then moved to an hour before
+        self.assertEqual(dispatcher.tick(self.at(6, 7, 30)), [])
+        self.event.reminder_minutes = 60
+        self.event.save()
+        self.assertEqual([r.due for r in dispatcher.tick(self.at(6, 8, 1))], [self.at(6, 8)])
+        self.assertEqual(dispatcher.tick(self.at(6, 9)), [])
+        self.assertEqual([r.occurrence_date for r in sink.delivered], [date(2030, 3, 4), date(2030, 3, 6)])
+
+    def test_reminders_from_expanded_series(self):
+        self.check_reminders_follow_edits()
+
+    def test_reminders_from_occurrence_index(self):
+        roll_horizon(today=date(2030, 3, 1))
+        self.check_reminders_follow_edits()
+
+    def test_reloads_do_not_wait_for_the_index(self):
+        roll_horizon(today=date(2030, 3, 1))
+        sink = self.ListSink()
+        dispatcher = ReminderDispatcher(sink, window=2 * 3600, now=self.at(4, 8))
+        self.assertEqual(dispatcher.tick(self.at(4, 8, 30)), [])
+
+        # Moved to 10:00 and the version bumped, but the index rows not rewritten yet
+        Event.objects.filter(pk=self.event.pk).update(
+            start_datetime=self.at(4, 10), end_datetime=self.at(4, 10, 15), updated_at=timezone.now(),
+        )
+        versioning.log_changes(self.user.pk, [(self.event.pk, CalendarChange.EVENT, self.event.pk, CalendarChange.UPDATE)])
+        self.assertEqual(dispatcher.tick(self.at(4, 9)), [])
+        self.assertEqual([r.start for r in dispatcher.tick(self.at(4, 9, 50))], [self.at(4, 10)])
+
+
+class BenchmarkSuiteTests(APITestCase):
+    def test_seeded_calendar_and_report(self):
+        users, events, rules, exceptions = seed_users('seeded', 2, 40, recurring_share=1, exceptions_per_series=2)
+        self.assertEqual((users, events, rules), (2, 80, 80))
+        self.assertEqual(
+            set(RecurrenceRule.objects.values_list('frequency', flat=True)), {'DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY'},
+        )
+        # Cancelled dates are real occurrence dates of their series
+        for exception in EventException.objects.select_related('event__recurrence_rule')[:20]:
+            self.assertIsNotNone(exception.event.occurrence_on(exception.occurrence_date)[0])
+
+        user = User.objects.get(username='seeded0')
+        report = run_suite(user, 'bench-pass-123', datetime(2026, 1, 1, tzinfo=dt_timezone.utc), 2,
+                           ['expansion.view', 'serialization.list_view', 'cancel_occurrence'])
+        self.assertEqual(report['dataset']['events'], 40)
+        self.assertEqual(report['results']['cancel_occurrence']['rounds'], 2)
+        # Rolled back
+        self.assertEqual(EventException.objects.count(), exceptions)
+
+
+class FastReadPathTests(APITestCase):
+    """The list and occurrence endpoints answer exactly as the DRF serializers would."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('reader', 'secret-pass-123')
+        self.client.force_authenticate(self.user)
+        start = datetime(2026, 2, 2, 9, 30, 15, 250000, tzinfo=dt_timezone.utc)
+        Event.objects.create(user=self.user, title='Caf\u00e9\u2028meeting', description='Room "4B"',
+                             start_datetime=start, end_datetime=start + timedelta(hours=1), reminder_minutes=10)
+        weekly = Event.objects.create(user=self.user, title='Gym', start_datetime=start,
+                                      end_datetime=start + timedelta(hours=1), is_recurring=True)
+        RecurrenceRule.objects.create(event=weekly, frequency='WEEKLY', weekdays='MO,TH', until=date(2026, 6, 1))
+        EventException.objects.create(event=weekly, occurrence_date=date(2026, 2, 5), is_cancelled=True)
+        monthly = Event.objects.create(user=self.user, title='Rent', start_datetime=start,
+                                       end_datetime=start + timedelta(minutes=5), is_recurring=True)
+        RecurrenceRule.objects.create(event=monthly, frequency='MONTHLY', nth=-1, weekday_for_nth='FR', count=12)
+
+    def test_event_list_matches_event_serializer(self):
+        events = Event.objects.select_related('recurrence_rule').prefetch_related('exceptions').order_by('start_datetime', 'id')
+        for fields in (None, ['title', 'recurrence_rule'], ['exceptions', 'end_datetime']):
+            with self.subTest(fields=fields):
+                params = {'fields': ','.join(fields)} if fields else {}
+                response = self.client.get(reverse('event-list-create'), params)
+                expected = {'next': None, 'results': EventSerializer(events, many=True, fields=fields).data}
+                self.assertEqual(response.content, JSONRenderer().render(expected))
+
+    def test_occurrences_match_occurrence_serializer(self):
+        params = {'start': '2026-02-01', 'end': '2026-03-01'}
+        events = Event.objects.select_related('recurrence_rule').prefetch_related('exceptions')
+        expected = OccurrenceSerializer(expand_events(events, *parse_window(params)[0]), many=True).data
+        for index_active in (False, True):
+            if index_active:
+                roll_horizon(today=date(2026, 1, 15))
+                cache.clear()
+            with self.subTest(index_active=index_active):
+                response = self.client.get(reverse('event-occurrences'), params)
+                self.assertEqual(response.content, JSONRenderer().render(expected))
+
+
+class DatabaseTuningTests(APITestCase):
+    def test_new_sqlite_connections_get_the_pragmas(self):
+        with tempfile.TemporaryDirectory() as directory:
+            settings_dict = {**connection.settings_dict, 'NAME': str(Path(directory) / 'tuned.sqlite3')}
+            wrapper = type(connections['default'])(settings_dict, 'tuned')
+            try:
+                with wrapper.cursor() as cursor:
+                    pragmas = [cursor.execute(f'PRAGMA {name}').fetchone()[0] for name in ('journal_mode', 'synchronous')]
+            finally:
+                wrapper.close()
+        self.assertEqual(pragmas, ['wal', 1])  # 1 is NORMAL
+
+    @override_settings(EVENTS_READ_REPLICA='default')
+    def test_replica_reads_are_scoped_and_stay_off_open_transactions(self):
+        router = ReplicaRouter()
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            self.assertIsNone(router.db_for_read(Event))
+            with replica_reads():
+                self.assertEqual(router.db_for_read(Event), 'default')
+            self.assertIsNone(router.db_for_read(Event))
+        # Test methods run in a transaction, whose own writes a replica would not have
+        with replica_reads():
+            self.assertIsNone(router.db_for_read(Event))
+        with override_settings(EVENTS_READ_REPLICA='replica'), replica_reads():
+            self.assertIsNone(router.db_for_read(Event))  # not in DATABASES
+
+    @override_settings(EVENTS_READ_REPLICA='default')
+    def test_versions_are_read_from_the_default_database(self):
+        user = User.objects.create_user('versioned', 'secret-pass-123')
+        version = versioning.current(user)[0]
+        router = ReplicaRouter()
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            with replica_reads():
+                self.assertIsNone(router.db_for_read(CalendarVersion))
+                # A replica that has not caught up with the version is not read
+                self.assertFalse(replica_behind(user.pk, version))
+                self.assertTrue(replica_behind(user.pk, version + 1))
+                with primary_reads():
+                    self.assertIsNone(router.db_for_read(Event))
+                    self.assertFalse(replica_behind(user.pk, version + 1))
+            self.assertFalse(replica_behind(user.pk, version + 1))
+
+        self.client.force_authenticate(user)
+        for url in (reverse('event-list-create'), reverse('event-occurrences')):
+            with mock.patch('events.caching.replica_behind', return_value=True) as behind:
+                self.client.get(url, {'start': '2026-01-01', 'end': '2026-02-01'})
+            behind.assert_called_once_with(user.pk, version)
+
+
+
+class SyncTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('sync', 'secret-pass-123')
+        self.client.force_authenticate(self.user)
+        start = datetime(2026, 1, 5, 9, tzinfo=dt_timezone.utc)
+        self.kept, self.doomed = (
+            Event.objects.create(user=self.user, title=title, start_datetime=start, end_datetime=start + timedelta(hours=1))
+            for title in ('Kept', 'Doomed')
+        )
+
+    def sync(self, token=None):
+        response = self.client.get(reverse('event-sync'), {'token': token} if token is not None else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_changes_since_token_include_tombstones(self):
+        snapshot = self.sync()
+        self.assertTrue(snapshot['full'])
+        self.assertEqual([event['title'] for event in snapshot['events']], ['Kept', 'Doomed'])
+        self.assertEqual(self.sync(snapshot['token']), {**snapshot, 'full': False, 'events': []})
+
+        self.client.delete(reverse('event-detail', kwargs={'pk': self.doomed.pk}))
+        self.client.post(
+            reverse('cancel-occurrence', kwargs={'event_id': self.kept.pk}), {'occurrence_date': '2026-01-05'}, format='json',
+        )
+        response = self.client.post(reverse('event-bulk'), {'create': [{
+            'title': 'Weekly', 'start_datetime': '2026-01-06T09:00:00Z', 'end_datetime': '2026-01-06T10:00:00Z',
+            'is_recurring': True, 'recurrence_rule': {'frequency': 'WEEKLY', 'weekdays': ['TU']},
+        }]}, format='json')
+        created = response.data['created'][0]
+
+        delta = self.sync(snapshot['token'])
+        self.assertFalse(delta['full'])
+        self.assertEqual([event['id'] for event in delta['events']], [self.kept.pk, created])
+        self.assertEqual(len(delta['events'][0]['exceptions']), 1)
+        self.assertEqual(delta['deleted'], [self.doomed.pk])
+        self.assertGreater(int(delta['token']), int(snapshot['token']))
+        sequences = list(self.user.calendar_changes.order_by('id').values_list('sequence', flat=True))
+        self.assertEqual(sequences, sorted(sequences))
+        self.assertEqual(sequences[-1], int(delta['token']))
+
+    def test_pruned_and_foreign_tokens_get_a_snapshot(self):
+        token = self.sync()['token']
+        self.kept.save()
+        self.assertTrue(self.sync(int(token) + 5)['full'])  # never issued
+        self.assertEqual(self.client.get(reverse('event-sync'), {'token': 'nonsense'}).status_code, 400)
+
+        call_command('prune_changes', days=0, stdout=StringIO())
+        delta = self.sync(token)
+        self.assertTrue(delta['full'])
+        self.assertEqual(len(delta['events']), 2)
+        self.assertFalse(self.sync(delta['token'])['full'])
+
+    def add_series(self, event):
+        RecurrenceRule.objects.create(event=event, frequency='WEEKLY', weekdays='MO')
+        for day in (date(2026, 1, 12), date(2026, 1, 19)):
+            EventException.objects.create(event=event, occurrence_date=day, is_cancelled=True)
+
+    def test_event_deletes_bump_the_version_once(self):
+        self.add_series(self.doomed)
+        version, pk = versioning.current(self.user)[0], self.doomed.pk
+        self.doomed.delete()
+        self.assertEqual(versioning.current(self.user)[0], version + 1)
+        tombstones = self.user.calendar_changes.filter(event_id=pk, action=CalendarChange.DELETE)
+        self.assertEqual(sorted(tombstones.values_list('kind', flat=True)), ['event', 'exception', 'exception', 'rule'])
+        self.assertEqual(set(tombstones.values_list('sequence', flat=True)), {version + 1})
+
+    def test_deleting_a_user_with_a_series(self):
+        other = User.objects.create_user('leaving', 'secret-pass-123')
+        start = datetime(2026, 1, 5, 9, tzinfo=dt_timezone.utc)
+        self.add_series(Event.objects.create(user=other, title='Series', start_datetime=start, end_datetime=start, is_recurring=True))
+        other.delete()
+        self.assertFalse(CalendarChange.objects.filter(user_id=other.pk).exists())
+        self.assertFalse(Event.objects.filter(user_id=other.pk).exists())
+        # Other calendars still log their writes
+        version = versioning.current(self.user)[0]
+        self.kept.delete()
+        self.assertEqual(versioning.current(self.user)[0], version + 1)
+
+
+@override_settings(EVENTS_PUSH={'HEARTBEAT': 0.05})
+class PushTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('push', 'secret-pass-123')
+        self.token = str(AccessToken.for_user(self.user))
+
+    def create_event(self):
+        start = datetime(2026, 1, 5, 9, tzinfo=dt_timezone.utc)
+        with self.captureOnCommitCallbacks(execute=True):
+            return Event.objects.create(user=self.user, title='Pushed', start_datetime=start, end_datetime=start)
+
+    async def disconnect(self, body):
+        # What the ASGI handler does when the client goes: cancel the task sending the response
+        sending = asyncio.ensure_future(anext(body))
+        await asyncio.sleep(0)
+        sending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await sending
+
+    def stream_request(self, **params):
+        return AsyncRequestFactory().get('/', params, headers={'Authorization': f'Bearer {self.token}'})
+
+    async def read_until_expired(self, body):
+        messages = [await anext(body)]
+        while messages[-1] == b': keep-alive\n\n':
+            messages.append(await anext(body))
+        return messages[-1]
+
+    @async_to_sync
+    async def test_writes_are_pushed_to_open_streams(self):
+        response = await change_stream(self.stream_request())
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = aiter(response.streaming_content)
+        self.assertEqual(await anext(body), b'retry: 50\n\n')
+
+        event = await sync_to_async(self.create_event)()
+        self.assertEqual(
+            await anext(body), f'id: 1\nevent: change\ndata: {{"token":"1","changes":[[{event.pk},"event","create"]]}}\n\n'.encode(),
+        )
+        # Writes by other processes reach no broker here; the version check notices them
+        await CalendarVersion.objects.filter(user=self.user).aupdate(version=5)
+        self.assertEqual(await anext(body), b'id: 5\nevent: change\ndata: {"token":"5"}\n\n')
+        self.assertEqual(await anext(body), b': keep-alive\n\n')
+
+        await self.disconnect(body)
+        self.assertEqual(push.broker.listening([self.user.pk]), set())
+
+    @async_to_sync
+    async def test_reconnects_catch_up_and_tokens_are_required(self):
+        await sync_to_async(self.create_event)()  # nobody listening: nothing to publish
+        request = AsyncRequestFactory().get('/', headers={'Authorization': f'Bearer {self.token}', 'Last-Event-ID': '0'})
+        body = aiter((await change_stream(request)).streaming_content)
+        await anext(body)
+        self.assertEqual(await anext(body), b'id: 1\nevent: change\ndata: {"token":"1"}\n\n')
+        await self.disconnect(body)
+        self.assertEqual((await change_stream(AsyncRequestFactory().get('/'))).status_code, 401)
+        # The JWT is not accepted in the URL
+        self.assertEqual((await change_stream(AsyncRequestFactory().get('/', {'access_token': self.token}))).status_code, 401)
+        self.assertEqual((await change_stream(RequestFactory().get('/'))).status_code, 204)  # served by WSGI
+
+    def test_stream_tokens_are_short_lived(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        data = self.client.post(reverse('event-stream-token')).data
+        self.assertAlmostEqual(data['expires'], time.time() + 300, delta=5)
+
+        @async_to_sync
+        async def open_stream(token, **params):
+            response = await change_stream(AsyncRequestFactory().get('/', {'token': token, **params}))
+            if response.status_code != 200:
+                return response.status_code
+            body = aiter(response.streaming_content)
+            messages = [await anext(body), await anext(body)]
+            await self.disconnect(body)
+            return messages
+
+        self.create_event()
+        # A reopened stream passes the last token it saw in the query
+        self.assertEqual(open_stream(data['token'], last_event_id='0')[1], b'id: 1\nevent: change\ndata: {"token":"1"}\n\n')
+        user_id, expires, signature = data['token'].split(':')
+        self.assertEqual(open_stream(f'{user_id}:{int(expires) + 60}:{signature}'), 401)
+        self.assertEqual(open_stream(stream_token(self.user, int(time.time()) - 1)), 401)
+        # Changing the password revokes the tokens handed out
+        self.user.set_password('new-secret-pass-456')
+        self.user.save()
+        self.assertEqual(open_stream(data['token']), 401)
+
+    @async_to_sync
+    async def test_streams_end_when_their_token_expires(self):
+        token = AccessToken.for_user(self.user)
+        token.set_exp(lifetime=timedelta(seconds=1))
+        self.token = str(token)
+        body = aiter((await change_stream(self.stream_request())).streaming_content)
+        await anext(body)
+        self.assertEqual(await self.read_until_expired(body), b'event: expired\ndata: {}\n\n')
+        with self.assertRaises(StopAsyncIteration):
+            await anext(body)
+        self.assertEqual(push.broker.listening([self.user.pk]), set())
+
+        expires = int(time.time()) + 1
+        response = await change_stream(AsyncRequestFactory().get('/', {'token': stream_token(self.user, expires)}))
+        body = aiter(response.streaming_content)
+        await anext(body)
+        self.assertEqual(await self.read_until_expired(body), b'event: expired\ndata: {}\n\n')
+        self.assertGreaterEqual(time.time(), expires)
+
+
+@override_settings(EVENTS_PROFILING={'ENABLED': True})
+class ProfilingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.user = User.objects.create_user('profiled', 'secret-pass-123')
+        self.client.force_authenticate(self.user)
+        start = datetime(2026, 1, 5, 9, tzinfo=dt_timezone.utc)
+        Event.objects.create(user=self.user, title='Timed', start_datetime=start, end_datetime=start)
+
+    def test_server_timing_and_metrics(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('event-list-create'))
+        queries = len(context.captured_queries)
+        timing = dict(entry.split(';', 1) for entry in response['Server-Timing'].split(', '))
+        self.assertEqual(list(timing), ['db', 'serialize', 'render', 'total'])
+        self.assertIn(f'desc="{queries} queries"', timing['db'])
+
+        cached = self.client.get(reverse('event-list-create'))  # from the response cache: version query only
+        self.assertTrue(cached['Server-Timing'].startswith('db;dur='))
+        text = self.client.get(reverse('metrics')).content.decode()
+        labels = 'view="event-list-create",method="GET"'
+        self.assertIn(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2', text)
+        self.assertIn(f'http_request_db_queries_total{{{labels}}} {queries + 1}', text)
+        self.assertIn(f'http_request_response_bytes_total{{{labels}}} {2 * len(response.content)}', text)
+
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.5').status_code, 404)
+
+    def test_sampling_and_opt_in(self):
+        with override_settings(EVENTS_PROFILING={'ENABLED': True, 'SAMPLE_RATE': 0}):
+            self.client.handler.load_middleware()
+            self.assertNotIn('Server-Timing', self.client.get(reverse('event-list-create')))
+        with override_settings(EVENTS_PROFILING={}):
+            self.client.handler.load_middleware()
+            self.assertNotIn('Server-Timing', self.client.get(reverse('event-list-create')))
+        self.assertNotIn('event-list-create', metrics.prometheus())
+
+
+class TimeZoneTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('zoned', 'secret-pass-123')
+        self.client.force_authenticate(self.user)
+
+    def create(self, time_zone, start, frequency='WEEKLY', **rule):
+        return self.client.post(reverse('event-list-create'), {
+            'title': f'{frequency} in {time_zone}', 'start_datetime': start.isoformat(),
+            'end_datetime': (start + timedelta(hours=1)).isoformat(), 'time_zone': time_zone,
+            'is_recurring': True, 'recurrence_rule': {'frequency': frequency, **rule},
+        }, format='json')
+
+    def test_series_keep_wall_clock_time_across_dst(self):
+        utc = dt_timezone.utc
+        # Mondays 09:00 in New York: 14:00 UTC in winter, 13:00 UTC from March 8 to November 1
+        response = self.create('America/New_York', datetime(2026, 3, 2, 14, tzinfo=utc), weekdays=['MO'])
+        self.assertEqual(response.data['time_zone'], 'America/New_York')
+        new_york = response.data['id']
+        # Daily 08:00 in Auckland is the previous day in UTC; dates (and cancellations) are local
+        auckland = self.create('Pacific/Auckland', datetime(2026, 3, 30, 19, tzinfo=utc), 'DAILY').data['id']
+        EventException.objects.create(event_id=auckland, occurrence_date=date(2026, 4, 2), is_cancelled=True)
+
+        window = (datetime(2026, 3, 1, tzinfo=utc), datetime(2026, 11, 5, tzinfo=utc))
+        events = Event.objects.select_related('recurrence_rule').prefetch_related('exceptions').order_by('pk')
+        occurrences = expand_events(events, *window)
+        starts = [occurrence.start for occurrence in occurrences if occurrence.event.id == new_york]
+        self.assertEqual(starts[:3], [
+            datetime(2026, 3, 2, 14, tzinfo=utc), datetime(2026, 3, 9, 13, tzinfo=utc), datetime(2026, 3, 16, 13, tzinfo=utc),
+        ])
+        self.assertEqual(starts[-2:], [datetime(2026, 10, 26, 13, tzinfo=utc), datetime(2026, 11, 2, 14, tzinfo=utc)])
+        self.assertEqual(
+            [(occurrence.occurrence_date.day, occurrence.start) for occurrence in occurrences
+             if occurrence.event.id == auckland][:5],
+            [(31, datetime(2026, 3, 30, 19, tzinfo=utc)), (1, datetime(2026, 3, 31, 19, tzinfo=utc)),
+             (3, datetime(2026, 4, 2, 19, tzinfo=utc)), (4, datetime(2026, 4, 3, 19, tzinfo=utc)),
+             (5, datetime(2026, 4, 4, 20, tzinfo=utc))],
+        )
+
+        batch = expand_batch(events, *window)
+        self.assertEqual(
+            [(int(event_id), day.astype(object), start.astype(object).replace(tzinfo=utc))
+             for event_id, day, start in zip(batch.event_ids, batch.occurrence_dates, batch.starts)],
+            sorted((occurrence.event.id, occurrence.occurrence_date, occurrence.start) for occurrence in occurrences),
+        )
+
+    def test_time_zone_is_validated_and_exported(self):
+        start = datetime(2026, 3, 2, 14, tzinfo=dt_timezone.utc)
+        response = self.create('Mars/Olympus_Mons', start, weekdays=['MO'])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('time_zone', response.data)
+
+        event = self.create('America/New_York', start, weekdays=['MO'], count=3).data['id']
+        EventException.objects.create(event_id=event, occurrence_date=date(2026, 3, 9), is_cancelled=True)
+        body = ''.join(iter_calendar(self.user))
+        self.assertIn('DTSTART;TZID=America/New_York:20260302T090000\r\n', body)
+        self.assertIn('RRULE:FREQ=WEEKLY;BYDAY=MO;COUNT=3\r\n', body)
+        self.assertIn('EXDATE;TZID=America/New_York:20260309T090000\r\n', body)
+
+        item, cancelled, error = next(iter_ics_records(body.split('\r\n')))
+        self.assertEqual((item['time_zone'], cancelled, error), ('America/New_York', [date(2026, 3, 9)], None))
+
+    def test_transition_table_matches_zoneinfo(self):
+        zone, table = ZoneInfo('America/New_York'), transition_table('America/New_York')
+        # Every 37 minutes through 2026, a skipped hour (02:00-03:00 on March 8) and a repeated one included
+        local_times = [datetime(2026, 1, 1) + timedelta(minutes=37 * step) for step in range(14_300)]
+        expected = [local.replace(tzinfo=zone).astimezone(dt_timezone.utc) for local in local_times]
+        self.assertEqual([table.to_utc(local) for local in local_times], expected)
+        self.assertEqual([table.to_local(moment) for moment in expected], [
+            moment.astimezone(zone).replace(tzinfo=None) for moment in expected
+        ])
+        local_us = [(local - NAIVE_EPOCH) // timedelta(microseconds=1) for local in local_times]
+        self.assertEqual(
+            table.to_utc_us(local_us).tolist(), [(moment - EPOCH) // timedelta(microseconds=1) for moment in expected],
+        )
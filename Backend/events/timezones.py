@@ -0,0 +1,161 @@
+"""
+Wall-clock time of events in their IANA time zone.
+
+An event stores the UTC instant of its first occurrence and a `time_zone`
+name. Its later occurrences start at the same local time of day in that zone,
+so a weekly 09:00 meeting in America/New_York stays at 09:00 across daylight
+saving changes and its UTC start moves instead. Occurrence dates (and so
+cancellations) are local dates.
+
+Converting through zoneinfo costs a Python-level lookup per datetime. Instead,
+the first time a zone is used its UTC offset transitions between FIRST_YEAR and
+LAST_YEAR are found (sampled daily, then narrowed to the second by bisection)
+and kept as sorted arrays, once per process. A conversion is then one binary
+search: `bisect` for a single datetime, `np.searchsorted` over a whole array
+in events.batch. Like zoneinfo with fold=0, an ambiguous local time (the hour
+repeated when clocks go back) resolves to its first occurrence, and a time
+skipped when clocks go forward is moved forward by the gap. Outside the table's
+years zoneinfo is used directly.
+"""
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import numpy as np
+
+UTC = 'UTC'
+FIRST_YEAR, LAST_YEAR = 1970, 2100
+SAMPLE_STEP = 86_400  # seconds; offsets are assumed to last longer than a day
+US_PER_SECOND = 1_000_000
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+NAIVE_EPOCH = datetime(1970, 1, 1)
+SECOND = timedelta(seconds=1)
+
+
+def is_valid(name):
+    """Whether `name` is a time zone known to zoneinfo."""
+    try:
+        ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+    return True
+
+
+def _offset(zone, seconds):
+    return int(datetime.fromtimestamp(seconds, zone).utcoffset().total_seconds())
+
+
+def _transitions(zone, first, last):
+    """(UTC second of each offset change in [first, last), offsets before and after each)."""
+    samples = range(first, last, SAMPLE_STEP)
+    utc, offsets = [], [_offset(zone, first)]
+    previous = first
+    for seconds in samples:
+        offset = _offset(zone, seconds)
+        if offset == offsets[-1]:
+            previous = seconds
+            continue
+        # The change is in (previous, seconds]; find its first second
+        low, high = previous, seconds
+        while high - low > 1:
+            middle = (low + high) // 2
+            if _offset(zone, middle) == offsets[-1]:
+                low = middle
+            else:
+                high = middle
+        utc.append(high)
+        offsets.append(offset)
+        previous = seconds
+    return utc, offsets
+
+
+class TransitionTable:
+    """
+    One zone's offset changes as sorted arrays: `utc[i]` is the UTC second of
+    the i-th change, `offsets[i]` the offset in seconds before it (the last
+    entry is the offset after the final change) and `local[i]` the first local
+    second of wall-clock time that resolves to the offset after change i.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.zone = ZoneInfo(name)
+        self.first = int((datetime(FIRST_YEAR, 1, 1, tzinfo=dt_timezone.utc) - EPOCH) // SECOND)
+        self.last = int((datetime(LAST_YEAR + 1, 1, 1, tzinfo=dt_timezone.utc) - EPOCH) // SECOND)
+        self.utc, self.offsets = _transitions(self.zone, self.first, self.last)
+        # Forward (gap): times before the new offset's first local second keep the old offset.
+        # Back (overlap): the repeated times are read with the old, earlier offset.
+        self.local = [
+            moment + max(before, after)
+            for moment, before, after in zip(self.utc, self.offsets, self.offsets[1:])
+        ]
+        self.local_us = np.array(self.local, dtype=np.int64) * US_PER_SECOND
+        self.offsets_us = np.array(self.offsets, dtype=np.int64) * US_PER_SECOND
+
+    def __repr__(self):
+        return f'TransitionTable({self.name!r}, {len(self.utc)} transitions)'
+
+    def to_local(self, value):
+        """Aware datetime -> naive wall-clock datetime in this zone."""
+        seconds = (value - EPOCH) // SECOND
+        if not self.first <= seconds < self.last:
+            return value.astimezone(self.zone).replace(tzinfo=None)
+        offset = self.offsets[bisect_right(self.utc, seconds)]
+        return (value + timedelta(seconds=offset)).replace(tzinfo=None)
+
+    def to_utc(self, local):
+        """Naive wall-clock datetime in this zone -> aware UTC datetime."""
+        seconds = (local - NAIVE_EPOCH) // SECOND
+        if not self.first <= seconds < self.last:
+            return local.replace(tzinfo=self.zone).astimezone(dt_timezone.utc)
+        offset = self.offsets[bisect_right(self.local, seconds)]
+        return (local - timedelta(seconds=offset)).replace(tzinfo=dt_timezone.utc)
+
+    def to_utc_us(self, local_us):
+        """to_utc() over an array of wall-clock microseconds since 1970, giving UTC microseconds."""
+        local_us = np.asarray(local_us, dtype=np.int64)
+        result = local_us - self.offsets_us[np.searchsorted(self.local_us, local_us, side='right')]
+        outside = (local_us < self.first * US_PER_SECOND) | (local_us >= self.last * US_PER_SECOND)
+        for position in np.flatnonzero(outside):
+            local = NAIVE_EPOCH + timedelta(microseconds=int(local_us[position]))
+            result[position] = (self.to_utc(local) - EPOCH) // timedelta(microseconds=1)
+        return result
+
+
+@lru_cache(maxsize=None)
+def transition_table(name):
+    """The TransitionTable of zone `name`, built once per process."""
+    return TransitionTable(name)
+
+
+class WallClock:
+    """
+    Where an event's occurrences fall: the local date and time of its first
+    occurrence, and the UTC start of an occurrence on a given local date.
+    """
+    __slots__ = ('start', 'table', 'anchor', 'time')
+
+    def __init__(self, event):
+        self.start = event.start_datetime
+        if event.time_zone == UTC:
+            self.table = None
+            self.anchor, self.time = self.start.date(), self.start.timetz()
+        else:
+            self.table = transition_table(event.time_zone)
+            local = self.table.to_local(self.start)
+            self.anchor, self.time = local.date(), local.time()
+
+    def start_on(self, day):
+        """UTC start of the occurrence on local date `day`."""
+        if day == self.anchor:
+            return self.start  # exact, even if its local time is ambiguous
+        if self.table is None:
+            return datetime.combine(day, self.time)
+        return self.table.to_utc(datetime.combine(day, self.time))
+
+
+def local_date(event):
+    """The local date of the event's first occurrence."""
+    return WallClock(event).anchor
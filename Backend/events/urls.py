@@ -1,12 +1,45 @@
 from django.urls import path
+from . import async_views
+from .profiling import metrics_view
 from .views import (
     EventListCreateView,
     EventRetrieveUpdateDeleteView,
+    EventBulkView,
+    EventImportView,
+    NextOccurrencesView,
+    OccursOnView,
     CancelOccurrenceView,
+    OccurrenceListView,
+    FreeBusyView,
+    FreeBusySharingView,
+    CalendarExportView,
+    CalendarFeedLinkView,
+    StreamTokenView,
+    SyncView,
 )
 
 urlpatterns = [
     path('events/', EventListCreateView.as_view(), name='event-list-create'),
+    path('events/bulk/', EventBulkView.as_view(), name='event-bulk'),
+    path('events/import/', EventImportView.as_view(), name='event-import'),
+    path('events/export.ics', CalendarExportView.as_view(), name='calendar-export'),
+    path('events/export/feed-url/', CalendarFeedLinkView.as_view(), name='calendar-feed-url'),
+    path('events/sync/', SyncView.as_view(), name='event-sync'),
+    path('events/stream-token/', StreamTokenView.as_view(), name='event-stream-token'),
+    path('events/occurrences/', OccurrenceListView.as_view(), name='event-occurrences'),
+    path('events/free-busy/', FreeBusyView.as_view(), name='free-busy'),
+    path('events/free-busy/sharing/', FreeBusySharingView.as_view(), name='free-busy-sharing'),
     path('events/<int:pk>/', EventRetrieveUpdateDeleteView.as_view(), name='event-detail'),
+    path('events/<int:pk>/next/', NextOccurrencesView.as_view(), name='event-next-occurrences'),
+    path('events/<int:pk>/occurs-on/', OccursOnView.as_view(), name='event-occurs-on'),
     path('events/<int:event_id>/cancel-occurrence/', CancelOccurrenceView.as_view(), name='cancel-occurrence'),
+
+    # Prometheus metrics of profiled requests (events.profiling), for METRICS_IPS only
+    path('metrics/', metrics_view, name='metrics'),
+
+    # Async read endpoints for ASGI deployments; same parameters and responses as above
+    path('async/events/', async_views.event_list, name='async-event-list'),
+    path('async/events/occurrences/', async_views.occurrence_list, name='async-event-occurrences'),
+    path('async/events/free-busy/', async_views.free_busy, name='async-free-busy'),
+    path('async/events/stream/', async_views.change_stream, name='async-event-stream'),
 ]
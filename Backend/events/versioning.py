@@ -0,0 +1,159 @@
+"""
+Per-user calendar version and change log.
+
+Every write to a user's events, rules or exceptions bumps their
+CalendarVersion row and logs a CalendarChange stamped with the new version,
+in the same transaction (through signals, or explicitly for bulk writes,
+which skip signals). Readers use the version as ETag and as part of the
+response cache key, so a cached response can never outlive the data it was
+built from, whatever cache backend and however many workers. Sync clients
+use it as their position in the change log (events.sync).
+"""
+import threading
+from contextlib import contextmanager
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F, Subquery
+from django.utils import timezone
+
+from . import push
+from .models import CalendarChange, CalendarVersion, Event, EventException, RecurrenceRule
+
+BATCH_SIZE = 500
+KINDS = {Event: CalendarChange.EVENT, RecurrenceRule: CalendarChange.RULE, EventException: CalendarChange.EXCEPTION}
+
+# User ids and changes collected by batched_bumps(), and users being deleted, per thread
+_pending = threading.local()
+
+
+def current(user):
+    """(version, changed_at) of the user's calendar."""
+    row = CalendarVersion.objects.filter(user=user).values_list('version', 'changed_at').first()
+    if row is None:
+        row = CalendarVersion.objects.get_or_create(user=user)[0]
+        row = (row.version, row.changed_at)
+    return row
+
+
+async def acurrent(user):
+    """current() for async views."""
+    row = await CalendarVersion.objects.filter(user=user).values_list('version', 'changed_at').afirst()
+    if row is None:
+        row = (await CalendarVersion.objects.aget_or_create(user=user))[0]
+        row = (row.version, row.changed_at)
+    return row
+
+
+def _bump_users(user_ids):
+    if user_ids:
+        CalendarVersion.objects.filter(user_id__in=user_ids).update(
+            version=F('version') + 1, changed_at=timezone.now()
+        )
+
+
+def _log(changes):
+    """Insert (user id, event id, kind, object id, action) changes, each stamped with its user's version."""
+    if not changes:
+        return
+    # The version the bump just wrote, read by the INSERT itself
+    versions = {
+        user_id: Subquery(CalendarVersion.objects.filter(user_id=user_id).values('version')[:1])
+        for user_id in {change[0] for change in changes}
+    }
+    now = timezone.now()
+    CalendarChange.objects.bulk_create([
+        CalendarChange(
+            user_id=user_id, sequence=versions[user_id], event_id=event_id, kind=kind, object_id=object_id,
+            action=action, changed_at=now,
+        )
+        for user_id, event_id, kind, object_id, action in changes
+    ], batch_size=BATCH_SIZE)
+
+
+def start_user_deletion(user_id):
+    """
+    Log nothing more for `user_id` until end_user_deletion(): deleting a user
+    cascades to their CalendarVersion row and change log, so the deletes of
+    their events, rules and exceptions have no version to bump nor anyone to
+    sync them to.
+    """
+    if getattr(_pending, 'deleting', None) is None:
+        _pending.deleting = set()
+    _pending.deleting.add(user_id)
+
+
+def end_user_deletion(user_id):
+    getattr(_pending, 'deleting', set()).discard(user_id)
+
+
+def _apply(user_ids, changes):
+    deleting = getattr(_pending, 'deleting', None)
+    if deleting:
+        user_ids = [user_id for user_id in user_ids if user_id not in deleting]
+        changes = [change for change in changes if change[0] not in deleting]
+    # One transaction, so no reader sees a version whose changes are not logged yet
+    with transaction.atomic(savepoint=False):
+        _bump_users(user_ids)
+        _log(changes)
+        listening = push.broker.listening(user_ids)
+        if listening:
+            transaction.on_commit(partial(push.publish_changes, listening, changes))
+
+
+def log_changes(user_id, changes):
+    """Record (event id, kind, object id, action) changes to one user's calendar."""
+    changes = [(user_id, *change) for change in changes]
+    pending = getattr(_pending, 'changes', None)
+    if pending is not None:
+        _pending.user_ids.add(user_id)
+        pending.extend(changes)
+        return
+    _apply([user_id], changes)
+
+
+def log_instance(instance, action):
+    """Record the create, update or delete of an event, rule or exception."""
+    if isinstance(instance, Event):
+        user_id, event_id = instance.user_id, instance.pk
+    else:
+        event_id = instance.event_id
+        user_id = instance.event.user_id if type(instance).event.is_cached(instance) else None
+    change = (user_id, event_id, KINDS[type(instance)], instance.pk, action)
+    pending = getattr(_pending, 'changes', None)
+    if pending is not None:
+        pending.append(change)
+        return
+    if user_id is None:
+        user_id = Event.objects.filter(pk=event_id).values_list('user_id', flat=True).first()
+        if user_id is None:
+            return  # the event is gone, and with it the user's view of this row
+    _apply([user_id], [(user_id, *change[1:])])
+
+
+@contextmanager
+def batched_bumps():
+    """
+    Collect the bumps and changes made inside the block and apply them at
+    the end, as one UPDATE and one multi-row INSERT. Use inside the
+    transaction doing the writes.
+    """
+    if getattr(_pending, 'user_ids', None) is not None:
+        yield _pending.user_ids
+        return
+    _pending.user_ids, _pending.changes = set(), []
+    try:
+        yield _pending.user_ids
+        user_ids, changes = _pending.user_ids, _pending.changes
+    finally:
+        _pending.user_ids = _pending.changes = None
+
+    # Rules and exceptions deleted by a cascade do not carry their event; it was
+    # usually deleted in the same block and logged with its user
+    owners = {event_id: user_id for user_id, event_id, *_ in changes if user_id is not None}
+    unknown = {event_id for user_id, event_id, *_ in changes if user_id is None} - owners.keys()
+    if unknown:
+        owners.update(Event.objects.filter(pk__in=unknown).values_list('pk', 'user_id'))
+    changes = [(owners[event_id], event_id, *rest) for _, event_id, *rest in changes if event_id in owners]
+    user_ids |= {change[0] for change in changes}
+    _apply(user_ids, changes)
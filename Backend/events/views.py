@@ -1,55 +1,562 @@
 from rest_framework import generics, permissions, status
-from .models import Event, EventException
-from .serializers import EventSerializer, EventExceptionSerializer
+from rest_framework.parsers import MultiPartParser
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+from .models import CalendarChange, Event, EventException, FreeBusySharing, Occurrence, overlapping_events
+from . import occurrence_index, versioning
+from .bulk import bulk_write
+from .freebusy import free_busy
+from .serializers import EventSerializer, EventExceptionSerializer, OccurrenceSerializer
+from .pagination import EventKeysetPagination
+from .push import push_setting
+from .authentication import FeedTokenAuthentication, feed_token, stream_token
+from .caching import VersionedReadMixin, conditional_response, set_validators, validators
+from .database import ReplicaReadMixin
+from .ical import iter_calendar
+from .importing import FORMATS, guess_format, import_events
+from .renderers import ICalendarRenderer
+from .sync import changes_since, parse_token
+from .rows import OCCURRENCE_COLUMNS, event_columns, occurrence_dicts, occurrence_row_dicts, serialize_events
+from .recurrence import DATE_MARGIN, WEEKDAY_CODES, expand_events, occurrence_dates
 from rest_framework.response import Response
+from accounts.models import User
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from django.db.models import Prefetch, Q
 from django.shortcuts import get_object_or_404
-from datetime import datetime
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+import codecs
+from datetime import datetime, time, timedelta
 
-class EventListCreateView(generics.ListCreateAPIView):
+# Widest window a single occurrence request may ask for.
+MAX_OCCURRENCE_WINDOW = timedelta(days=366)
+
+# Most calendars a single free/busy request may combine.
+MAX_FREE_BUSY_USERS = 100
+
+# Most occurrences a single "next occurrences" request may ask for.
+MAX_NEXT_OCCURRENCES = 100
+
+# Most items (creates + updates + deletes) a single bulk request may carry.
+MAX_BULK_ITEMS = 5000
+
+
+def parse_window_bound(value):
+    """
+    Parse an ISO date or datetime query parameter into an aware datetime.
+    Returns None if the value is missing or malformed.
+    """
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                return None
+            parsed = datetime.combine(day, time.min)
+    except ValueError:
+        return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_window(params):
+    """Read the `start`/`end` query parameters. Returns ((start, end), None) or (None, error)."""
+    start = parse_window_bound(params.get('start'))
+    end = parse_window_bound(params.get('end'))
+    if start is None or end is None:
+        return None, 'start and end are required (YYYY-MM-DD or ISO 8601 datetime).'
+    if end <= start:
+        return None, 'end must be after start.'
+    if end - start > MAX_OCCURRENCE_WINDOW:
+        return None, f'Window cannot be longer than {MAX_OCCURRENCE_WINDOW.days} days.'
+    return (start, end), None
+
+
+def requested_fields(params):
+    """The sparse fieldset asked for with `fields`, or None for all fields."""
+    fields = params.get('fields')
+    if not fields:
+        return None
+    return [name.strip() for name in fields.split(',') if name.strip()]
+
+
+def event_list_error(params, fields):
+    """Validation error of the event list query parameters, if any."""
+    for param in ('start', 'end'):
+        if params.get(param) and parse_window_bound(params[param]) is None:
+            return f'Invalid {param}. Use YYYY-MM-DD or an ISO 8601 datetime.'
+    unknown = set(fields or ()) - set(EventSerializer.Meta.fields)
+    if unknown:
+        return f"Unknown fields: {', '.join(sorted(unknown))}"
+    return None
+
+
+def event_list_queryset(queryset, params, fields):
+    """The listed window of `queryset` as .values() rows holding only what `fields` needs."""
+    queryset = queryset.filter(
+        overlapping_events(parse_window_bound(params.get('start')), parse_window_bound(params.get('end')))
+    )
+    return queryset.values(*event_columns(fields or EventSerializer.Meta.fields))
+
+
+class EventListCreateView(ReplicaReadMixin, VersionedReadMixin, generics.ListCreateAPIView):
+    """
+    Lists the user's events in (start_datetime, id) order, a page at a time.
+
+    Optional query parameters: `start`/`end` keep events overlapping that
+    window, `fields` (comma separated) limits the serialized fields.
+    """
     serializer_class = EventSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = EventKeysetPagination
+
+    def get_requested_fields(self):
+        if self.request.method != 'GET':
+            return None
+        return requested_fields(self.request.query_params)
 
     def get_queryset(self):
-        return Event.objects.filter(user=self.request.user)
+        queryset = Event.objects.filter(user=self.request.user)
+        if self.request.method != 'GET':
+            return queryset
+        return event_list_queryset(queryset, self.request.query_params, self.get_requested_fields())
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        fields = self.get_requested_fields()
+        error = event_list_error(request.query_params, fields)
+        if error:
+            return Response({'error': error}, status=400)
+        # Serialized from .values() rows, same output as EventSerializer (see events.rows)
+        page = self.paginate_queryset(self.get_queryset())
+        return self.get_paginated_response(serialize_events(page, fields))
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
 
-class EventRetrieveUpdateDeleteView(generics.RetrieveUpdateDestroyAPIView):
+class EventRetrieveUpdateDeleteView(VersionedReadMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = EventSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Event.objects.filter(user=self.request.user)
+        return (
+            Event.objects.filter(user=self.request.user)
+            .select_related('recurrence_rule')
+            .prefetch_related('exceptions')
+        )
+
+
+class EventBulkView(generics.GenericAPIView):
+    """
+    Creates, updates and deletes many events in one transaction:
+    POST /api/events/bulk/ {"create": [...], "update": [{"id": 1, ...}], "delete": [2, 3]}
+
+    Items are validated like single POST/PUT requests. Invalid items are
+    reported under `errors` by operation and position while the rest are
+    written (207); if nothing could be written the response is a 400.
+    """
+    serializer_class = EventSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        operations = {}
+        for name in ('create', 'update', 'delete'):
+            items = request.data.get(name, [])
+            if not isinstance(items, list):
+                return Response({'error': f'{name} must be a list.'}, status=400)
+            operations[name] = items
+
+        total = sum(len(items) for items in operations.values())
+        if not total:
+            return Response({'error': 'Nothing to do: provide create, update or delete.'}, status=400)
+        if total > MAX_BULK_ITEMS:
+            return Response({'error': f'A bulk request can carry at most {MAX_BULK_ITEMS} items.'}, status=400)
+
+        result = bulk_write(request.user, **operations)
+        if not result.errors:
+            code = status.HTTP_200_OK
+        elif result.wrote_anything:
+            code = status.HTTP_207_MULTI_STATUS
+        else:
+            code = status.HTTP_400_BAD_REQUEST
+        return Response(result.as_dict(), status=code)
+
+
+class EventImportView(generics.GenericAPIView):
+    """
+    Imports an iCalendar or CSV file (multipart field `file`) into the user's
+    calendar, a batch at a time: POST /api/events/import/
+    Optional fields: `format` (ics or csv, else guessed from the file name) and
+    `offset`, the `next_offset` of an interrupted import to resume it.
+    """
+    serializer_class = EventSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'file is required'}, status=400)
+        file_format = request.data.get('format') or guess_format(upload.name)
+        if file_format not in FORMATS:
+            return Response({'error': f"format must be one of {', '.join(FORMATS)}."}, status=400)
+        try:
+            offset = int(request.data.get('offset') or 0)
+        except ValueError:
+            offset = -1
+        if offset < 0:
+            return Response({'error': 'offset must be a non-negative integer.'}, status=400)
+
+        # Iterating an upload yields lines from its chunks; nothing reads the whole file
+        lines = codecs.iterdecode(upload, 'utf-8-sig')
+        committed = {'next_offset': offset}
+        try:
+            result = import_events(request.user, lines, file_format, offset, progress=lambda r: committed.update(r.as_dict()))
+        except UnicodeDecodeError:
+            return Response({'error': 'File must be UTF-8 encoded.', **committed}, status=400)
+
+        if not result.failed:
+            code = status.HTTP_200_OK
+        elif result.created:
+            code = status.HTTP_207_MULTI_STATUS
+        else:
+            code = status.HTTP_400_BAD_REQUEST
+        return Response(result.as_dict(), status=code)
+
+
+class NextOccurrencesView(ReplicaReadMixin, APIView):
+    """
+    The next occurrences of one event and where the series ends:
+    GET /api/events/<id>/next/?limit=5&after=2025-06-01T12:00:00Z
+    `after` defaults to now; `ends_on` is null for a series without end.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        event = get_object_or_404(Event.objects.select_related('recurrence_rule'), pk=pk, user=request.user)
+        after = timezone.now()
+        if request.query_params.get('after'):
+            after = parse_window_bound(request.query_params['after'])
+            if after is None:
+                return Response({'error': 'Invalid after. Use YYYY-MM-DD or an ISO 8601 datetime.'}, status=400)
+        try:
+            limit = int(request.query_params.get('limit', 1))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= MAX_NEXT_OCCURRENCES:
+            return Response({'error': f'limit must be between 1 and {MAX_NEXT_OCCURRENCES}.'}, status=400)
+
+        return Response({
+            'event_id': event.pk,
+            'occurrences': OccurrenceSerializer(event.next_occurrences(limit, after), many=True).data,
+            'ends_on': event.last_occurrence_date(),
+        })
+
+
+class OccursOnView(ReplicaReadMixin, APIView):
+    """
+    Whether an event has an occurrence on a date:
+    GET /api/events/<id>/occurs-on/?date=2025-06-04
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        event = get_object_or_404(Event.objects.select_related('recurrence_rule'), pk=pk, user=request.user)
+        try:
+            day = parse_date(request.query_params.get('date') or '')
+        except ValueError:
+            day = None
+        if day is None:
+            return Response({'error': 'date is required (YYYY-MM-DD).'}, status=400)
+
+        occurrence, cancelled = event.occurrence_on(day)
+        return Response({
+            'event_id': event.pk,
+            'date': day,
+            'occurs': occurrence is not None and not cancelled,
+            'cancelled': cancelled,
+            'occurrence': OccurrenceSerializer(occurrence).data if occurrence else None,
+        })
+
 
 class CancelOccurrenceView(generics.CreateAPIView):
+    """
+    Cancels occurrences of a series. Accepts any combination of
+    `occurrence_date` (one date), `occurrence_dates` (a list) and a
+    `start_date`/`end_date` range (inclusive; only days the series occurs on),
+    optionally narrowed by `weekdays` (e.g. ["MO", "FR"]). All dates are written
+    with one upsert on (event, occurrence_date).
+    """
     serializer_class = EventExceptionSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def parse_day(self, value):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            return None
+
+    def get_dates(self, event):
+        """Requested dates as a sorted list, or (None, error message)."""
+        data = self.request.data
+        values = list(data.get('occurrence_dates') or [])
+        if data.get('occurrence_date'):
+            values.append(data['occurrence_date'])
+        dates = set()
+        for value in values:
+            day = self.parse_day(value)
+            if day is None:
+                return None, 'Invalid date format. Use YYYY-MM-DD.'
+            dates.add(day)
+
+        if data.get('start_date') or data.get('end_date'):
+            first, last = self.parse_day(data.get('start_date')), self.parse_day(data.get('end_date'))
+            if first is None or last is None:
+                return None, 'start_date and end_date are both required for a range (YYYY-MM-DD).'
+            if last < first:
+                return None, 'end_date must not be before start_date.'
+            if (last - first).days >= MAX_OCCURRENCE_WINDOW.days:
+                return None, f'A range cannot be longer than {MAX_OCCURRENCE_WINDOW.days} days.'
+            dates.update(occurrence_dates(event, first, last))
+        elif not values:
+            return None, 'occurrence_date, occurrence_dates or start_date/end_date is required'
+
+        weekdays = data.get('weekdays')
+        if weekdays:
+            if any(code not in WEEKDAY_CODES for code in weekdays):
+                return None, f"weekdays must be a list of {', '.join(WEEKDAY_CODES)}."
+            allowed = {WEEKDAY_CODES.index(code) for code in weekdays}
+            dates = {day for day in dates if day.weekday() in allowed}
+
+        if len(dates) > MAX_OCCURRENCE_WINDOW.days:
+            return None, f'At most {MAX_OCCURRENCE_WINDOW.days} dates can be cancelled at once.'
+        return sorted(dates), None
+
     def post(self, request, *args, **kwargs):
-        event_id = kwargs.get('event_id')
-        occurrence_date_str = request.data.get('occurrence_date')
+        event = get_object_or_404(
+            Event.objects.select_related('recurrence_rule'), id=kwargs.get('event_id'), user=request.user
+        )
+        dates, error = self.get_dates(event)
+        if error:
+            return Response({'error': error}, status=400)
+
+        exceptions = [EventException(event=event, occurrence_date=day, is_cancelled=True) for day in dates]
+        with transaction.atomic():
+            # Bulk writes skip signals, so drop the materialized rows here
+            EventException.objects.bulk_create(
+                exceptions,
+                update_conflicts=True,
+                unique_fields=['event', 'occurrence_date'],
+                update_fields=['is_cancelled'],
+            )
+            occurrence_index.drop_occurrences(event.pk, dates)
+            # Inserted or updated, the client has to re-read the event either way
+            versioning.log_changes(request.user.pk, [
+                (event.pk, CalendarChange.EXCEPTION, exception.pk, CalendarChange.UPDATE) for exception in exceptions
+            ])
+
+        if set(request.data) <= {'occurrence_date', 'event', 'is_cancelled'} and len(exceptions) == 1:
+            # Original single-date form of this endpoint
+            serializer = self.get_serializer(exceptions[0])
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(
+            {'event': event.pk, 'cancelled_dates': [day.isoformat() for day in dates]},
+            status=status.HTTP_201_CREATED,
+        )
+
+
+def expandable_events(user, start, end):
+    """The user's events that may occur in [start, end), with rules and cancellations for expand_events."""
+    cancelled = EventException.objects.filter(
+        is_cancelled=True,
+        occurrence_date__gte=start.date() - DATE_MARGIN,
+        occurrence_date__lte=end.date() + DATE_MARGIN,
+    )
+    return (
+        Event.objects.filter(overlapping_events(start, end), user=user, is_active=True)
+        .select_related('recurrence_rule')
+        .prefetch_related(Prefetch('exceptions', queryset=cancelled))
+    )
+
+
+def materialized_occurrences(user, start, end):
+    """The user's indexed occurrences in [start, end), in calendar order, as occurrence_row_dicts() rows."""
+    return (
+        Occurrence.objects.filter(user=user, start__lt=end)
+        .filter(Q(end__gt=start) | Q(start__gte=start))
+        .order_by('start', 'event_id')
+        .values_list(*OCCURRENCE_COLUMNS)
+    )
+
+
+class OccurrenceListView(ReplicaReadMixin, VersionedReadMixin, generics.ListAPIView):
+    """
+    Expands the user's events into concrete occurrences for a date window:
+    GET /api/events/occurrences/?start=2025-06-01&end=2025-07-01
+    """
+    serializer_class = OccurrenceSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return expandable_events(self.request.user, *self.window)
+
+    def get_materialized(self):
+        return materialized_occurrences(self.request.user, *self.window)
+
+    def list(self, request, *args, **kwargs):
+        window, error = parse_window(request.query_params)
+        if error:
+            return Response({'error': error}, status=400)
+        self.window = window
+
+        # Same output as OccurrenceSerializer, without its per-field overhead (see events.rows)
+        if occurrence_index.covers(*window):
+            return Response(occurrence_row_dicts(self.get_materialized()))
+        return Response(occurrence_dicts(expand_events(self.get_queryset(), *window)))
+
+
+def parse_free_busy(params):
+    """Read a free/busy query. Returns ((usernames, window, min_duration), None) or (None, error)."""
+    window, error = parse_window(params)
+    if error:
+        return None, error
+    usernames = list(dict.fromkeys(name.strip() for name in params.get('users', '').split(',') if name.strip()))
+    if not usernames:
+        return None, 'users is required (comma-separated usernames).'
+    if len(usernames) > MAX_FREE_BUSY_USERS:
+        return None, f'At most {MAX_FREE_BUSY_USERS} users per request.'
+    try:
+        min_duration = timedelta(minutes=int(params.get('min_duration', 0)))
+    except ValueError:
+        return None, 'min_duration must be a whole number of minutes.'
+    return (usernames, window, min_duration), None
+
+
+def free_busy_users(usernames, viewer):
+    """Active users among `usernames` whose free/busy `viewer` may see: themselves and those sharing."""
+    return User.objects.filter(
+        Q(pk=viewer.pk) | Q(free_busy_sharing__isnull=False), username__in=usernames, is_active=True,
+    )
 
-        if not occurrence_date_str:
-            return Response({'error': 'occurrence_date is required'}, status=400)
 
+def unavailable_users_error(usernames, users):
+    # Unknown, inactive and not sharing read the same, so the lookup cannot probe for accounts
+    unavailable = [name for name in usernames if name not in users]
+    if unavailable:
+        return f"Free/busy is not available for: {', '.join(unavailable)}."
+    return None
+
+
+class FreeBusyView(ReplicaReadMixin, APIView):
+    """
+    Busy time and common free slots of several users over a window:
+    GET /api/events/free-busy/?users=alice,bob&start=2025-06-02&end=2025-06-07&min_duration=30
+
+    Only times are disclosed, never titles or descriptions. A user can always
+    look up themselves; anyone else must have opted in with
+    FreeBusySharingView. Every other name, unknown or not, gets the same error.
+    `min_duration` (minutes) drops free slots shorter than that.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        query, error = parse_free_busy(request.query_params)
+        if error:
+            return Response({'error': error}, status=400)
+        usernames, window, min_duration = query
+
+        users = {user.username: user for user in free_busy_users(usernames, request.user)}
+        error = unavailable_users_error(usernames, users)
+        if error:
+            return Response({'error': error}, status=400)
+        return Response(free_busy([users[name] for name in usernames], *window, min_duration))
+
+
+class FreeBusySharingView(APIView):
+    """
+    Whether other signed-in users may look up the user's free/busy:
+    GET /api/events/free-busy/sharing/, PUT with {"shared": true|false}
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        return Response({'shared': FreeBusySharing.objects.filter(user=request.user).exists()})
+
+    def put(self, request, *args, **kwargs):
+        shared = request.data.get('shared')
+        if not isinstance(shared, bool):
+            return Response({'error': 'shared must be true or false.'}, status=400)
+        if shared:
+            FreeBusySharing.objects.get_or_create(user=request.user)
+        else:
+            FreeBusySharing.objects.filter(user=request.user).delete()
+        return Response({'shared': shared})
+
+
+class CalendarExportView(ReplicaReadMixin, APIView):
+    """
+    The user's calendar as an iCalendar feed: GET /api/events/export.ics
+    Streamed in chunks; calendar apps can subscribe with the feed URL
+    (see CalendarFeedLinkView) and revalidate with If-None-Match.
+    """
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES + [FeedTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [ICalendarRenderer]
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified, _ = validators(request.user)
+        response = conditional_response(request, etag)
+        if response is None:
+            response = StreamingHttpResponse(iter_calendar(request.user), content_type='text/calendar; charset=utf-8')
+            response['Content-Disposition'] = 'inline; filename="calendar.ics"'
+        return set_validators(response, etag, last_modified)
+
+
+class SyncView(APIView):
+    """
+    Changes since a sync token: GET /api/events/sync/?token=<token from the last response>
+
+    Returns the events changed since then, the ids deleted since then and
+    the next token; without a token, or with one too old, a full snapshot
+    with `full` set (see events.sync).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
         try:
-            occurrence_date = datetime.strptime(occurrence_date_str, '%Y-%m-%d').date()
+            token = parse_token(request.query_params.get('token'))
         except ValueError:
-            return Response({'error': 'Invalid date format. Use YYYY-MM-DD.'}, status=400)
+            return Response({'error': 'token must be a token returned by this endpoint.'}, status=400)
+        return Response(changes_since(request.user, token))
 
-        event = get_object_or_404(Event, id=event_id, user=request.user)
 
-        exception, created = EventException.objects.get_or_create(
-            event=event,
-            occurrence_date=occurrence_date,
-            defaults={'is_cancelled': True}
-        )
+class CalendarFeedLinkView(APIView):
+    """URL calendar apps can subscribe to without a JWT: GET /api/events/export/feed-url/"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        url = request.build_absolute_uri(reverse('calendar-export'))
+        return Response({'url': f'{url}?token={feed_token(request.user)}'})
 
-        if not created and not exception.is_cancelled:
-            exception.is_cancelled = True
-            exception.save()
 
-        serializer = self.get_serializer(exception)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
\ No newline at end of file
+class StreamTokenView(APIView):
+    """
+    Short-lived token for opening the change stream with EventSource, which
+    cannot send the JWT as a header: POST /api/events/stream-token/
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        expires = int(timezone.now().timestamp()) + push_setting('TOKEN_LIFETIME')
+        if request.auth is not None:
+            expires = min(expires, request.auth['exp'])  # never outlives the session
+        return Response({'token': stream_token(request.user, expires), 'expires': expires})